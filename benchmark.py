@@ -0,0 +1,418 @@
+#!/usr/bin/env python
+"""GREVOS benchmark - measures the performance of grevos against a local mock of the GitHub API.
+
+Synthetic histories are served by a local HTTP server emulating the GitHub REST and GraphQL APIs, then every
+phase of grevos is timed (fetch, cache loads, post-processing, CSV and HTML outputs) and the
+results are written as JSON, so that versions can be compared.
+
+https://github.com/pferrot/grevos
+"""
+import argparse
+import concurrent.futures
+import contextlib
+import datetime
+import hashlib
+import http.server
+import json
+import math
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import socket
+import sys
+import tempfile
+import time
+from urllib.parse import urlparse, parse_qs
+
+import grevos
+
+#######################################################################
+# Global variables.
+
+m_sizes = [10000, 100000, 1000000]
+m_nb_repos = 10
+m_nb_authors = 50
+m_max_fetch_commits = 10000
+m_fetch_workers = 8
+m_cache_backend = "json"
+m_api = "rest"
+m_output_file = "benchmark.json"
+m_port = 8790
+# Owner of all the synthetic repos. The name of a repo holds its number of commits (see get_repo_name(...)),
+# so that the mock server does not need to know the histories upfront.
+m_owner = "bench"
+m_branch = "main"
+# Synthetic commits are spread over that period, the oldest one first.
+m_history_start = datetime.datetime(2015, 1, 1)
+m_history_seconds = 5 * 365 * 24 * 3600
+# The mock server is polled for that many seconds at most while starting.
+m_server_start_timeout = 30
+# Page size used by grevos when listing commits (see grevos.m_commits_per_page).
+m_commits_per_page = grevos.m_commits_per_page
+# One author out of m_authors_without_login has no GitHub login (i.e. only an email and a name), so
+# that unknown authors are part of the post-processing.
+m_authors_without_login = 5
+
+#######################################################################
+# Synthetic histories.
+
+def get_repo_name(index_repo, nb_commits):
+    """Returns the name of a synthetic repo given its index and its number of commits.
+    """
+    return "repo%d-%d" % (index_repo, nb_commits)
+
+def get_repo_nb_commits(repo_name):
+    """Returns the number of commits of a synthetic repo given its name (see get_repo_name(...)).
+    """
+    return int(repo_name.split("-")[1])
+
+def get_synthetic_commit(repo_name, index_commit, nb_authors):
+    """Returns a synthetic commit as a dict given the repo name and its index in the history (0 is the
+    oldest commit). Commits are computed on demand, the same arguments always give the same commit.
+
+    Keys: 'sha', 'login' (None for authors without login), 'name', 'email', 'date', 'additions' and
+    'deletions'. The last 8 hexadecimal digits of the SHA are the index of the commit (see
+    get_index_commit(sha)), so that the mock server does not need to keep the histories in memory.
+    """
+    nb_commits = get_repo_nb_commits(repo_name)
+    sha = "%s%08x" % (hashlib.sha1(("%s:%d" % (repo_name, index_commit)).encode('utf-8')).hexdigest()[:32], index_commit)
+    h = int(sha[:8], 16)
+    index_author = h % nb_authors
+    commit = {}
+    commit["sha"] = sha
+    commit["login"] = None if index_author % m_authors_without_login == 0 else "author%d" % index_author
+    commit["name"] = "Author %d" % index_author
+    commit["email"] = "author%d@example.com" % index_author
+    commit["date"] = get_synthetic_commit_date(index_commit, nb_commits).strftime("%Y-%m-%dT%H:%M:%SZ")
+    commit["additions"] = (h >> 8) % 300
+    commit["deletions"] = (h >> 16) % 200
+    return commit
+
+def get_index_commit(sha):
+    """Returns the index of a synthetic commit given its SHA (see get_synthetic_commit(...)).
+    """
+    return int(sha[32:], 16)
+
+def get_synthetic_commit_date(index_commit, nb_commits):
+    """Returns the date of the commit with the given index in a history of nb_commits commits.
+    """
+    return m_history_start + datetime.timedelta(seconds=index_commit * max(1, m_history_seconds // nb_commits))
+
+def get_first_index_since(since, nb_commits):
+    """Returns the index of the oldest commit whose date is not before since in a history of nb_commits
+    commits (nb_commits if there is none).
+    """
+    step = max(1, m_history_seconds // nb_commits)
+    seconds = (datetime.datetime.strptime(since, "%Y-%m-%dT%H:%M:%SZ") - m_history_start).total_seconds()
+    return min(nb_commits, max(0, math.ceil(seconds / step)))
+
+#######################################################################
+# Mock GitHub API.
+
+class MockGitHubHandler(http.server.BaseHTTPRequestHandler):
+    """Emulates the GitHub API endpoints used by grevos for the synthetic repos:
+    - /repos/{owner}/{repo}/commits (sha, since, per_page and page parameters, Link header).
+    - /repos/{owner}/{repo}/commits/{sha} (stats and files).
+    - /graphql (the history query of grevos only, see grevos.m_graphql_history_query).
+    """
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately: without this, every reply on a kept-alive connection
+    # would wait for the delayed ACK of the client.
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = url.path.strip("/").split("/")
+        if len(parts) == 4 and parts[0] == "repos" and parts[3] == "commits":
+            self.reply_commits(parts[2], parse_qs(url.query))
+        elif len(parts) == 5 and parts[0] == "repos" and parts[3] == "commits":
+            self.reply_commit(parts[2], parts[4])
+        else:
+            self.reply(404, {"message": "Not Found"})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if urlparse(self.path).path == "/graphql":
+            self.reply_graphql(json.loads(body.decode('utf-8'))["variables"])
+        else:
+            self.reply(404, {"message": "Not Found"})
+
+    def reply_commits(self, repo_name, query):
+        nb_commits = get_repo_nb_commits(repo_name)
+        per_page = int(query.get("per_page", ["30"])[0])
+        page = int(query.get("page", ["1"])[0])
+        first_index = get_first_index_since(query["since"][0], nb_commits) if "since" in query else 0
+        # Most recent commits first.
+        last_index = nb_commits - 1 - (page - 1) * per_page
+        page_commits = []
+        for index_commit in range(last_index, max(first_index, last_index - per_page + 1) - 1, -1):
+            commit = get_synthetic_commit(repo_name, index_commit, self.server.nb_authors)
+            page_commits.append({"sha": commit["sha"],
+                                 "author": {"login": commit["login"]} if commit["login"] else None,
+                                 "commit": {"author": {"name": commit["name"], "email": commit["email"], "date": commit["date"]}}})
+        headers = {}
+        nb_pages = max(1, math.ceil((nb_commits - first_index) / per_page))
+        if page < nb_pages:
+            base_url = "http://%s:%d%s" % (self.server.server_address[0], self.server.server_address[1], urlparse(self.path).path)
+            params = "&".join("%s=%s" % (k, v[0]) for k, v in query.items() if k != "page")
+            headers["Link"] = '<%s?%s&page=%d>; rel="next", <%s?%s&page=%d>; rel="last"' % (base_url, params, page + 1, base_url, params, nb_pages)
+        self.reply(200, page_commits, headers)
+
+    def reply_commit(self, repo_name, sha):
+        index_commit = get_index_commit(sha) if len(sha) == 40 else None
+        commit = get_synthetic_commit(repo_name, index_commit, self.server.nb_authors) if index_commit != None and index_commit < get_repo_nb_commits(repo_name) else None
+        if commit == None or commit["sha"] != sha:
+            self.reply(404, {"message": "Not Found"})
+            return
+        self.reply(200, {"sha": sha,
+                         "commit": {"author": {"name": commit["name"], "email": commit["email"], "date": commit["date"]}},
+                         "stats": {"additions": commit["additions"], "deletions": commit["deletions"], "total": commit["additions"] + commit["deletions"]},
+                         "files": [{"filename": "src/file%d.py" % (index_commit % 100), "status": "modified"}]})
+
+    def reply_graphql(self, variables):
+        repo_name = variables["repo"]
+        nb_commits = get_repo_nb_commits(repo_name)
+        first_index = get_first_index_since(variables["since"], nb_commits) if variables.get("since") else 0
+        # The cursor is the index of the next commit to return, most recent commits first.
+        last_index = int(variables["cursor"]) if variables.get("cursor") else nb_commits - 1
+        nodes = []
+        for index_commit in range(last_index, max(first_index, last_index - variables["pageSize"] + 1) - 1, -1):
+            commit = get_synthetic_commit(repo_name, index_commit, self.server.nb_authors)
+            # Git timestamps come with the time zone of the author.
+            date = datetime.datetime.strptime(commit["date"], "%Y-%m-%dT%H:%M:%SZ") + datetime.timedelta(hours=1)
+            nodes.append({"oid": commit["sha"],
+                          "additions": commit["additions"],
+                          "deletions": commit["deletions"],
+                          "author": {"name": commit["name"], "email": commit["email"], "date": date.strftime("%Y-%m-%dT%H:%M:%S+01:00"), "user": {"login": commit["login"]} if commit["login"] else None}})
+        next_index = last_index - len(nodes)
+        has_next_page = next_index >= first_index
+        history = {"totalCount": max(0, nb_commits - first_index),
+                   "pageInfo": {"hasNextPage": has_next_page, "endCursor": str(next_index) if has_next_page else None},
+                   "nodes": nodes}
+        self.reply(200, {"data": {"repository": {"object": {"history": history}}}})
+
+    def reply(self, status_code, the_json, headers=None):
+        data = json.dumps(the_json).encode('utf-8')
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("X-RateLimit-Limit", "1000000")
+        self.send_header("X-RateLimit-Remaining", "1000000")
+        self.send_header("X-RateLimit-Reset", str(int(time.time()) + 3600))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+def serve_mock_github(port, nb_authors):
+    """Runs the mock GitHub API server on the given port (in a dedicated process, see main()).
+    """
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", port), MockGitHubHandler)
+    server.daemon_threads = True
+    server.nb_authors = nb_authors
+    server.serve_forever()
+
+def wait_for_mock_github(server, port):
+    """Waits until the mock GitHub API server (running in the given process) accepts connections on the
+    given port. Exits if it does not within m_server_start_timeout seconds.
+    """
+    deadline = time.time() + m_server_start_timeout
+    while True:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return
+        except OSError:
+            if not server.is_alive() or time.time() > deadline:
+                print('mock GitHub API server not available on port %d' % port)
+                exit(1)
+            time.sleep(0.1)
+
+#######################################################################
+# Benchmark.
+
+def get_synthetic_rep_stats(repo_name, nb_authors):
+    """Returns the result dict of get_rep_stats(...) for a synthetic repo, as if it was fetched from the
+    mock server (used to build the cache of the sizes that are too large to be fetched).
+    """
+    result = {}
+    for index_commit in range(get_repo_nb_commits(repo_name) - 1, -1, -1):
+        commit = get_synthetic_commit(repo_name, index_commit, nb_authors)
+        one_result = {}
+        one_result["author"] = commit["login"] or grevos.m_unknown_username
+        one_result["author_email"] = commit["email"]
+        one_result["author_name"] = commit["name"]
+        one_result["sha"] = commit["sha"]
+        one_result["date"] = commit["date"]
+        one_result["stats"] = {"additions": commit["additions"], "deletions": commit["deletions"], "total": commit["additions"] + commit["deletions"], "difference": commit["additions"] - commit["deletions"]}
+        one_result["date_unix"] = grevos.unix_time_millis(datetime.datetime.strptime(commit["date"], "%Y-%m-%dT%H:%M:%SZ"))
+        one_result["owner"] = m_owner
+        one_result["repo"] = repo_name
+        one_result["branch"] = m_branch
+        result.setdefault(one_result["author"], []).append(one_result)
+    return result
+
+def get_phase(seconds, nb_commits, **kwargs):
+    """Returns the JSON object describing a phase of the benchmark.
+    """
+    phase = {"seconds": round(seconds, 4), "commits_per_second": round(nb_commits / seconds) if seconds > 0 else None}
+    phase.update(kwargs)
+    return phase
+
+def get_peak_memory_mb():
+    """Returns the peak resident memory of the current process, in MB.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes on Linux.
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def run_benchmark(nb_commits, nb_repos, nb_authors, fetch, fetch_workers, cache_backend, api, port, work_folder):
+    """Runs the benchmark of a given size and returns its results as a JSON object.
+
+    Runs in a dedicated process (see main()) so that the peak memory is the one of that size only.
+    The output of grevos is discarded.
+    """
+    # grevos loads its templates relatively to the current folder.
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    repos = [get_repo_name(i, nb_commits // nb_repos + (1 if i < nb_commits % nb_repos else 0)) for i in range(nb_repos)]
+    cache_folder = os.path.join(work_folder, "cache")
+    output_folder = os.path.join(work_folder, "output")
+    os.makedirs(cache_folder)
+    os.makedirs(output_folder)
+    source_file = os.path.join(work_folder, "benchmark_%d.csv" % nb_commits)
+    with open(source_file, "w") as f:
+        for repo_name in repos:
+            f.write("http://,127.0.0.1:%d,,%s,%s,%s,https://github.com/{{owner}}/{{repository}}/commit/{{commit_sha}},,token\n" % (port, m_owner, repo_name, m_branch))
+    args = grevos.get_args_parser().parse_args(["-f", source_file, "-c", cache_folder, "-o", output_folder, "-cb", cache_backend, "-api", api, "-fw", str(fetch_workers)])
+
+    phases = {}
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        grevos.init_settings(args)
+        state = grevos.init_state([source_file])
+        source = state["sources"][0]
+
+        def get_all_rep_stats():
+            return [grevos.get_rep_stats(row[0], row[1], row[2], row[3], row[4], row[5], row[7], row[8], idx, len(state["to_process"])) for idx, row in enumerate(state["to_process"], 1)]
+
+        if fetch:
+            start = time.perf_counter()
+            get_all_rep_stats()
+            seconds = time.perf_counter() - start
+            # One request per commit with the REST API.
+            nb_requests = sum(math.ceil(get_repo_nb_commits(r) / m_commits_per_page) + (get_repo_nb_commits(r) if api == "rest" else 0) for r in repos)
+            phases["fetch"] = get_phase(seconds, nb_commits, requests=nb_requests, requests_per_second=round(nb_requests / seconds))
+        else:
+            for row in state["to_process"]:
+                r = get_synthetic_rep_stats(row[4], nb_authors)
+                grevos.cache(grevos.get_rep_stats_cache_url(row[0], row[1], row[2], row[3], row[4], row[5], row[7]), r, [x for l in r.values() for x in l])
+            phases["fetch"] = None
+
+        # Cold load: the JSON manifests are rebuilt while loading, as after an upgrade. Note that the
+        # cache files are most likely in the OS file cache anyway.
+        for row in state["to_process"]:
+            manifest_file = grevos.get_cache_manifest_filename_with_path(grevos.get_rep_stats_cache_url(row[0], row[1], row[2], row[3], row[4], row[5], row[7]))
+            if os.path.exists(manifest_file):
+                os.remove(manifest_file)
+        start = time.perf_counter()
+        get_all_rep_stats()
+        phases["cache_load_cold"] = get_phase(time.perf_counter() - start, nb_commits)
+        start = time.perf_counter()
+        rep_stats = get_all_rep_stats()
+        phases["cache_load_warm"] = get_phase(time.perf_counter() - start, nb_commits)
+
+        # Same as refresh_state(state, args), without the fetch.
+        start = time.perf_counter()
+        for r in rep_stats:
+            new_commits = grevos.to_commits(r)
+            new_commits = grevos.remove_duplicate_commits(new_commits, source["sha_index"])
+            source["runs"] = grevos.add_to_runs(source["runs"], new_commits, None, None, source["commits_to_ignore"])
+        result = grevos.populate_all_totals(grevos.merge_runs(source["runs"]))
+        phases["post_processing"] = get_phase(time.perf_counter() - start, nb_commits)
+        rep_stats = None
+
+        # The CSV and HTML outputs are timed by grevos itself (see grevos.add_metric(keys, value)).
+        grevos.m_metrics.pop("phases", None)
+        grevos.write_outputs(result, args, source_file, source["repos_html"], source["commits_url_patterns"], grevos.m_now)
+        phases["csv_write"] = get_phase(grevos.m_metrics["phases"]["csv_output"], nb_commits, bytes=os.path.getsize(grevos.get_csv_output_filename_with_path(source_file)))
+        phases["html_render"] = get_phase(grevos.m_metrics["phases"]["html_output"], nb_commits, bytes=os.path.getsize(grevos.get_html_output_filename_with_path(source_file)))
+
+    return {"nb_commits": nb_commits,
+            "nb_repos": nb_repos,
+            "nb_authors": nb_authors,
+            "cache_backend": cache_backend,
+            "api": api,
+            "phases": phases,
+            "peak_memory_mb": get_peak_memory_mb()}
+
+def print_results(results):
+    """Prints a summary of the results of the benchmark.
+    """
+    for r in results:
+        print("\n%d commits, %d repos, %d authors (%s cache, %s API), peak memory: %.1f MB" % (r["nb_commits"], r["nb_repos"], r["nb_authors"], r["cache_backend"], r["api"], r["peak_memory_mb"]))
+        for name, phase in r["phases"].items():
+            if phase:
+                print("    %-16s %10.3f s %12s commits/s" % (name, phase["seconds"], phase["commits_per_second"]))
+            else:
+                print("    %-16s %10s" % (name, "skipped"))
+
+def main():
+    """Entry point: runs the benchmark of every size and writes the results.
+    """
+    print("GREVOS benchmark")
+    print("----------------\n")
+
+    parser = argparse.ArgumentParser(description='Benchmark grevos against a local mock of the GitHub API.')
+    parser.add_argument('-s', '--sizes', type=int, nargs='*', help='Total numbers of commits (spread over the repos) to benchmark, default: %s.' % " ".join(str(x) for x in m_sizes))
+    parser.add_argument('-r', '--repos', type=int, nargs='?', default=m_nb_repos, help='Number of repositories, default: %d.' % m_nb_repos)
+    parser.add_argument('-a', '--authors', type=int, nargs='?', default=m_nb_authors, help='Number of authors, default: %d.' % m_nb_authors)
+    parser.add_argument('-mf', '--max_fetch_commits', type=int, nargs='?', default=m_max_fetch_commits, help='Only sizes up to that number of commits are fetched from the mock server (one request per commit with the REST API), the cache of the larger ones is generated directly, default: %d.' % m_max_fetch_commits)
+    parser.add_argument('-fw', '--fetch_workers', type=int, nargs='?', default=m_fetch_workers, help='Number of commit details fetched concurrently (see grevos --fetch_workers), default: %d.' % m_fetch_workers)
+    parser.add_argument('-cb', '--cache_backend', type=str, nargs='?', default=m_cache_backend, choices=["json", "sqlite", "columnar"], help='Cache backend (see grevos --cache_backend), default: \'%s\'.' % m_cache_backend)
+    parser.add_argument('-api', '--api', type=str, nargs='?', default=m_api, choices=["rest", "graphql"], help='GitHub API used to fetch the commits (see grevos --api), default: \'%s\'.' % m_api)
+    parser.add_argument('-p', '--port', type=int, nargs='?', default=m_port, help='Port of the mock GitHub API server, default: %d.' % m_port)
+    parser.add_argument('-o', '--output_file', type=str, nargs='?', default=m_output_file, help='JSON file where the results are written, default: \'%s\'.' % m_output_file)
+    args = parser.parse_args()
+    sizes = args.sizes or m_sizes
+    if min(sizes) < args.repos:
+        print('sizes must be greater than or equal to the number of repositories')
+        exit(1)
+
+    # Processes are spawned (rather than forked) so that each size starts with a fresh process.
+    context = multiprocessing.get_context("spawn")
+    server = context.Process(target=serve_mock_github, args=(args.port, args.authors), daemon=True)
+    server.start()
+    wait_for_mock_github(server, args.port)
+
+    results = []
+    try:
+        for nb_commits in sizes:
+            print("Benchmarking %d commits..." % nb_commits)
+            work_folder = tempfile.mkdtemp(prefix="grevos_benchmark_")
+            try:
+                with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                    results.append(executor.submit(run_benchmark, nb_commits, args.repos, args.authors, nb_commits <= args.max_fetch_commits, args.fetch_workers, args.cache_backend, args.api, args.port, work_folder).result())
+            finally:
+                shutil.rmtree(work_folder, ignore_errors=True)
+    finally:
+        server.terminate()
+
+    print_results(results)
+    report = {"date": datetime.datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ"),
+              "python": platform.python_version(),
+              "platform": platform.platform(),
+              "cpu_count": os.cpu_count(),
+              "fetch_workers": args.fetch_workers,
+              "results": results}
+    with open(args.output_file, "w") as f:
+        json.dump(report, f, indent=4)
+    print("\nResults written to: %s" % args.output_file)
+
+#######################################################################
+# Entry point.
+if __name__ == "__main__":
+    main()
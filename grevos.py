@@ -4,6 +4,11 @@
 https://github.com/pferrot/grevos
 """
 import json
+import sqlite3
+import sys
+import mmap
+import struct
+from array import array
 import argparse
 import re
 import csv
@@ -11,8 +16,22 @@ import datetime
 import os.path
 import hashlib
 import copy
-
-from requests import get
+import concurrent.futures
+import multiprocessing
+import threading
+import time
+import math
+import itertools
+import operator
+import subprocess
+import queue
+import hmac
+import http.server
+from urllib.parse import urlparse
+
+from requests import Session
+from requests.adapters import HTTPAdapter
+from requests.exceptions import RequestException
 from jinja2 import Environment, FileSystemLoader
 
 #######################################################################
@@ -22,20 +41,175 @@ from jinja2 import Environment, FileSystemLoader
 # when the schema has been modified with a new version.
 m_schema_version = 3
 m_cache_folder = 'cache'
+# Subfolder of m_cache_folder where the details of every commit are cached by SHA.
+m_commits_cache_folder = 'commits'
+# 'json' stores one JSON file per repo (rewritten when new commits are found), 'sqlite'
+# stores all repos in one SQLite database where new commits are simply inserted and
+# 'columnar' stores one compact binary file per repo (see cache_columnar(...)).
+m_cache_backends = ["json", "sqlite", "columnar"]
+m_cache_backend = "json"
+m_sqlite_filename = 'grevos.sqlite'
+m_sqlite_connection = None
+m_sqlite_lock = threading.Lock()
+m_columnar_extension = 'col'
+m_columnar_magic = b'GREVOSC1'
+# Columns of the columnar cache: name -> array typecode ('s' for the raw SHA bytes).
+# String columns contain indexes in the strings table, m_columnar_no_string meaning None.
+m_columnar_columns = [("sha", "s"), ("date", "q"), ("additions", "q"), ("deletions", "q"), ("total", "q"), ("difference", "q"),
+                      ("author", "I"), ("author_name", "I"), ("author_email", "I"), ("owner", "I"), ("repo", "I"), ("branch", "I")]
+m_columnar_no_string = 0xFFFFFFFF
+# Keys of the JSON objects of the commits (see get_rep_stats(...)), in the order they are set.
+m_commit_json_keys = ["author", "author_email", "author_name", "sha", "date", "stats", "date_unix", "owner", "repo", "branch"]
+# Rows of a given repo are identified by their cache key, i.e. the name the JSON cache
+# file would have (see get_cache_filename(url)), which includes m_schema_version.
+m_sqlite_schema = """
+CREATE TABLE IF NOT EXISTS commits (
+    cache_key TEXT NOT NULL,
+    sha TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    repo TEXT NOT NULL,
+    branch TEXT NOT NULL,
+    author TEXT NOT NULL,
+    author_name TEXT,
+    author_email TEXT,
+    date TEXT NOT NULL,
+    date_unix REAL NOT NULL,
+    PRIMARY KEY (cache_key, sha)
+);
+CREATE TABLE IF NOT EXISTS stats (
+    cache_key TEXT NOT NULL,
+    sha TEXT NOT NULL,
+    additions INTEGER NOT NULL,
+    deletions INTEGER NOT NULL,
+    total INTEGER NOT NULL,
+    difference INTEGER NOT NULL,
+    PRIMARY KEY (cache_key, sha)
+);
+-- Crawls in progress, see checkpoint_sqlite(...).
+CREATE TABLE IF NOT EXISTS crawls (
+    cache_key TEXT NOT NULL PRIMARY KEY,
+    api TEXT NOT NULL,
+    since TEXT,
+    highest_date TEXT,
+    sha TEXT,
+    nb_commits INTEGER NOT NULL,
+    max_rowid INTEGER NOT NULL,
+    cursor TEXT NOT NULL,
+    index_page INTEGER NOT NULL,
+    counter INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS commits_repo_branch ON commits (owner, repo, branch);
+CREATE INDEX IF NOT EXISTS commits_sha ON commits (sha);
+CREATE INDEX IF NOT EXISTS commits_date ON commits (cache_key, date_unix);
+CREATE INDEX IF NOT EXISTS commits_author ON commits (author);
+"""
 m_output_folder = 'output'
 m_csv_date_format = "%m/%d/%Y %H:%M:%S"
+# 'wide' outputs one column per author and field (i.e. commits, additions,...), 'long' outputs
+# one row per commit with the same columns whatever the author.
+m_csv_layouts = ["wide", "long"]
+m_csv_layout = "wide"
+# Commits can be aggregated per author and bucket in the outputs (one point per commit by default).
+m_buckets = ["day", "week", "month"]
+m_bucket = None
 m_email_to_author_file = None
 m_email_to_author = {}
 m_name_to_author_file = None
 m_name_to_author = {}
 m_unknown_username = "<unknown>"
+# Commits adding one of these files are ignored (hidden option, see --ignore_files).
+m_ignore_files = None
 m_commits_to_ignore_separator = "-"
+# Number of commit details fetched concurrently for a given page of commits.
+m_fetch_workers = 1
+# 'sync' processes the repos one after the other, 'threaded' processes them concurrently in a pool
+# of m_max_concurrency threads.
+m_engines = ["sync", "threaded"]
+m_engine = "sync"
+# Max number of concurrent requests, overall and per host (only enforced with the 'threaded' engine).
+m_max_concurrency = 16
+m_max_host_concurrency = 8
+m_requests_semaphore = None
+m_hosts_semaphores = {}
+m_hosts_semaphores_lock = threading.Lock()
+# Page size when listing commits (GitHub default is 30, max is 100).
+m_commits_per_page = 100
+# The progress of a crawl is saved every m_checkpoint_pages pages (0 to disable), see checkpoint(...).
+m_checkpoint_pages = 10
+# HTTP session shared by all requests, see get_http_session().
+m_http_session = None
+m_http_session_lock = threading.Lock()
+m_auth_headers = {}
+# Rate limit status of every (host, token), see update_rate_limit(...).
+m_rate_limits = {}
+m_rate_limits_lock = threading.Lock()
+m_rate_limits_waits = set()
+# When token pooling is enabled, requests to a given host are spread over all the
+# tokens specified for that host in the source file.
+m_pool_tokens = False
+m_host_tokens = {}
+m_max_request_attempts = 10
+# 'rest' needs one request per commit to get its stats, 'graphql' gets the stats of a whole page at once.
+m_apis = ["rest", "graphql"]
+m_api = "rest"
+# Rows whose scheme starts with this prefix (e.g. 'git+https://', 'git+file://') are processed from
+# a local bare mirror of the repo with 'git log' instead of the GitHub API, see get_commits_git(...).
+m_git_scheme_prefix = "git+"
+# Subfolder of m_cache_folder where the mirrors are stored.
+m_git_mirrors_folder = 'git'
+m_git_mirrors_locks = {}
+m_git_mirrors_locks_lock = threading.Lock()
+# The output of 'git log' is parsed in a pool of processes (created on first use, shut down by
+# shutdown_git_process_pool()). Processes are spawned: forking a process running threads is not safe.
+m_git_process_pool = None
+m_git_process_pool_lock = threading.Lock()
+# (Clone URL, branch, since) -> (mirror path, future of get_git_log(...)) of the 'git log' jobs
+# submitted upfront, see submit_git_logs(to_process, previous_rep_stats).
+m_git_logs = {}
+m_git_logs_lock = threading.Lock()
+# Repos already in the cache are not queried for new commits (e.g. the cache is kept up to date by
+# the webhook receiver, see serve_webhooks(to_process, port)).
+m_cache_only = False
+# Secret of the GitHub webhook, used to check the signature of the payloads received.
+m_webhook_secret = None
+# GitHub lists at most that many commits in a push webhook payload: a push listing that many commits
+# may have more.
+m_max_push_commits = 2048
+# Metrics of the run (timings, HTTP requests, cache hits,...), see add_metric(keys, value) and
+# write_metrics(). They are only written if requested (JSON file and/or Prometheus textfile).
+m_metrics = {}
+m_metrics_lock = threading.Lock()
+m_metrics_file = None
+m_prometheus_file = None
+# Progress of the crawl of a repo is reported at most every m_progress_interval seconds.
+m_progress_interval = 5
+m_graphql_history_query = """
+query($owner: String!, $repo: String!, $branch: String!, $since: GitTimestamp, $cursor: String, $pageSize: Int!) {
+  repository(owner: $owner, name: $repo) {
+    object(expression: $branch) {
+      ... on Commit {
+        history(first: $pageSize, since: $since, after: $cursor) {
+          totalCount
+          pageInfo { hasNextPage endCursor }
+          nodes { oid additions deletions author { name email date user { login } } }
+        }
+      }
+    }
+  }
+}
+"""
 m_now = datetime.datetime.now()
 m_epoch = datetime.datetime.utcfromtimestamp(0)
 # OTHERS is used when only top contributors are displayed. In that case,
 # we still want to display how much the rest of the contributors contributed.
 m_others_username = "OTHERS"
 m_total_username = "TOTAL"
+# Whether the data of every chart of the HTML output is written to its own file (see --html_data_files).
+m_html_data_files = False
+# Source file -> filenames (with path) of the chart data files of the HTML output generated last for it (see write_html_output(...)).
+m_html_data_files_written = {}
+# Minimum number of data points of a series in the HTML output when downsampled (see --max_points_html).
+m_min_points_per_series = 3
 
 #######################################################################
 # All methods defined first. See entry point at the end of the file.
@@ -59,6 +233,336 @@ def unix_time_millis(dt):
     """
     return (dt - m_epoch).total_seconds() * 1000
 
+def add_metric(keys, value=1):
+    """Adds value to the metric of the run identified by keys, a tuple of the keys of the nested dicts
+    of m_metrics, e.g. ("cache", "repos", "hits"). The metric is created if needed.
+    """
+    with m_metrics_lock:
+        d = m_metrics
+        for k in keys[:-1]:
+            d = d.setdefault(k, {})
+        d[keys[-1]] = d.get(keys[-1], 0) + value
+
+def min_metric(keys, value):
+    """Sets the metric of the run identified by keys (see add_metric(keys, value)) to value if it is
+    lower than its current value (or if it is not set yet).
+    """
+    with m_metrics_lock:
+        d = m_metrics
+        for k in keys[:-1]:
+            d = d.setdefault(k, {})
+        if not keys[-1] in d or value < d[keys[-1]]:
+            d[keys[-1]] = value
+
+class Commit:
+    """Compact record of a commit used by the post-processing (see to_commits(r)).
+
+    The JSON objects returned by get_rep_stats(...) (and stored in the cache) carry their own
+    copies of the owner, repo and branch strings, the stats in a sub-dict and the date as a string.
+    Records use slots instead, the strings are interned (i.e. shared by all the commits of a repo
+    or an author) and the date is the UNIX Epoch time in seconds.
+
+    The total_* attributes are set by populate_totals(the_list). nb_commits is 1, except for the
+    records aggregating the commits of a bucket (see bucket_results(r, bucket)).
+
+    The columnar cache loads its commits as records directly (see get_cache_body_columnar(...)),
+    which then end up in result dicts: records can also be read like the JSON objects (e.g. x["sha"]
+    or dict(x)), see get(key, default).
+    """
+    __slots__ = ("sha", "date", "author", "author_name", "author_email", "owner", "repo", "branch",
+                 "nb_commits", "additions", "deletions", "total", "difference",
+                 "total_nb_commits", "total_additions", "total_deletions", "total_total", "total_difference")
+
+    def __init__(self, x):
+        """Creates the record of a given commit JSON object (see get_rep_stats(...)).
+        """
+        self.sha = x.get("sha")
+        self.date = int(x["date_unix"] // 1000)
+        self.author = sys.intern(x["author"])
+        self.author_name = sys.intern(x["author_name"]) if x.get("author_name") else None
+        self.author_email = sys.intern(x["author_email"]) if x.get("author_email") else None
+        self.owner = sys.intern(x["owner"])
+        self.repo = sys.intern(x["repo"])
+        self.branch = sys.intern(x["branch"])
+        stats = x["stats"]
+        self.nb_commits = 1
+        self.additions = stats["additions"]
+        self.deletions = stats["deletions"]
+        self.total = stats["total"]
+        self.difference = stats["difference"]
+        self.total_nb_commits = None
+        self.total_additions = None
+        self.total_deletions = None
+        self.total_total = None
+        self.total_difference = None
+
+    def copy(self):
+        """Returns a new record with the same attributes.
+        """
+        c = Commit.__new__(Commit)
+        c.sha = self.sha
+        c.date = self.date
+        c.author = self.author
+        c.author_name = self.author_name
+        c.author_email = self.author_email
+        c.owner = self.owner
+        c.repo = self.repo
+        c.branch = self.branch
+        c.nb_commits = self.nb_commits
+        c.additions = self.additions
+        c.deletions = self.deletions
+        c.total = self.total
+        c.difference = self.difference
+        c.total_nb_commits = self.total_nb_commits
+        c.total_additions = self.total_additions
+        c.total_deletions = self.total_deletions
+        c.total_total = self.total_total
+        c.total_difference = self.total_difference
+        return c
+
+    def get(self, key, default=None):
+        """Returns the value of a given key of the JSON object of the commit (see get_rep_stats(...)),
+        or default if the JSON object would not have it.
+        """
+        if key == "date":
+            value = (m_epoch + datetime.timedelta(seconds=self.date)).strftime("%Y-%m-%dT%H:%M:%SZ")
+        elif key == "date_unix":
+            value = self.date * 1000.0
+        elif key == "stats":
+            value = {"additions": self.additions, "deletions": self.deletions, "total": self.total, "difference": self.difference}
+        elif key in m_commit_json_keys:
+            value = getattr(self, key)
+        else:
+            value = None
+        return default if value == None else value
+
+    def keys(self):
+        return [k for k in m_commit_json_keys if self.get(k) != None]
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value == None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self.get(key) != None
+
+def to_commits(r):
+    """Returns a new dict with the same keys as a given result dict (see get_rep_stats(...)) where
+    the JSON objects are replaced with Commit records.
+
+    Records already in r (see get_cache_body_columnar(...)) are copied: the post-processing updates
+    them, whereas r is left untouched.
+    """
+    return {k: [x.copy() if isinstance(x, Commit) else Commit(x) for x in r[k]] for k in r.keys()}
+
+def get_host_semaphore(host):
+    """Returns the semaphore limiting the number of concurrent requests to a given host.
+    """
+    with m_hosts_semaphores_lock:
+        if not host in m_hosts_semaphores:
+            m_hosts_semaphores[host] = threading.BoundedSemaphore(m_max_host_concurrency)
+        return m_hosts_semaphores[host]
+
+def get_http_session():
+    """Returns the HTTP session shared by all requests (created on first call).
+
+    The session keeps connections alive with one connection pool per host, big enough
+    for all the requests that can be performed concurrently, and negotiates gzip compression.
+    """
+    global m_http_session
+    with m_http_session_lock:
+        if not m_http_session:
+            session = Session()
+            adapter = HTTPAdapter(pool_maxsize=max(m_fetch_workers, m_max_host_concurrency if m_engine == "threaded" else 1))
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers["Accept-Encoding"] = "gzip, deflate"
+            m_http_session = session
+        return m_http_session
+
+def get_auth_headers(git_token):
+    """Returns the headers used to authenticate against the GitHub API with the given token.
+    """
+    if not git_token in m_auth_headers:
+        m_auth_headers[git_token] = {'Authorization': 'token %s' % git_token}
+    return m_auth_headers[git_token]
+
+def http_get(url, git_token):
+    """Performs a GET request on the given URL and returns the reply.
+
+    See http_request(...) for details.
+    """
+    return http_request("GET", url, git_token)
+
+def http_post(url, git_token, the_json):
+    """Performs a POST request on the given URL with the_json as body and returns the reply.
+
+    See http_request(...) for details.
+    """
+    return http_request("POST", url, git_token, the_json)
+
+def http_request(method, url, git_token, the_json=None):
+    """Performs a request on the given URL and returns the reply.
+
+    The token used to authenticate is chosen by get_request_token(...), i.e. git_token unless
+    token pooling is enabled. When the rate limit is reached, the request is performed again
+    (with another token or after waiting for the rate limit reset) rather than failing, up to
+    m_max_request_attempts times.
+
+    If concurrency limits are enabled (i.e. m_requests_semaphore is set), at most m_max_concurrency
+    requests are in flight overall and at most m_max_host_concurrency for a given host.
+    """
+    session = get_http_session()
+    host = urlparse(url).netloc
+    attempt = 0
+    while True:
+        attempt = attempt + 1
+        token = get_request_token(host, git_token)
+        if not m_requests_semaphore:
+            reply = session.request(method, url, headers=get_auth_headers(token), json=the_json)
+        else:
+            # The host slot is acquired first so that requests waiting for a busy host do not hold
+            # global slots that requests to other hosts could use.
+            with get_host_semaphore(host), m_requests_semaphore:
+                reply = session.request(method, url, headers=get_auth_headers(token), json=the_json)
+        add_metric(("http", "requests", get_http_endpoint(url), str(reply.status_code)))
+        add_metric(("http", "bytes_sent"), len(reply.request.body) if reply.request.body else 0)
+        # Bytes read from the wire, i.e. before decompression (gzip).
+        add_metric(("http", "bytes_received"), reply.raw.tell())
+        is_rate_limited = update_rate_limit(host, token, reply)
+        if not is_rate_limited or attempt >= m_max_request_attempts:
+            return reply
+
+def get_http_endpoint(url):
+    """Returns the name of the GitHub API endpoint of a given URL, as reported in the metrics:
+    'commits' (list of commits), 'commit' (details of a commit), 'graphql' or 'other'.
+    """
+    path = urlparse(url).path
+    if path.endswith("/graphql"):
+        return "graphql"
+    elif re.search("/repos/[^/]+/[^/]+/commits$", path):
+        return "commits"
+    elif re.search("/repos/[^/]+/[^/]+/commits/[^/]+$", path):
+        return "commit"
+    return "other"
+
+def get_request_token(host, git_token):
+    """Returns the token to use for the next request to host.
+
+    Without token pooling, git_token is always returned. With token pooling, the token of host
+    with the highest number of remaining requests is returned (tokens whose rate limit is unknown
+    come first).
+
+    If the rate limit of all the candidate tokens is exhausted, waits until the first reset.
+    """
+    tokens = m_host_tokens[host] if m_pool_tokens and host in m_host_tokens else [git_token]
+    while True:
+        with m_rate_limits_lock:
+            now = time.time()
+            best_token = None
+            best_remaining = 0
+            first_reset = None
+            for token in tokens:
+                rate_limit = m_rate_limits.get((host, token))
+                if not rate_limit or rate_limit["reset"] <= now:
+                    remaining = float("inf")
+                else:
+                    remaining = rate_limit["remaining"]
+                    if first_reset == None or rate_limit["reset"] < first_reset:
+                        first_reset = rate_limit["reset"]
+                if remaining > best_remaining:
+                    best_token = token
+                    best_remaining = remaining
+            if best_token:
+                # Book the request right away so that concurrent requests are spread over the tokens.
+                rate_limit = m_rate_limits.get((host, best_token))
+                if rate_limit and rate_limit["reset"] > now:
+                    rate_limit["remaining"] = rate_limit["remaining"] - 1
+                return best_token
+        wait = max(first_reset - now, 0) + 1
+        # Concurrent requests wait for the same reset, only report it once.
+        with m_rate_limits_lock:
+            is_reported = (host, first_reset) in m_rate_limits_waits
+            m_rate_limits_waits.add((host, first_reset))
+        if not is_reported:
+            print("    Rate limit reached for %s, waiting %d second(s) (until %s)" % (host, wait, datetime.datetime.fromtimestamp(now + wait).strftime(m_csv_date_format)))
+        time.sleep(wait)
+
+def update_rate_limit(host, git_token, reply):
+    """Updates the rate limit status of a given host and token with the headers of reply.
+
+    Returns True if the request was rejected because of the rate limit, i.e. it must be performed again.
+    """
+    headers = reply.headers
+    now = time.time()
+    is_rate_limited = False
+    with m_rate_limits_lock:
+        rate_limit = m_rate_limits.get((host, git_token))
+        if "X-RateLimit-Remaining" in headers and "X-RateLimit-Reset" in headers:
+            rate_limit = {}
+            rate_limit["remaining"] = int(headers["X-RateLimit-Remaining"])
+            rate_limit["reset"] = int(headers["X-RateLimit-Reset"])
+            rate_limit["limit"] = int(headers["X-RateLimit-Limit"]) if "X-RateLimit-Limit" in headers else None
+            m_rate_limits[(host, git_token)] = rate_limit
+            # Tokens are not part of the metrics: the headroom is the lowest one of all the tokens of the host.
+            min_metric(("rate_limits", host, "remaining_min"), rate_limit["remaining"])
+        if reply.status_code in (403, 429):
+            # Secondary rate limits come with a 'Retry-After' header, primary ones with 0 remaining requests.
+            if "Retry-After" in headers:
+                rate_limit = {"remaining": 0, "reset": now + int(headers["Retry-After"]), "limit": rate_limit["limit"] if rate_limit else None}
+                m_rate_limits[(host, git_token)] = rate_limit
+                is_rate_limited = True
+            elif rate_limit and rate_limit["remaining"] == 0:
+                is_rate_limited = True
+            elif b"rate limit" in reply.content.lower():
+                # No indication of how long to wait: back off for a minute.
+                rate_limit = {"remaining": 0, "reset": now + 60, "limit": rate_limit["limit"] if rate_limit else None}
+                m_rate_limits[(host, git_token)] = rate_limit
+                is_rate_limited = True
+    return is_rate_limited
+
+def get_projected_time(host, git_token, nb_requests_left, seconds_per_request):
+    """Returns the projected number of seconds needed to perform nb_requests_left requests to host.
+
+    seconds_per_request is the average (wall clock) time per request observed so far. The rate limit
+    of the tokens is taken into account: if it does not allow to perform all the requests before it
+    is reset, the time to wait for the necessary number of resets (every hour) is added.
+    """
+    tokens = m_host_tokens[host] if m_pool_tokens and host in m_host_tokens else [git_token]
+    now = time.time()
+    available = 0
+    limit = 0
+    first_reset = None
+    with m_rate_limits_lock:
+        for token in tokens:
+            rate_limit = m_rate_limits.get((host, token))
+            if not rate_limit or not rate_limit["limit"]:
+                # Unknown rate limit (e.g. GitHub Enterprise with rate limiting disabled).
+                return nb_requests_left * seconds_per_request
+            if rate_limit["reset"] <= now:
+                available = available + rate_limit["limit"]
+            else:
+                available = available + rate_limit["remaining"]
+                if first_reset == None or rate_limit["reset"] < first_reset:
+                    first_reset = rate_limit["reset"]
+            limit = limit + rate_limit["limit"]
+    projected_time = nb_requests_left * seconds_per_request
+    if nb_requests_left > available and first_reset:
+        nb_resets = math.ceil((nb_requests_left - available) / limit)
+        projected_time = max(projected_time, first_reset - now + (nb_resets - 1) * 3600)
+    return projected_time
+
+def print_projected_time(host, git_token, index_page, nb_pages, nb_requests_per_page, start_time, nb_requests_done):
+    """Prints the progress of the pagination through the commits of a repo and the projected time
+    to completion (see get_projected_time(...)).
+    """
+    if nb_requests_done > 0:
+        seconds_per_request = (time.time() - start_time) / nb_requests_done
+        projected_time = get_projected_time(host, git_token, (nb_pages - index_page) * nb_requests_per_page, seconds_per_request)
+        print("    Page %d / %d done, projected time to completion: %s" % (index_page, nb_pages, datetime.timedelta(seconds=int(projected_time))))
+
 def get_commit_details(scheme, host, base_path, owner, repo, commit_sha, git_token):
     """Return the details of a given commit SHA, as a JSON object.
 
@@ -73,26 +577,24 @@ def get_commit_details(scheme, host, base_path, owner, repo, commit_sha, git_tok
         "date": W2011-04-14T16:00:49Z"
     }
 
+    The details are looked up in the commits cache first (see get_cached_commit_details(...)),
+    so that a commit that is part of several branches or repos is only fetched once.
+
     Return None in case the GitHub API returns anything else than a 200 status code.
     """
-    url = "%s%s%s/repos/%s/%s/commits/%s" % (scheme, host, base_path, owner, repo, commit_sha)
-    #print (url)
-    headers = \
-        {
-         'Authorization': 'token %s' % git_token
-        }
-    reply = get(url, headers=headers)
-    status_code = reply.status_code
-    if status_code == 200:
+    details = get_cached_commit_details(commit_sha)
+    if details == None:
+        url = "%s%s%s/repos/%s/%s/commits/%s" % (scheme, host, base_path, owner, repo, commit_sha)
+        #print (url)
+        reply = http_get(url, git_token)
+        status_code = reply.status_code
+        if status_code != 200:
+            print ("    Erreur retrieving commit (status code: %d) at %s" % (status_code, url))
+            return None
+
         out = reply.content
         js = json.loads(out.decode('utf-8'))
 
-        if args.ignore_files and "files" in js:
-            for f in js["files"]:
-                if "filename" in f and f["filename"] in args.ignore_files and "status" in f and f["status"] == "added":
-                    print ("    Ignoring commit %s because file '%s' was added" % (commit_sha, f["filename"]))
-                    return {}
-
         #print (json.dumps(js, indent=4, sort_keys=True))
         commit_date = None
         if "commit" in js and "author" in js["commit"] and "date" in js["commit"]["author"]:
@@ -100,129 +602,180 @@ def get_commit_details(scheme, host, base_path, owner, repo, commit_sha, git_tok
         else:
             print ("    Could not find commit date in \n\n%s" % json.dumps(js, indent=4, sort_keys=True))
 
-        result = {}
-        result["stats"] = js["stats"]
+        details = {}
+        details["stats"] = js["stats"]
         # Let track the difference as it may be what is most meaningful to measure.
-        result["stats"]["difference"] = result["stats"]["additions"] - result["stats"]["deletions"]
-        result["date"] = commit_date
-        return result
-    else:
-        print ("    Erreur retrieving commit (status code: %d) at %s" % (status_code, url))
-        return None
+        details["stats"]["difference"] = details["stats"]["additions"] - details["stats"]["deletions"]
+        details["date"] = commit_date
+        # Files added by the commit are kept so that ignore_files can be applied to cached details.
+        details["added_files"] = [f["filename"] for f in js.get("files", []) if "filename" in f and "status" in f and f["status"] == "added"]
+        if commit_date:
+            cache_commit_details(commit_sha, details)
+
+    if m_ignore_files:
+        for filename in details["added_files"]:
+            if filename in m_ignore_files:
+                print ("    Ignoring commit %s because file '%s' was added" % (commit_sha, filename))
+                return {}
 
-def remove_commits_to_ignore(r, min_commit_difference, max_commit_difference, commits_to_ignore):
-    """Removes commits listed in commits_to_ignore or those with too many lines added/removed from a given result set and returns it.
+    result = {}
+    result["stats"] = details["stats"]
+    result["date"] = details["date"]
+    return result
+
+def get_commits_details(scheme, host, base_path, owner, repo, commits_sha, git_token):
+    """Return the details of the given commit SHAs, as a list of JSON objects in the same order
+    as commits_sha.
+
+    Up to m_fetch_workers commits are fetched concurrently. See get_commit_details(...) for details
+    about the items in the returned list (an item is None if the commit could not be retrieved).
+    """
+    if m_fetch_workers <= 1 or len(commits_sha) <= 1:
+        return [get_commit_details(scheme, host, base_path, owner, repo, commit_sha, git_token) for commit_sha in commits_sha]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(m_fetch_workers, len(commits_sha))) as executor:
+        # map() returns the results in the order of the input, whatever the order of completion.
+        return list(executor.map(lambda commit_sha: get_commit_details(scheme, host, base_path, owner, repo, commit_sha, git_token), commits_sha))
+
+def is_commit_to_ignore(x, min_commit_difference, max_commit_difference, commits_to_ignore):
+    """Returns whether a given Commit record (see to_commits(r)) is listed in commits_to_ignore or has too
+    many lines added/removed, i.e. whether it must be ignored.
 
-    min_commit_difference in an integer. Commits with a 'difference' value greater than that value are removed.
-    max_commit_difference is an integer. Commits with a 'difference' value lower than that value are removed.
-    commits_to_ignore is a list of commits SHA. Commits with a 'sha' contained in that list are removed.
+    min_commit_difference in an integer. Commits with a 'difference' value greater than that value are ignored.
+    max_commit_difference is an integer. Commits with a 'difference' value lower than that value are ignored.
+    commits_to_ignore is a set of commits SHA. Commits with a 'sha' contained in that set are ignored.
 
     If min_commit_difference in None, then no check is done on the minimum value of the 'difference' metric.
     If max_commit_difference in None, then no check is done on the maximum value of the 'difference' metric.
     If commits_to_ignore is None, then no check is done on the value of the 'sha' of the commit.
     """
-    if r and len(r.keys()) > 0:
-        print("Removing commits to ignore")
-        to_remove_authors = []
-        for k in r.keys():
-            author_data = r[k]
-            to_remove_indexes = []
-            for idx, x  in enumerate(author_data):
-                if "stats" in x and "difference" in x["stats"] and max_commit_difference != None and x["stats"]["difference"] > max_commit_difference:
-                    print("    Removing commit because it is above the max difference limit in %s/%s: %s (%d)" % (x["owner"], x["repo"], x["sha"], x["stats"]["difference"]))
-                    to_remove_indexes.append(idx)
-                elif "stats" in x and "difference" in x["stats"] and min_commit_difference != None and x["stats"]["difference"] < min_commit_difference :
-                    print("    Removing commit because it is below the min difference limit in %s/%s: %s (%d)" % (x["owner"], x["repo"], x["sha"], x["stats"]["difference"]))
-                    to_remove_indexes.append(idx)
-                elif commits_to_ignore and len(commits_to_ignore) > 0 and "sha" in x and x["sha"] in commits_to_ignore:
-                    print("    Removing commit to ignore in %s/%s: %s" % (x["owner"], x["repo"], x["sha"]))
-                    to_remove_indexes.append(idx)
-            for idx in reversed(to_remove_indexes):
-                del author_data[idx]
-            # If an author does not have any commit left, he must be removed.
-            if len(r[k]) == 0:
-                to_remove_authors.append(k)
-        for author in to_remove_authors:
-            if author in r:
-                r.pop(author)
-    return r
+    if max_commit_difference != None and x.difference > max_commit_difference:
+        print("    Removing commit because it is above the max difference limit in %s/%s: %s (%d)" % (x.owner, x.repo, x.sha, x.difference))
+        add_metric(("commits_dropped", "max_commit_difference"))
+        return True
+    elif min_commit_difference != None and x.difference < min_commit_difference :
+        print("    Removing commit because it is below the min difference limit in %s/%s: %s (%d)" % (x.owner, x.repo, x.sha, x.difference))
+        add_metric(("commits_dropped", "min_commit_difference"))
+        return True
+    elif commits_to_ignore and x.sha and x.sha in commits_to_ignore:
+        print("    Removing commit to ignore in %s/%s: %s" % (x.owner, x.repo, x.sha))
+        add_metric(("commits_dropped", "commits_to_ignore"))
+        return True
+    return False
 
 def populate_totals(the_list):
-    """Adds a 'total_stats_author' object to every item in the_list.
-
-    the_list is a list of JSON objects, sorted chronologically, each JSON representing a commit
-    made by a given author. All items in the list belong to the same author.
-
-    Example item before processing:
-    {
-        "sha": "6b9b8c59703560f197c71adfe0ac9770cfeffb33",
-        "date": "2011-04-14T16:00:49Z",
-        "date_unix": "1302796849000.0",
-        "author": "jdoe",
-        "author_name": "John Doe",
-        "author_email": "jdoe@testmail.com",
-        "owner": "MyOrg",
-        "repo": "MyRepo",
-        "branch": "master",
-        "stats" : {
-            "additions" : 23,
-            "deletions" : 12,
-            "total"     : 35,
-            "difference": 11
-        }
-    }
+    """Sets the total_* attributes of every Commit record in the_list.
+
+    the_list is a list of Commit records (see to_commits(r)), sorted chronologically. All items in
+    the list belong to the same author.
+
+    Example item before processing (attributes only):
+        sha: "6b9b8c59703560f197c71adfe0ac9770cfeffb33"
+        date: 1302796849
+        author: "jdoe"
+        author_name: "John Doe"
+        author_email: "jdoe@testmail.com"
+        owner: "MyOrg"
+        repo: "MyRepo"
+        branch: "master"
+        additions: 23
+        deletions: 12
+        total: 35
+        difference: 11
+        total_nb_commits, total_additions, total_deletions, total_total, total_difference: None
 
     After processing:
-    {
-        "sha": "6b9b8c59703560f197c71adfe0ac9770cfeffb33",
-        "date": "2011-04-14T16:00:49Z",
-        "date_unix": "1302796849000.0",
-        "author": "jdoe",
-        "author_name": "John Doe",
-        "author_email": "jdoe@testmail.com",
-        "owner": "MyOrg",
-        "repo": "MyRepo",
-        "branch": "master",
-        "stats" : {
-            "additions" : 23,
-            "deletions" : 12,
-            "total"     : 35,
-            "difference": 11
-        },
-        "total_stats_author" : {
-            "nb_commits": 12
-            "additions" : 734,
-            "deletions" : 423,
-            "total"     : 1157,
-            "difference": 311
-        },
-    }
-
-    where 'total_stats_author' shows the sum of all items in the list until the
+        ...
+        total_nb_commits: 12
+        total_additions: 734
+        total_deletions: 423
+        total_total: 1157
+        total_difference: 311
+
+    where the total_* attributes show the sum of all items in the list until the
     current item (inclusive). So in the example above, the item is the 12th item
-    in the list (since nb_commits == 12).
+    in the list (since total_nb_commits == 12).
     """
     if the_list:
-        previous = None
-        for one_item in the_list:
-            total_stats_author = {}
-            if not previous:
-                total_stats_author["nb_commits"] = 1
-                total_stats_author["additions"] = one_item["stats"]["additions"]
-                total_stats_author["deletions"] = one_item["stats"]["deletions"]
-                total_stats_author["difference"] = one_item["stats"]["difference"]
-                total_stats_author["total"] = one_item["stats"]["total"]
-            else:
-                total_stats_author["nb_commits"] = previous["total_stats_author"]["nb_commits"] + 1
-                total_stats_author["additions"] = previous["total_stats_author"]["additions"] + one_item["stats"]["additions"]
-                total_stats_author["deletions"] = previous["total_stats_author"]["deletions"] + one_item["stats"]["deletions"]
-                total_stats_author["difference"] = previous["total_stats_author"]["difference"] + one_item["stats"]["difference"]
-                total_stats_author["total"] = previous["total_stats_author"]["total"] + one_item["stats"]["total"]
-            one_item["total_stats_author"] = total_stats_author
-            previous = one_item
-        return the_list
+        set_totals(the_list, get_running_totals([the_list])[0])
+    return the_list
+
+def populate_all_totals(r):
+    """Sets the total_* attributes of the Commit records of every author of a given dict (see
+    to_commits(r)), sorted chronologically (see populate_totals(the_list)). Returns the updated dict.
+
+    The totals of all the authors are computed at once (see get_running_totals(lists)).
+    """
+    for the_list, running_totals in zip(r.values(), get_running_totals(list(r.values()))):
+        set_totals(the_list, running_totals)
+    return r
+
+def set_totals(the_list, running_totals):
+    """Sets the total_* attributes of the Commit records in the_list to the given running totals
+    (see get_running_totals(lists)).
+    """
+    for one_item, nb_commits, additions, deletions, difference, total in zip(the_list, *running_totals):
+        one_item.total_nb_commits = nb_commits
+        one_item.total_additions = additions
+        one_item.total_deletions = deletions
+        one_item.total_difference = difference
+        one_item.total_total = total
+
+def get_running_totals(lists):
+    """Returns, for every list of Commit records in lists, the running totals of its items, i.e. the
+    sums of all the items of the list until the current item (inclusive).
+
+    The running totals of a list are a tuple of 5 lists (same length as the list of Commit records):
+    nb_commits, additions, deletions, difference and total.
+    """
+    fields = ["nb_commits", "additions", "deletions", "difference", "total"]
+    return [tuple(list(itertools.accumulate(map(operator.attrgetter(f), the_list))) for f in fields) for the_list in lists]
+
+def get_bucket_start(date, bucket):
+    """Returns the start of the bucket ('day', 'week' or 'month') a given date belongs to.
+
+    Both are UNIX Epoch times in seconds (UTC). Weeks start on Monday.
+    """
+    if bucket == "day":
+        return date - date % 86400
+    elif bucket == "week":
+        # 01/01/1970 was a Thursday.
+        days = date // 86400
+        return (days - (days + 3) % 7) * 86400
     else:
-        return the_list
+        d = datetime.datetime.utcfromtimestamp(date)
+        return int(unix_time_millis(datetime.datetime(d.year, d.month, 1)) // 1000)
+
+def bucket_results(r, bucket):
+    """Returns a new dict where the Commit records (sorted chronologically) of every author of a given
+    dict (see to_commits(r)) are aggregated per bucket ('day', 'week' or 'month'), with the totals populated.
+
+    There is one record per author and bucket: its date is the start of the bucket, its stats and
+    nb_commits are the sums over the commits of the bucket. Its author is the key of the dict (e.g.
+    OTHERS) and its SHA, owner, repo and branch are the ones of the last commit of the bucket.
+    """
+    result = {}
+    for k in r.keys():
+        buckets = []
+        for x in r[k]:
+            bucket_start = get_bucket_start(x.date, bucket)
+            if buckets and buckets[-1].date == bucket_start:
+                one_bucket = buckets[-1]
+                one_bucket.nb_commits = one_bucket.nb_commits + x.nb_commits
+                one_bucket.additions = one_bucket.additions + x.additions
+                one_bucket.deletions = one_bucket.deletions + x.deletions
+                one_bucket.total = one_bucket.total + x.total
+                one_bucket.difference = one_bucket.difference + x.difference
+            else:
+                one_bucket = copy.copy(x)
+                one_bucket.date = bucket_start
+                one_bucket.author = k
+                buckets.append(one_bucket)
+            one_bucket.sha = x.sha
+            one_bucket.owner = x.owner
+            one_bucket.repo = x.repo
+            one_bucket.branch = x.branch
+        result[k] = buckets
+    return populate_all_totals(result)
 
 def get_csv_output_filename(source_file_full_path):
     """Returns the filename of the generated CSV file.
@@ -267,6 +820,18 @@ def get_html_output_filename_with_path(source_file_full_path):
     """
     return get_filename_with_path(get_html_output_filename(source_file_full_path), m_output_folder)
 
+def get_html_data_filename_with_path(source_file_full_path, chart_type, chart_data):
+    """Returns the filename with path of the file with the data of a given chart of the HTML output.
+
+    Unlike the other generated files, the filename does not contain the generation date but a hash
+    of the data, so that a web server can let browsers cache the files as long as they do not change.
+    """
+    base_name = os.path.basename(source_file_full_path)
+    if base_name.find('.') > 0:
+        base_name = base_name[:base_name.find('.')]
+    filename = '%s_%s_%s.json' % (base_name, chart_type, hashlib.sha1(chart_data.encode("utf-8")).hexdigest()[:12])
+    return get_filename_with_path(filename, m_output_folder)
+
 def get_filename_with_path(filename, folder):
     """Returns the filename with path, given the base filename and folder.
     """
@@ -282,8 +847,8 @@ def get_cache_filename(url):
     as legacy cache files be ignored (because a different schema version will lead to a different
     SHA1, i.e. different filename). This comes at the cost of having the fetch the data from GitHub again.
     """
-    # Important to take args.ignore_files into account as the result depends on this parameter.
-    cache_filename = hashlib.sha1(("%s%s%d" % (url, ",".join(args.ignore_files) if args.ignore_files else "", m_schema_version)).encode('utf-8')).hexdigest()
+    # Important to take m_ignore_files into account as the result depends on this parameter.
+    cache_filename = hashlib.sha1(("%s%s%d" % (url, ",".join(m_ignore_files) if m_ignore_files else "", m_schema_version)).encode('utf-8')).hexdigest()
     #print("Cache filename: %s" % cache_filename)
     return cache_filename
 
@@ -294,13 +859,463 @@ def get_cache_filename_with_path(url):
     """
     return get_filename_with_path(get_cache_filename(url), m_cache_folder)
 
-def cache(url, the_json):
-    """Saves the given JSON in a local cache file (overwrites it if it exists already).
+def get_commit_cache_filename_with_path(commit_sha):
+    """Returns the filename (with full path) of the commits cache file for a given commit SHA.
+
+    Commits cache files are stored in the 'commits' subfolder of the cache folder, in a subfolder
+    named after the first 2 characters of the SHA (to not end up with a huge number of files
+    in one single folder).
+    """
+    return get_filename_with_path("%s/%s" % (commit_sha[:2], commit_sha), get_filename_with_path(m_commits_cache_folder, m_cache_folder))
+
+def cache_commit_details(commit_sha, details):
+    """Saves the details of a given commit in the commits cache.
+
+    The details of a commit never change, so they are cached by SHA whatever the repo and
+    branch they come from, and never need to be invalidated.
+    """
+    cache_file = get_commit_cache_filename_with_path(commit_sha)
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    # Write then rename so that concurrent fetches never read a partially written file.
+    tmp_file = "%s.%d.tmp" % (cache_file, threading.get_ident())
+    with open(tmp_file, 'w') as outfile:
+        json.dump(details, outfile)
+    os.replace(tmp_file, cache_file)
+
+def get_cached_commit_details(commit_sha):
+    """Returns the details of a given commit from the commits cache, or None if not cached.
+
+    See cache_commit_details(...).
+    """
+    cache_file = get_commit_cache_filename_with_path(commit_sha)
+    if not os.path.exists(cache_file):
+        add_metric(("cache", "commits", "misses"))
+        return None
+    try:
+        with open(cache_file) as json_data:
+            details = json.load(json_data)
+        add_metric(("cache", "commits", "hits"))
+        return details
+    except:
+        print("    Error loading commit cache from file %s, so ignoring file" % cache_file)
+        add_metric(("cache", "commits", "misses"))
+        return None
+
+def cache(url, the_json, new_entries):
+    """Saves the given JSON in the cache for a given URL.
+
+    With the JSON and columnar backends, the cache file is overwritten with the_json. With the
+    SQLite backend, only new_entries (the commits that are in the_json but were not in the cache
+    yet) are inserted.
+    """
+    if m_cache_backend == "sqlite":
+        cache_sqlite(url, new_entries)
+    elif m_cache_backend == "columnar":
+        cache_columnar(url, the_json)
+    else:
+        #print ("    Caching: %s" % url)
+        cache_data = json.dumps(the_json).encode('utf-8')
+        # Write then rename so that the cache file is never partially written (e.g. run interrupted,
+        # or cache read by another run while the webhook receiver updates it).
+        cache_file = get_cache_filename_with_path(url)
+        tmp_file = "%s.%d.tmp" % (cache_file, threading.get_ident())
+        with open(tmp_file, 'wb') as outfile:
+            outfile.write(cache_data)
+        os.replace(tmp_file, cache_file)
+        cache_manifest(url, cache_data, the_json)
+
+def cache_columnar(url, the_json):
+    """Saves the given JSON in the columnar cache file for a given URL.
+
+    File layout:
+    - m_columnar_magic followed by the size of the header (unsigned 64 bits, little endian).
+    - The header, in JSON: number of commits, most recent date and SHA (so that they can be read
+      without loading the commits), byte order, strings table and offset/size of every column.
+    - The columns, each one starting on an 8 bytes boundary: SHAs as raw bytes, dates (epoch in
+      seconds) and stats as 64 bits integers, strings (author, owner,...) as 32 bits indexes in
+      the strings table.
+
+    Commits are stored author after author, in the order of the_json, so that get_cache_columnar(...)
+    returns the exact same JSON.
+    """
+    commits = [x for author in the_json.keys() for x in the_json[author]]
+    strings = []
+    strings_indexes = {}
+    highest = None
+    columns = {}
+    for (name, typecode) in m_columnar_columns:
+        columns[name] = bytearray() if typecode == "s" else array(typecode)
+    for x in commits:
+        columns["sha"].extend(bytes.fromhex(x["sha"]))
+        columns["date"].append(int(x["date_unix"] // 1000))
+        for stat in ["additions", "deletions", "total", "difference"]:
+            columns[stat].append(x["stats"][stat])
+        for name in ["author", "author_name", "author_email", "owner", "repo", "branch"]:
+            value = x.get(name)
+            if value == None:
+                columns[name].append(m_columnar_no_string)
+            else:
+                if not value in strings_indexes:
+                    strings_indexes[value] = len(strings)
+                    strings.append(value)
+                columns[name].append(strings_indexes[value])
+        # Same as the last item of merge_sort_results(...), which is a stable sort.
+        if not highest or x["date_unix"] >= highest["date_unix"]:
+            highest = x
+
+    header = {}
+    header["nb_commits"] = len(commits)
+    header["highest_date"] = highest["date"] if highest else None
+    header["sha"] = highest["sha"] if highest else None
+    header["sha_size"] = len(commits[0]["sha"]) // 2 if commits else 0
+    header["byteorder"] = sys.byteorder
+    header["strings"] = strings
+    header["columns"] = {}
+    offset = 0
+    blocks = []
+    for (name, typecode) in m_columnar_columns:
+        data = bytes(columns[name]) if typecode == "s" else columns[name].tobytes()
+        padding = (8 - len(data) % 8) % 8
+        header["columns"][name] = [offset, len(data), typecode]
+        blocks.append(data + b"\0" * padding)
+        offset = offset + len(data) + padding
+    header_bytes = json.dumps(header).encode('utf-8')
+    header_bytes = header_bytes + b" " * ((8 - len(header_bytes) % 8) % 8)
+
+    cache_file = "%s.%s" % (get_cache_filename_with_path(url), m_columnar_extension)
+    tmp_file = "%s.tmp" % cache_file
+    with open(tmp_file, 'wb') as outfile:
+        outfile.write(m_columnar_magic)
+        outfile.write(struct.pack("<Q", len(header_bytes)))
+        outfile.write(header_bytes)
+        for block in blocks:
+            outfile.write(block)
+    os.replace(tmp_file, cache_file)
+
+def get_columnar_header(mm, cache_file):
+    """Returns a tuple (header, data_offset) for a given memory-mapped columnar cache file (see
+    cache_columnar(...)), where data_offset is the offset of the first column.
+    """
+    if mm[:len(m_columnar_magic)] != m_columnar_magic:
+        raise ValueError("Not a columnar cache file: %s" % cache_file)
+    header_size = struct.unpack_from("<Q", mm, len(m_columnar_magic))[0]
+    data_offset = len(m_columnar_magic) + 8 + header_size
+    return (json.loads(mm[len(m_columnar_magic) + 8:data_offset].decode('utf-8')), data_offset)
+
+def get_columnar_commits(mm, header, data_offset):
+    """Returns the result dict (see get_rep_stats(...)) stored in a given memory-mapped columnar
+    cache file (see cache_columnar(...)), with Commit records instead of JSON objects.
+
+    Records are built straight from the columns: the integers are read from arrays (one copy of
+    every column, no list of Python objects) and the strings come from the strings table, so that
+    all the commits share the same (interned) strings.
+    """
+    columns = {}
+    view = memoryview(mm)
+    for (name, typecode) in m_columnar_columns:
+        (offset, size, typecode) = header["columns"][name]
+        column = view[data_offset + offset:data_offset + offset + size]
+        if column.nbytes != size:
+            raise ValueError("Truncated columnar cache file")
+        if typecode == "s":
+            columns[name] = column.hex()
+        else:
+            columns[name] = array(typecode)
+            columns[name].frombytes(column)
+            if header["byteorder"] != sys.byteorder:
+                columns[name].byteswap()
+        column.release()
+    view.release()
+
+    strings = dict(enumerate(sys.intern(x) for x in header["strings"]))
+    strings[m_columnar_no_string] = None
+    shas = columns["sha"]
+    sha_size = 2 * header["sha_size"]
+    d = {}
+    for (i, date, author, author_name, author_email, owner, repo, branch, additions, deletions, total, difference) in zip(
+            range(header["nb_commits"]), columns["date"], columns["author"], columns["author_name"], columns["author_email"], columns["owner"],
+            columns["repo"], columns["branch"], columns["additions"], columns["deletions"], columns["total"], columns["difference"]):
+        # Same as Commit(x) for the JSON object of the commit (see get_rep_stats(...)).
+        x = Commit.__new__(Commit)
+        x.sha = shas[i * sha_size:(i + 1) * sha_size]
+        x.date = date
+        x.author = strings[author]
+        x.author_name = strings[author_name] or None
+        x.author_email = strings[author_email] or None
+        x.owner = strings[owner]
+        x.repo = strings[repo]
+        x.branch = strings[branch]
+        x.nb_commits = 1
+        x.additions = additions
+        x.deletions = deletions
+        x.total = total
+        x.difference = difference
+        x.total_nb_commits = None
+        x.total_additions = None
+        x.total_deletions = None
+        x.total_total = None
+        x.total_difference = None
+        author_data = d.get(x.author)
+        if author_data == None:
+            author_data = []
+            d[x.author] = author_data
+        author_data.append(x)
+    return d
+
+def get_cache_columnar(url):
+    """Returns the cache for a given URL from the columnar cache file, see get_cache(url)
+    and cache_columnar(...).
+
+    The commits are Commit records (see get_columnar_commits(...)).
+    """
+    cache_file = "%s.%s" % (get_cache_filename_with_path(url), m_columnar_extension)
+    if not os.path.exists(cache_file):
+        print("    No cache (file does not exist: %s)" % cache_file)
+        return None
+    print("    Cache found (file: %s)" % cache_file)
+    try:
+        with open(cache_file, 'rb') as infile:
+            with mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                (header, data_offset) = get_columnar_header(mm, cache_file)
+                d = get_columnar_commits(mm, header, data_offset)
+        return (d, header["highest_date"], header["sha"], header["nb_commits"])
+    except:
+        print("    Error loading cache from file %s, so ignoring file" % cache_file)
+        return None
+
+def get_cache_manifest_columnar(url):
+    """Returns the manifest of the columnar cache file for a given URL, see get_cache_manifest(url).
+
+    The manifest is the header of the file (see cache_columnar(...)): only the first page of the file
+    is read. Like with the JSON backend, it also holds the size and modification time of the file,
+    so that get_cache_body_columnar(...) can make sure the file has not been replaced in the meantime.
+    """
+    cache_file = "%s.%s" % (get_cache_filename_with_path(url), m_columnar_extension)
+    if not os.path.exists(cache_file):
+        return None
+    try:
+        with open(cache_file, 'rb') as infile:
+            stat = os.fstat(infile.fileno())
+            with mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                (header, data_offset) = get_columnar_header(mm, cache_file)
+        manifest = {}
+        manifest["highest_date"] = header["highest_date"]
+        manifest["sha"] = header["sha"]
+        manifest["nb_commits"] = header["nb_commits"]
+        manifest["size"] = stat.st_size
+        manifest["mtime_ns"] = stat.st_mtime_ns
+        print("    Cache found (file: %s)" % cache_file)
+        return manifest
+    except:
+        # get_cache(url) logs the error.
+        return None
+
+def get_cache_body_columnar(url, manifest):
+    """Returns the result dict in the columnar cache file for a given URL (see get_columnar_commits(...)),
+    after checking that it matches its manifest (see get_cache_manifest_columnar(url)).
+
+    Returns None if the file does not match (it has been replaced since) or if an error occurs, in
+    which case the file is deleted, as get_cache_columnar(url) would ignore it.
+    """
+    cache_file = "%s.%s" % (get_cache_filename_with_path(url), m_columnar_extension)
+    try:
+        with open(cache_file, 'rb') as infile:
+            stat = os.fstat(infile.fileno())
+            if manifest["size"] != stat.st_size or manifest["mtime_ns"] != stat.st_mtime_ns:
+                print("    Cache file %s does not match its header anymore, so loading it again" % cache_file)
+                return None
+            with mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                (header, data_offset) = get_columnar_header(mm, cache_file)
+                return get_columnar_commits(mm, header, data_offset)
+    except:
+        print("    Error loading cache from file %s, so ignoring file" % cache_file)
+    if os.path.exists(cache_file):
+        os.remove(cache_file)
+    return None
+
+def get_sqlite_connection():
+    """Returns the connection to the SQLite cache database (created on first call).
+
+    Must be called while holding m_sqlite_lock, which protects all uses of the connection.
+    """
+    global m_sqlite_connection
+    if not m_sqlite_connection:
+        connection = sqlite3.connect(get_filename_with_path(m_sqlite_filename, m_cache_folder), check_same_thread=False)
+        connection.executescript(m_sqlite_schema)
+        m_sqlite_connection = connection
+    return m_sqlite_connection
+
+def upsert_sqlite(connection, cache_key, new_entries):
+    """Upserts the given commits for a given cache key, within the current transaction of the given
+    connection.
+    """
+    connection.executemany("INSERT INTO commits (cache_key, sha, owner, repo, branch, author, author_name, author_email, date, date_unix) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                           "ON CONFLICT (cache_key, sha) DO UPDATE SET owner = excluded.owner, repo = excluded.repo, branch = excluded.branch, author = excluded.author, "
+                           "author_name = excluded.author_name, author_email = excluded.author_email, date = excluded.date, date_unix = excluded.date_unix",
+                           [(cache_key, x["sha"], x["owner"], x["repo"], x["branch"], x["author"], x.get("author_name"), x.get("author_email"), x["date"], x["date_unix"]) for x in new_entries])
+    connection.executemany("INSERT INTO stats (cache_key, sha, additions, deletions, total, difference) VALUES (?, ?, ?, ?, ?, ?) "
+                           "ON CONFLICT (cache_key, sha) DO UPDATE SET additions = excluded.additions, deletions = excluded.deletions, total = excluded.total, difference = excluded.difference",
+                           [(cache_key, x["sha"], x["stats"]["additions"], x["stats"]["deletions"], x["stats"]["total"], x["stats"]["difference"]) for x in new_entries])
+
+def cache_sqlite(url, new_entries):
+    """Inserts the given commits in the SQLite cache for a given URL, in one single transaction.
+
+    get_rep_stats(...) does not use it: it saves every page of commits as it is fetched (see
+    checkpoint_sqlite(...)).
+    """
+    cache_key = get_cache_filename(url)
+    with m_sqlite_lock:
+        connection = get_sqlite_connection()
+        with connection:
+            upsert_sqlite(connection, cache_key, new_entries)
+
+def get_sqlite_commits(connection, cache_key, min_rowid, max_rowid):
+    """Returns the list of the JSON objects of the commits for a given cache key in the SQLite cache,
+    in insertion order (i.e. the order of the JSON cache).
+
+    Only the rows whose rowid is greater than min_rowid and lower or equal to max_rowid are returned
+    (None meaning no limit), see checkpoint_sqlite(...).
+    """
+    rows = connection.execute("SELECT c.sha, c.owner, c.repo, c.branch, c.author, c.author_name, c.author_email, c.date, c.date_unix, s.additions, s.deletions, s.total, s.difference "
+                              "FROM commits c JOIN stats s ON s.cache_key = c.cache_key AND s.sha = c.sha "
+                              "WHERE c.cache_key = ? AND (? IS NULL OR c.rowid > ?) AND (? IS NULL OR c.rowid <= ?) ORDER BY c.rowid",
+                              (cache_key, min_rowid, min_rowid, max_rowid, max_rowid)).fetchall()
+    commits = []
+    for row in rows:
+        one_result = {}
+        one_result["author"] = row[4]
+        if row[6]:
+            one_result["author_email"] = row[6]
+        if row[5]:
+            one_result["author_name"] = row[5]
+        one_result["sha"] = row[0]
+        one_result["date"] = row[7]
+        one_result["stats"] = {"additions": row[9], "deletions": row[10], "total": row[11], "difference": row[12]}
+        one_result["date_unix"] = row[8]
+        one_result["owner"] = row[1]
+        one_result["repo"] = row[2]
+        one_result["branch"] = row[3]
+        commits.append(one_result)
+    return commits
+
+def get_sqlite_highest_commit(connection, cache_key):
+    """Returns a tuple (highest_date, sha, nb_commits) for a given cache key in the SQLite cache (see
+    get_highest_commit(r)), retrieved with indexed queries.
+    """
+    nb_commits = connection.execute("SELECT COUNT(*) FROM commits WHERE cache_key = ?", (cache_key,)).fetchone()[0]
+    if nb_commits == 0:
+        return (None, None, 0)
+    (highest_date, sha) = connection.execute("SELECT date, sha FROM commits WHERE cache_key = ? ORDER BY date_unix DESC, rowid DESC LIMIT 1", (cache_key,)).fetchone()
+    return (highest_date, sha, nb_commits)
+
+def get_cache_sqlite(url):
+    """Returns the cache for a given URL from the SQLite cache, see get_cache(url).
+    """
+    database = get_filename_with_path(m_sqlite_filename, m_cache_folder)
+    manifest = get_cache_manifest_sqlite(url)
+    if manifest == None:
+        print("    No cache (no commit in %s for key %s)" % (database, get_cache_filename(url)))
+        return None
+    return (get_cache_body_sqlite(url, manifest), manifest["highest_date"], manifest["sha"], manifest["nb_commits"])
+
+def get_cache_manifest_sqlite(url):
+    """Returns the manifest of the SQLite cache for a given URL, see get_cache_manifest(url).
+
+    The most recent commit and the number of commits are retrieved with indexed queries (see
+    get_sqlite_highest_commit(...)), the commits themselves are only loaded by get_cache_body_sqlite(...).
+    If a crawl is in progress (see checkpoint_sqlite(...)), these are the ones from before the crawl.
+
+    Returns None if there is no commit for the URL.
+    """
+    cache_key = get_cache_filename(url)
+    database = get_filename_with_path(m_sqlite_filename, m_cache_folder)
+    with m_sqlite_lock:
+        connection = get_sqlite_connection()
+        crawl = connection.execute("SELECT highest_date, sha, nb_commits, max_rowid FROM crawls WHERE cache_key = ?", (cache_key,)).fetchone()
+        if crawl:
+            (highest_date, sha, nb_commits, max_rowid) = crawl
+        else:
+            (highest_date, sha, nb_commits) = get_sqlite_highest_commit(connection, cache_key)
+            max_rowid = None
+    if nb_commits == 0:
+        return None
+    print("    Cache found (database: %s, key: %s)" % (database, cache_key))
+    manifest = {}
+    manifest["highest_date"] = highest_date
+    manifest["sha"] = sha
+    manifest["nb_commits"] = nb_commits
+    manifest["max_rowid"] = max_rowid
+    return manifest
+
+def get_cache_body_sqlite(url, manifest):
+    """Returns the result dict in the SQLite cache for a given URL, as of its manifest (see
+    get_cache_manifest_sqlite(url)).
+    """
+    cache_key = get_cache_filename(url)
+    max_rowid = manifest["max_rowid"]
+    with m_sqlite_lock:
+        connection = get_sqlite_connection()
+        if max_rowid == None:
+            # A crawl might have saved commits since the manifest was read.
+            crawl = connection.execute("SELECT max_rowid FROM crawls WHERE cache_key = ?", (cache_key,)).fetchone()
+            max_rowid = crawl[0] if crawl else None
+        commits = get_sqlite_commits(connection, cache_key, None, max_rowid)
+    d = {}
+    for one_result in commits:
+        d.setdefault(one_result["author"], []).append(one_result)
+    return d
+
+def checkpoint_sqlite(url, since, commits, cursor, index_page, counter):
+    """Saves a page of commits of the crawl of a given URL in the SQLite cache, see checkpoint(...).
+
+    The commits and the progress of the crawl (a row of the crawls table) are saved in the same
+    transaction. The first time, the most recent commit and the number of commits before the crawl
+    are saved along with the highest rowid of the commits: get_cache_manifest_sqlite(url) returns
+    them until the crawl completes and the commits of the crawl are the ones with a higher rowid.
+    Otherwise, as commits are listed from the most recent one, an interrupted crawl would leave a
+    gap between the cache and its most recent commit.
+
+    cursor is None for the last page: the crawl is then complete and its row is deleted.
     """
-    #print ("    Caching: %s" % url)
-    with open(get_cache_filename_with_path(url), 'w') as outfile:
-        json.dump(the_json, outfile)
+    cache_key = get_cache_filename(url)
+    with m_sqlite_lock:
+        connection = get_sqlite_connection()
+        with connection:
+            if cursor and not connection.execute("SELECT 1 FROM crawls WHERE cache_key = ?", (cache_key,)).fetchone():
+                (highest_date, sha, nb_commits) = get_sqlite_highest_commit(connection, cache_key)
+                max_rowid = connection.execute("SELECT MAX(rowid) FROM commits WHERE cache_key = ?", (cache_key,)).fetchone()[0] or 0
+                connection.execute("INSERT INTO crawls (cache_key, api, since, highest_date, sha, nb_commits, max_rowid, cursor, index_page, counter) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                   (cache_key, m_api, since, highest_date, sha, nb_commits, max_rowid, cursor, index_page, counter))
+            upsert_sqlite(connection, cache_key, commits)
+            if cursor:
+                connection.execute("UPDATE crawls SET cursor = ?, index_page = ?, counter = ? WHERE cache_key = ?", (cursor, index_page, counter, cache_key))
+            else:
+                connection.execute("DELETE FROM crawls WHERE cache_key = ?", (cache_key,))
 
+def get_checkpoint_sqlite(url, since):
+    """Returns the progress of an interrupted crawl of a given URL in the SQLite cache, see
+    get_checkpoint(url, since) and checkpoint_sqlite(...).
+
+    If it does not match the crawl to perform, the commits of the interrupted crawl are deleted.
+    """
+    cache_key = get_cache_filename(url)
+    database = get_filename_with_path(m_sqlite_filename, m_cache_folder)
+    with m_sqlite_lock:
+        connection = get_sqlite_connection()
+        crawl = connection.execute("SELECT api, since, max_rowid, cursor, index_page, counter FROM crawls WHERE cache_key = ?", (cache_key,)).fetchone()
+        if not crawl:
+            return None
+        (api, crawl_since, max_rowid, cursor, index_page, counter) = crawl
+        if api != m_api or crawl_since != since:
+            print("    Checkpoint does not match the crawl to perform (database: %s, key: %s), so ignoring it" % (database, cache_key))
+            with connection:
+                connection.execute("DELETE FROM stats WHERE cache_key = ? AND sha IN (SELECT sha FROM commits WHERE cache_key = ? AND rowid > ?)", (cache_key, cache_key, max_rowid))
+                connection.execute("DELETE FROM commits WHERE cache_key = ? AND rowid > ?", (cache_key, max_rowid))
+                connection.execute("DELETE FROM crawls WHERE cache_key = ?", (cache_key,))
+            return None
+        commits = get_sqlite_commits(connection, cache_key, max_rowid, None)
+    print("    Checkpoint found (database: %s, key: %s)" % (database, cache_key))
+    return (commits, cursor, index_page, counter)
 
 def get_cache(url):
     """Returns the cache for a given URL.
@@ -312,6 +1327,10 @@ def get_cache(url):
 
     If an error occurs when reading the file, a message is logged and None is returned.
     """
+    if m_cache_backend == "sqlite":
+        return get_cache_sqlite(url)
+    elif m_cache_backend == "columnar":
+        return get_cache_columnar(url)
     cache_file = get_cache_filename_with_path(url)
     if not os.path.exists(cache_file):
         print("    No cache (file does not exist: %s)" % cache_file)
@@ -319,15 +1338,12 @@ def get_cache(url):
     else:
         print("    Cache found (file: %s)" % cache_file)
         try:
-            with open(cache_file) as json_data:
-                d = json.load(json_data)
-                merged_results = merge_sort_results(d)
-                nb_commits = len(merged_results)
-                highest_date = None
-                sha = None
-                if merged_results and len(merged_results) > 0:
-                    highest_date = merged_results[len(merged_results) - 1]["date"]
-                    sha = merged_results[len(merged_results) - 1]["sha"]
+            with open(cache_file, 'rb') as json_data:
+                cache_data = json_data.read()
+                d = json.loads(cache_data.decode('utf-8'))
+                (highest_date, sha, nb_commits) = get_highest_commit(d)
+                # No valid manifest if we get here (see get_cache_manifest(url)), create it for next time.
+                cache_manifest(url, cache_data, d)
 
                 #print ("Found cache, date: %s\n\n%s" % (highest_date, json.dumps(d, indent=4, sort_keys=True)))
                 return (d, highest_date, sha, nb_commits)
@@ -335,13 +1351,236 @@ def get_cache(url):
             print("    Error loading cache from file %s, so ignoring file" % cache_file)
             return None
 
+def get_highest_commit(r):
+    """Returns a tuple (highest_date, sha, nb_commits) for a given result dict (see get_rep_stats(...)),
+    where highest_date is the date of the most recent commit and sha the SHA of that commit.
+
+    This is the last item of merge_sort_results(r) (a stable sort, so the last of the most recent
+    commits in case several have the same date), found without sorting.
+    """
+    highest = None
+    nb_commits = 0
+    for author_data in r.values():
+        for x in author_data:
+            nb_commits = nb_commits + 1
+            if not highest or x["date_unix"] >= highest["date_unix"]:
+                highest = x
+    if not highest:
+        return (None, None, nb_commits)
+    return (highest["date"], highest["sha"], nb_commits)
+
+def get_cache_manifest_filename_with_path(url):
+    """Returns the filename (with full path) of the manifest of the JSON cache file for a given url.
+    """
+    return "%s.manifest" % get_cache_filename_with_path(url)
+
+def cache_manifest(url, cache_data, r):
+    """Saves the manifest of the JSON cache file for a given URL.
+
+    cache_data is the content of the cache file and r the corresponding result dict. The manifest
+    holds what is needed to query GitHub for new commits (see get_highest_commit(r)), the schema
+    version and what allows to make sure the manifest matches the cache file (size, modification
+    time and SHA1 checksum of the cache file).
+    """
+    cache_file = get_cache_filename_with_path(url)
+    stat = os.stat(cache_file)
+    (highest_date, sha, nb_commits) = get_highest_commit(r)
+    manifest = {}
+    manifest["schema_version"] = m_schema_version
+    manifest["highest_date"] = highest_date
+    manifest["sha"] = sha
+    manifest["nb_commits"] = nb_commits
+    manifest["size"] = stat.st_size
+    manifest["mtime_ns"] = stat.st_mtime_ns
+    manifest["checksum"] = hashlib.sha1(cache_data).hexdigest()
+    manifest_file = get_cache_manifest_filename_with_path(url)
+    tmp_file = "%s.%d.tmp" % (manifest_file, threading.get_ident())
+    with open(tmp_file, 'w') as outfile:
+        json.dump(manifest, outfile)
+    os.replace(tmp_file, manifest_file)
+
+def get_cache_manifest(url):
+    """Returns the manifest of the JSON cache file for a given URL (see cache_manifest(...)).
+
+    Returns None if there is no manifest or if it does not match the cache file anymore (e.g. the
+    cache file has been written by an older version), in which case get_cache(url) must be used.
+    With the columnar backend, the manifest is the header of the cache file (see
+    get_cache_manifest_columnar(url)). With the SQLite backend, it is retrieved with indexed queries
+    (see get_cache_manifest_sqlite(url)).
+    """
+    if m_cache_backend == "columnar":
+        return get_cache_manifest_columnar(url)
+    elif m_cache_backend == "sqlite":
+        return get_cache_manifest_sqlite(url)
+    manifest_file = get_cache_manifest_filename_with_path(url)
+    cache_file = get_cache_filename_with_path(url)
+    if not os.path.exists(manifest_file) or not os.path.exists(cache_file):
+        return None
+    try:
+        with open(manifest_file) as json_data:
+            manifest = json.load(json_data)
+        stat = os.stat(cache_file)
+        if manifest["schema_version"] != m_schema_version or manifest["size"] != stat.st_size or manifest["mtime_ns"] != stat.st_mtime_ns:
+            return None
+        print("    Cache manifest found (file: %s)" % manifest_file)
+        return manifest
+    except:
+        print("    Error loading cache manifest from file %s, so ignoring file" % manifest_file)
+        return None
+
+def get_cache_body(url, manifest):
+    """Returns the JSON in the cache file for a given URL, after checking that it matches the
+    checksum of its manifest.
+
+    Returns None if an error occurs or if the checksum does not match (the manifest file is then
+    deleted so that get_cache(url) is used next time).
+
+    With the columnar and SQLite backends, see get_cache_body_columnar(url, manifest) and
+    get_cache_body_sqlite(url, manifest).
+    """
+    if m_cache_backend == "columnar":
+        return get_cache_body_columnar(url, manifest)
+    elif m_cache_backend == "sqlite":
+        return get_cache_body_sqlite(url, manifest)
+    cache_file = get_cache_filename_with_path(url)
+    try:
+        with open(cache_file, 'rb') as infile:
+            cache_data = infile.read()
+        if hashlib.sha1(cache_data).hexdigest() == manifest["checksum"]:
+            return json.loads(cache_data.decode('utf-8'))
+        print("    Cache file %s does not match its manifest, so ignoring manifest" % cache_file)
+    except:
+        print("    Error loading cache from file %s, so ignoring manifest" % cache_file)
+    os.remove(get_cache_manifest_filename_with_path(url))
+    return None
+
+def get_checkpoint_filename_with_path(url):
+    """Returns the filename (with full path) of the checkpoint file of the crawl of a given url.
+    """
+    return "%s.checkpoint" % get_cache_filename_with_path(url)
+
+def checkpoint(url, since, commits, cursor, index_page, counter):
+    """Saves the progress of the crawl of a given URL so that it can be resumed if it does not complete
+    (see get_checkpoint(url, since)).
+
+    The checkpoint file is made of JSON lines: the first one identifies the crawl (schema version, API
+    and 'since' sent to GitHub), then there is one line per checkpoint with the commits found since the
+    previous checkpoint, the cursor of the next page (next URL with the REST API, end cursor with
+    the GraphQL API), the number of pages done and the number of commits processed so far.
+    Lines are only appended: a crash while writing one cannot corrupt the previous checkpoints.
+
+    With the SQLite backend, the commits are saved in the cache right away, see checkpoint_sqlite(...).
+    """
+    if m_cache_backend == "sqlite":
+        checkpoint_sqlite(url, since, commits, cursor, index_page, counter)
+        return
+    checkpoint_file = get_checkpoint_filename_with_path(url)
+    lines = []
+    if not os.path.exists(checkpoint_file):
+        lines.append(json.dumps({"schema_version": m_schema_version, "api": m_api, "since": since}))
+    lines.append(json.dumps({"cursor": cursor, "index_page": index_page, "counter": counter, "commits": commits}))
+    with open(checkpoint_file, 'a') as outfile:
+        outfile.write("%s\n" % "\n".join(lines))
+
+def get_checkpoint(url, since):
+    """Returns the progress of an interrupted crawl of a given URL (see checkpoint(...)) as a tuple
+    (commits, cursor, index_page, counter), commits being the list of all the commits found so far.
+
+    Returns None if there is no checkpoint or if it does not match the crawl to perform (e.g. the API
+    is not the same), in which case the checkpoint file is deleted.
+
+    With the SQLite backend, see get_checkpoint_sqlite(url, since).
+    """
+    if m_cache_backend == "sqlite":
+        return get_checkpoint_sqlite(url, since)
+    checkpoint_file = get_checkpoint_filename_with_path(url)
+    if not os.path.exists(checkpoint_file):
+        return None
+    commits = []
+    cursor = None
+    index_page = 0
+    counter = 0
+    try:
+        with open(checkpoint_file) as infile:
+            lines = infile.read().split("\n")
+        header = json.loads(lines[0])
+        if header["schema_version"] == m_schema_version and header["api"] == m_api and header["since"] == since:
+            for line in lines[1:]:
+                try:
+                    one_checkpoint = json.loads(line)
+                except ValueError:
+                    # Last line not completely written.
+                    break
+                commits.extend(one_checkpoint["commits"])
+                cursor = one_checkpoint["cursor"]
+                index_page = one_checkpoint["index_page"]
+                counter = one_checkpoint["counter"]
+    except:
+        print("    Error loading checkpoint from file %s, so ignoring file" % checkpoint_file)
+    if not cursor:
+        remove_checkpoint(url)
+        return None
+    print("    Checkpoint found (file: %s)" % checkpoint_file)
+    return (commits, cursor, index_page, counter)
+
+def remove_checkpoint(url):
+    """Deletes the checkpoint file of the crawl of a given URL, if any, once the crawl is complete.
+
+    With the SQLite backend, the row of the crawl is deleted (see checkpoint_sqlite(...)).
+    """
+    if m_cache_backend == "sqlite":
+        with m_sqlite_lock:
+            connection = get_sqlite_connection()
+            with connection:
+                connection.execute("DELETE FROM crawls WHERE cache_key = ?", (get_cache_filename(url),))
+        return
+    checkpoint_file = get_checkpoint_filename_with_path(url)
+    if os.path.exists(checkpoint_file):
+        os.remove(checkpoint_file)
+
+def get_stale_filename_with_path(url):
+    """Returns the filename (with full path) of the file marking the cache of a given url as stale
+    (see mark_cache_stale(url)).
+    """
+    return "%s.stale" % get_cache_filename_with_path(url)
+
+def mark_cache_stale(url):
+    """Marks the cache of a given url as stale, i.e. commits more recent than the ones in the cache are
+    known to be missing (e.g. pushed commits that the webhook receiver could not add). The repo is then
+    crawled even with --cache_only, and the mark is removed once a crawl completes (see get_rep_stats(...)).
+    """
+    open(get_stale_filename_with_path(url), "w").close()
+
+def is_cache_stale(url):
+    """Returns whether the cache of a given url is marked as stale (see mark_cache_stale(url)).
+    """
+    return os.path.exists(get_stale_filename_with_path(url))
+
+def remove_stale_mark(url, crawl_start):
+    """Removes the stale mark of the cache of a given url (see mark_cache_stale(url)) after a crawl that
+    started at crawl_start (UNIX Epoch time in seconds), unless it was set in the meantime.
+    """
+    stale_file = get_stale_filename_with_path(url)
+    if os.path.exists(stale_file) and os.path.getmtime(stale_file) < crawl_start:
+        os.remove(stale_file)
+
+def get_rep_stats_cache_url(scheme, host, base_path, owner, repo, branch, since):
+    """Returns the URL identifying the cache of a given repo branch (see get_cache_filename(url)).
+    """
+    # Note that the page size is not part of the URL used as cache key, so that it can be
+    # changed without invalidating the existing cache files. The same cache is used whatever
+    # the API used to retrieve the commits.
+    return "%s%s%s/repos/%s/%s/commits?sha=%s%s" % (scheme, host, base_path, owner, repo, branch, "&since=%s" % since if since else "")
 
-def get_rep_stats(scheme, host, base_path, owner, repo, branch, since, git_token, index_repo, total_nb_repos):
+def get_rep_stats(scheme, host, base_path, owner, repo, branch, since, git_token, index_repo, total_nb_repos, previous=None):
     """Returns a dictionary where the keys are the authors and the values a list of their commits
     for a given repo defined by its scheme, host, base_path, owner and repo.
 
     git_token is a valid GitHub API token wth read access to the repository.
     index_repo and total_nb_repos and simply specified to log progress information.
+    previous is the result of a previous call for the same repo, if any (see refresh_state(state, args)):
+    the cache is then not read and the new commits are appended to the lists of previous, which
+    is returned.
 
     Simple example result with one single commit:
     {
@@ -376,9 +1615,9 @@ def get_rep_stats(scheme, host, base_path, owner, repo, branch, since, git_token
     Note that results are cached for future reuse. The cache will be udpated with new
     commits everytime the method is called.
     """
-    next_url = "%s%s%s/repos/%s/%s/commits?sha=%s%s" % (scheme, host, base_path, owner, repo, branch, "&since=%s" % since if since else "")
-    cache_url = next_url
-    print ("Processing: %s (%s)" % (next_url, "repo %d / %d" % (index_repo, total_nb_repos)))
+    cache_url = get_rep_stats_cache_url(scheme, host, base_path, owner, repo, branch, since)
+    print ("Processing: %s (%s)" % (cache_url, "repo %d / %d" % (index_repo, total_nb_repos)))
+    crawl_start = time.time()
 
     since_date = None
     # The 'original_since_date' is what the user specified, whereas the 'since_date'
@@ -391,272 +1630,767 @@ def get_rep_stats(scheme, host, base_path, owner, repo, branch, since, git_token
     counter = 0
     nb_cache = 0
     result = {}
-
-    from_cache = get_cache(cache_url)
+    # Commits that were not in the cache yet.
+    new_results = []
+    fetch_since = since
+
+    # With a manifest, GitHub can be queried for new commits right away: the cache body is
+    # only loaded when it is actually needed (result set to None until then, see below).
+    manifest = get_cache_manifest(cache_url) if previous == None else None
+    if previous != None:
+        # The commits found so far are already in memory.
+        from_cache = (previous,) + get_highest_commit(previous)
+        result = previous
+    elif manifest:
+        from_cache = (None, manifest["highest_date"], manifest["sha"], manifest["nb_commits"])
+    else:
+        from_cache = get_cache(cache_url)
     cache_sha = None
+    if previous == None:
+        add_metric(("cache", "repos", "hits" if from_cache and from_cache[1] else "misses"))
     # We found something in cache and there is a date.
     if from_cache and from_cache[1]:
         cache_date = from_cache[1]
         since_date = datetime.datetime.strptime(cache_date, "%Y-%m-%dT%H:%M:%SZ")
         #print("    Cache date: %s" % cache_date)
-        next_url = "%s%s%s/repos/%s/%s/commits?sha=%s%s" % (scheme, host, base_path, owner, repo, branch, "&since=%s" % cache_date if cache_date else "")
+        fetch_since = cache_date
         result = from_cache[0]
         cache_sha = from_cache[2]
         counter = from_cache[3]
         nb_cache = counter
-        print("    Recovered %d commits from cache" % counter)
+        print("    Recovered %d commits from %s" % (counter, "memory" if previous != None else "cache"))
+    # Index of the SHAs in the cache, used to detect duplicates (see below).
+    cache_shas = get_shas(from_cache[0]) if from_cache and from_cache[0] else set()
+
+    # Resume the previous crawl if it did not complete.
+    cursor = None
+    index_page = 0
+    # SHAs of the commits found before the checkpoint: with the REST API, new commits pushed
+    # in the meantime shift the pages, hence some of them can be retrieved again.
+    checkpoint_shas = set()
+    # With SQLite, every page is saved anyway (see checkpoint_sqlite(...)).
+    from_checkpoint = get_checkpoint(cache_url, fetch_since) if m_checkpoint_pages > 0 or m_cache_backend == "sqlite" else None
+    if from_checkpoint:
+        (checkpoint_commits, cursor, index_page, counter) = from_checkpoint
+        # The commits found so far are added to the ones of the cache.
+        if result == None:
+            result = get_cache_body(cache_url, manifest)
+            if result == None:
+                return get_rep_stats(scheme, host, base_path, owner, repo, branch, since, git_token, index_repo, total_nb_repos)
+            cache_shas = get_shas(result)
+        for one_result in checkpoint_commits:
+            result.setdefault(one_result["author"], []).append(one_result)
+            new_results.append(one_result)
+            if "sha" in one_result:
+                checkpoint_shas.add(one_result["sha"])
+        print("    Resuming from checkpoint (%d pages and %d commits processed so far)" % (index_page, counter))
+    # Index in new_results of the first commit not in the checkpoint file yet.
+    nb_checkpointed = len(new_results)
+
+    # An interrupted crawl must be completed: the next crawls only look for commits more recent
+    # than the ones it found.
+    if m_cache_only and previous == None and from_cache and from_cache[1] and not from_checkpoint and not is_cache_stale(cache_url):
+        print("    Cache only, not querying for new commits")
+        pages = []
+    elif is_git_scheme(scheme):
+        pages = get_commits_git(scheme, host, base_path, owner, repo, branch, fetch_since)
+    elif m_api == "graphql":
+        pages = get_commits_graphql(scheme, host, base_path, owner, repo, branch, fetch_since, git_token, cursor, index_page)
+    else:
+        pages = get_commits_rest(scheme, host, base_path, owner, repo, branch, fetch_since, git_token, cache_sha, cursor, index_page)
+
+    last_progress = time.time()
+    # Date of the last commit kept, for the progress messages.
+    last_date = None
+    for one_page in pages:
+        # None means that something went wrong (the error has already been logged).
+        if one_page == None:
+            return None
+        (page, next_cursor) = one_page
+
+        for commit in page:
+            commit_sha = commit["sha"]
+            if commit_sha in checkpoint_shas:
+                continue
+            author_login = commit["author"]
+            author_email = commit["author_email"]
+            author_name = commit["author_name"]
+            # Since we query 'since' the highest date from the cache, we should get the highest result
+            # from the cache in the response. So lets ignore it so that it is not duplicated.
+            if cache_sha and commit_sha == cache_sha:
+                #print("    Ignoring SHA from cache: %s" % cache_sha)
+                continue
+
+            if result == None:
+                result = get_cache_body(cache_url, manifest)
+                # The cache file does not match the manifest, start again without the manifest.
+                if result == None:
+                    return get_rep_stats(scheme, host, base_path, owner, repo, branch, since, git_token, index_repo, total_nb_repos)
+                cache_shas = get_shas(result)
+
+            one_result = {}
+
+            if not author_login:
+                author_login = m_unknown_username
+            one_result["author"] = author_login
+            if author_email:
+                one_result["author_email"] = author_email
+            if author_name:
+                one_result["author_name"] = author_name
+            if commit_sha:
+                #print ("SHA: %s" % commit_sha)
+                one_result["sha"] = commit_sha
+                commit_details = commit["details"]
+                if commit_details:
+                    # Handle case where commit must be ignored.
+                    if len(commit_details.keys()) > 0:
+
+                        #print ("    Date: %s" % commit_details["date"])
+                        #print ("    Additions: %s" % commit_details["stats"]["additions"])
+                        #print ("    Deletions: %s" % commit_details["stats"]["deletions"])
+                        #print ("    Difference: %s" % commit_details["stats"]["difference"])
+                        #print ("    Total: %s" % commit_details["stats"]["total"])
+
+                        one_result["date"] = commit_details["date"]
+
+                        one_result["stats"] = commit_details["stats"]
+                        d = datetime.datetime.strptime(commit_details["date"], "%Y-%m-%dT%H:%M:%SZ")
+
+                        # It seems that even if the 'since' is properly set when using the API, sometimes
+                        # commits before that date are retrieved. That might be due to what is discussed
+                        # here: https://stackoverflow.com/questions/27036387/git-log-not-chronologically-ordered
+                        # In any case, that can be problematic when recovering from the cache as one might retrieve
+                        # a commit that was already in the cache, hence ending up duplicating it.
+                        # In order to avoid that, one must check if that commit is already there when using the cache.
+                        if original_since_date and d < original_since_date:
+                            print("    Commit is before 'since' date, so ignoring: %s" % commit_sha)
+                            continue
+                        elif since_date and d < since_date and from_cache:
+                            print("    Commit is before highest date from cache, need to check if it is a duplicate: %s" % commit_sha)
+                            if commit_sha in cache_shas:
+                                print("        Is a duplicate, ignoring it")
+                                continue
+                            else:
+                                print("        Not a duplicate, keeping it")
+
+                        one_result['date_unix'] = unix_time_millis(d)
+                        one_result['owner'] = owner
+                        one_result['repo'] = repo
+                        one_result['branch'] = branch
+                        if author_login in result:
+                            result[author_login].append(one_result)
+                        else:
+                            a = []
+                            a.append(one_result)
+                            result[author_login] = a
+                        new_results.append(one_result)
+                        last_date = d
+
+            counter = counter + 1
+            if time.time() - last_progress >= m_progress_interval:
+                if last_date:
+                    print ("    Nb commits processed so far: %d (latest date: %s)" % (counter, last_date.strftime(m_csv_date_format)))
+                else:
+                    print ("    Nb commits processed so far: %d" % counter)
+                last_progress = time.time()
+
+        index_page = index_page + 1
+        if m_cache_backend == "sqlite" or (m_checkpoint_pages > 0 and next_cursor and index_page % m_checkpoint_pages == 0):
+            checkpoint(cache_url, fetch_since, new_results[nb_checkpointed:], next_cursor, index_page, counter)
+            nb_checkpointed = len(new_results)
+
+    if result == None:
+        result = get_cache_body(cache_url, manifest)
+        if result == None:
+            return get_rep_stats(scheme, host, base_path, owner, repo, branch, since, git_token, index_repo, total_nb_repos)
+
+    # Only update cache if needed (with SQLite, the pages have been saved already, see checkpoint(...)).
+    if (counter != nb_cache) and m_cache_backend != "sqlite":
+        cache(cache_url, result, new_results)
+    remove_checkpoint(cache_url)
+    remove_stale_mark(cache_url, crawl_start)
+    print ("    Done processing commits (total nb commits processed: %d)" % counter)
+    return result
+
+def get_commits_rest(scheme, host, base_path, owner, repo, branch, since, git_token, skip_sha, cursor=None, index_page=0):
+    """Generator returning the commits of a given repo branch with the REST API, one page (i.e.
+    a list) at a time, from the most recent one, as a tuple (page, cursor) where cursor is the URL of
+    the next page (None for the last page).
 
+    Every item of a page is a dict with the following keys:
+    - 'sha', 'author' (login), 'author_email' and 'author_name': any of them can be None.
+    - 'details': see get_commit_details(...).
+
+    The details of the commit whose SHA is skip_sha are not retrieved (it is already in the cache).
+    The crawl starts at the page whose URL is cursor if specified (index_page being the number of pages
+    before that one).
+    None is returned instead of a page if the GitHub API returns anything else than a 200 status code.
+    """
+    next_url = cursor
+    if not next_url:
+        next_url = "%s%s%s/repos/%s/%s/commits?sha=%s%s&per_page=%d" % (scheme, host, base_path, owner, repo, branch, "&since=%s" % since if since else "", m_commits_per_page)
+    # Used to report the projected time to completion.
+    start_time = time.time()
+    nb_requests_done = 0
+    nb_pages = None
     while next_url:
-        headers = \
-            {
-             'Authorization': 'token %s' % git_token
-            }
-        reply = get(next_url, headers=headers)
+        reply = http_get(next_url, git_token)
         status_code = reply.status_code
-        if status_code == 200:
-            next_url = None
-            headers = reply.headers
-            if "Link" in headers and 'rel="next"' in headers['Link']:
-                #print(headers['Link'])
-                headers_list = headers['Link'].split(",")
-                for h in headers_list:
-                    if 'rel="next"' in h:
-                        m = re.search('<(.+?)>', h)
-                        if m:
-                            next_url = m.group(1)
-                            #print ("Next URL: %s" % next_url)
-
-            #print ("Headers: %s" % headers)
-            out = reply.content
-            js = json.loads(out.decode('utf-8'))
-            #print (json.dumps(js, indent=4, sort_keys=True))
-
-            for one_js in js:
-
-                author_email = None
-                commit_sha = None
-                author_login = None
-                #print (json.dumps(one_js, indent=4, sort_keys=True))
-                if "author" in one_js and one_js["author"] and "login" in one_js["author"]:
-                    author_login = one_js["author"]["login"]
-                if "sha" in one_js:
-                    commit_sha = one_js["sha"]
-                    # Since we query 'since' the highest date from the cache, we should get the highest result
-                    # from the cache in the response. So lets ignore it so that it is not duplicated.
-                    if cache_sha and commit_sha == cache_sha:
-                        #print("    Ignoring SHA from cache: %s" % cache_sha)
-                        continue
-
-                one_result = {}
-
-
-                author_email = None
-                author_name = None
-                if "commit" in one_js and "author" in one_js["commit"] and "email" in one_js["commit"]["author"] and one_js["commit"]["author"]["email"]:
-                    author_email = one_js["commit"]["author"]["email"]
-                if "commit" in one_js and "author" in one_js["commit"] and "name" in one_js["commit"]["author"] and one_js["commit"]["author"]["name"]:
-                    author_name = one_js["commit"]["author"]["name"]
-
-                #else:
-                #    print ("Author: %s" % author_login)
-                if not author_login:
-                    author_login = m_unknown_username
-                one_result["author"] = author_login
-                if author_email:
-                    one_result["author_email"] = author_email
-                if author_name:
-                    one_result["author_name"] = author_name
-                if commit_sha:
-                    #print ("SHA: %s" % commit_sha)
-                    one_result["sha"] = commit_sha
-                    commit_details = get_commit_details(scheme, host, base_path, owner, repo, commit_sha, git_token)
-                    if commit_details:
-                        # Handle case where commit must be ignored.
-                        if len(commit_details.keys()) > 0:
-
-                            #print ("    Date: %s" % commit_details["date"])
-                            #print ("    Additions: %s" % commit_details["stats"]["additions"])
-                            #print ("    Deletions: %s" % commit_details["stats"]["deletions"])
-                            #print ("    Difference: %s" % commit_details["stats"]["difference"])
-                            #print ("    Total: %s" % commit_details["stats"]["total"])
-
-                            one_result["date"] = commit_details["date"]
-
-                            one_result["stats"] = commit_details["stats"]
-                            d = datetime.datetime.strptime(commit_details["date"], "%Y-%m-%dT%H:%M:%SZ")
-
-                            # It seems that even if the 'since' is properly set when using the API, sometimes
-                            # commits before that date are retrieved. That might be due to what is discussed
-                            # here: https://stackoverflow.com/questions/27036387/git-log-not-chronologically-ordered
-                            # In any case, that can be problematic when recovering from the cache as one might retrieve
-                            # a commit that was already in the cache, hence ending up duplicating it.
-                            # In order to avoid that, one must check if that commit is already there when using the cache.
-                            if original_since_date and d < original_since_date:
-                                print("    Commit is before 'since' date, so ignoring: %s" % commit_sha)
-                                continue
-                            elif since_date and d < since_date and from_cache:
-                                print("    Commit is before highest date from cache, need to check if it is a duplicate: %s" % commit_sha)
-                                duplicate_found = False
-                                for author_cache in from_cache[0].keys():
-                                    for author_entries in from_cache[0][author_cache]:
-                                        if "sha" in author_entries and author_entries["sha"] == commit_sha:
-                                            duplicate_found = True
-                                            break
-                                    if duplicate_found:
-                                        break
-                                if duplicate_found:
-                                    print("        Is a duplicate, ignoring it")
-                                    continue
-                                else:
-                                    print("        Not a duplicate, keeping it")
-                                # This can be a bit time consuming unfortunately.
-
-                            one_result['date_unix'] = unix_time_millis(d)
-                            one_result['owner'] = owner
-                            one_result['repo'] = repo
-                            one_result['branch'] = branch
-                            if author_login in result:
-                                result[author_login].append(one_result)
-                            else:
-                                a = []
-                                a.append(one_result)
-                                result[author_login] = a
+        if status_code != 200:
+            print ("    Erreur retrieving commits (status code: %d) at %s" % (status_code, next_url))
+            yield None
+            return
+
+        next_url = None
+        headers = reply.headers
+        if "Link" in headers and 'rel="next"' in headers['Link']:
+            #print(headers['Link'])
+            headers_list = headers['Link'].split(",")
+            for h in headers_list:
+                if 'rel="next"' in h:
+                    m = re.search('<(.+?)>', h)
+                    if m:
+                        next_url = m.group(1)
+                        #print ("Next URL: %s" % next_url)
+                elif 'rel="last"' in h and nb_pages == None:
+                    m = re.search('[?&]page=([0-9]+)', h)
+                    if m:
+                        nb_pages = int(m.group(1))
+
+        #print ("Headers: %s" % headers)
+        out = reply.content
+        js = json.loads(out.decode('utf-8'))
+        #print (json.dumps(js, indent=4, sort_keys=True))
 
-                else:
-                    print ("    Commit SHA could not be found in: \n\n%s" % json.dumps(one_js, indent=4, sort_keys=True))
+        # Fetch the details of all the commits of the page at once (concurrently if
+        # m_fetch_workers > 1).
+        commits_sha = [one_js["sha"] for one_js in js if "sha" in one_js and not (skip_sha and one_js["sha"] == skip_sha)]
+        commits_details = dict(zip(commits_sha, get_commits_details(scheme, host, base_path, owner, repo, commits_sha, git_token)))
+
+        page = []
+        for one_js in js:
+            commit = {"sha": None, "author": None, "author_email": None, "author_name": None, "details": None}
+            #print (json.dumps(one_js, indent=4, sort_keys=True))
+            if "author" in one_js and one_js["author"] and "login" in one_js["author"]:
+                commit["author"] = one_js["author"]["login"]
+            if "commit" in one_js and "author" in one_js["commit"] and "email" in one_js["commit"]["author"] and one_js["commit"]["author"]["email"]:
+                commit["author_email"] = one_js["commit"]["author"]["email"]
+            if "commit" in one_js and "author" in one_js["commit"] and "name" in one_js["commit"]["author"] and one_js["commit"]["author"]["name"]:
+                commit["author_name"] = one_js["commit"]["author"]["name"]
+            if "sha" in one_js:
+                commit["sha"] = one_js["sha"]
+                if one_js["sha"] in commits_details:
+                    commit["details"] = commits_details[one_js["sha"]]
+            else:
+                print ("    Commit SHA could not be found in: \n\n%s" % json.dumps(one_js, indent=4, sort_keys=True))
+            page.append(commit)
 
-                counter = counter + 1
-                if (counter % 20 == 0):
+        index_page = index_page + 1
+        nb_requests_done = nb_requests_done + 1 + len(commits_sha)
+        if next_url and nb_pages:
+            print_projected_time(host, git_token, index_page, nb_pages, 1 + m_commits_per_page, start_time, nb_requests_done)
+        yield (page, next_url)
 
-                    print ("    Nb commits processed so far: %d (latest date: %s)" % (counter, datetime.datetime.strptime(one_result["date"], "%Y-%m-%dT%H:%M:%SZ").strftime(m_csv_date_format)))
+def get_graphql_url(scheme, host, base_path):
+    """Returns the URL of the GitHub GraphQL API.
 
+    e.g. https://api.github.com/graphql on github.com, https://my.host/api/graphql
+    on GitHub Enterprise (whose REST API base path is /api/v3).
+    """
+    if base_path.endswith("/v3"):
+        base_path = base_path[:-len("/v3")]
+    return "%s%s%s/graphql" % (scheme, host, base_path)
+
+def git_timestamp_to_date(git_timestamp):
+    """Returns the given ISO 8601 timestamp (e.g. '2011-04-14T18:00:49+02:00') as a UTC date
+    in the format used by the REST API (e.g. '2011-04-14T16:00:49Z').
+    """
+    d = datetime.datetime.fromisoformat(git_timestamp.replace("Z", "+00:00"))
+    return d.astimezone(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+def get_commits_graphql(scheme, host, base_path, owner, repo, branch, since, git_token, cursor=None, index_page=0):
+    """Generator returning the commits of a given repo branch with the GraphQL API, one page
+    (i.e. a list) at a time, from the most recent one, as a tuple (page, cursor) where cursor is
+    the end cursor of the page (None for the last page).
+
+    Items of a page are the same as with get_commits_rest(...), but the stats of up to
+    m_commits_per_page commits are retrieved with one single request. Commits without author
+    date (in theory possible with GraphQL) are skipped.
+    The crawl starts after cursor if specified (index_page being the number of pages before).
+    None is returned instead of a page if the GraphQL API returns an error.
+    """
+    url = get_graphql_url(scheme, host, base_path)
+    # Used to report the projected time to completion.
+    start_time = time.time()
+    nb_requests_done = 0
+    nb_pages = None
+    while True:
+        variables = {"owner": owner, "repo": repo, "branch": branch, "since": since, "cursor": cursor, "pageSize": m_commits_per_page}
+        reply = http_post(url, git_token, {"query": m_graphql_history_query, "variables": variables})
+        status_code = reply.status_code
+        if status_code != 200:
+            print ("    Erreur retrieving commits (status code: %d) at %s" % (status_code, url))
+            yield None
+            return
+
+        js = json.loads(reply.content.decode('utf-8'))
+        history = None
+        # Note that GraphQL errors come with a 200 status code.
+        if "data" in js and js["data"] and js["data"]["repository"] and js["data"]["repository"]["object"]:
+            history = js["data"]["repository"]["object"].get("history")
+        if not history:
+            print ("    Erreur retrieving commits at %s: \n\n%s" % (url, json.dumps(js.get("errors", js), indent=4, sort_keys=True)))
+            yield None
+            return
+
+        page = []
+        for node in history["nodes"]:
+            author = node["author"] or {}
+            # The REST API always returns a date, it is needed to order the commits.
+            if not author.get("date"):
+                print("    Commit without author date, ignoring it: %s" % node["oid"])
+                add_metric(("commits_dropped", "no_date"))
+                continue
+            stats = {}
+            stats["additions"] = node["additions"]
+            stats["deletions"] = node["deletions"]
+            stats["total"] = node["additions"] + node["deletions"]
+            stats["difference"] = node["additions"] - node["deletions"]
+            commit = {}
+            commit["sha"] = node["oid"]
+            commit["author"] = author["user"]["login"] if author.get("user") else None
+            commit["author_email"] = author.get("email")
+            commit["author_name"] = author.get("name")
+            commit["details"] = {"stats": stats, "date": git_timestamp_to_date(author["date"])}
+            page.append(commit)
+
+        index_page = index_page + 1
+        nb_requests_done = nb_requests_done + 1
+        if nb_pages == None:
+            nb_pages = math.ceil(history["totalCount"] / m_commits_per_page)
+        if history["pageInfo"]["hasNextPage"]:
+            print_projected_time(host, git_token, index_page, nb_pages, 1, start_time, nb_requests_done)
+            cursor = history["pageInfo"]["endCursor"]
         else:
-            print ("    Erreur retrieving commits (status code: %d) at %s" % (status_code, next_url))
+            cursor = None
+        yield (page, cursor)
+
+        if not cursor:
+            return
+
+def is_git_scheme(scheme):
+    """Returns whether a given scheme (see --file) means that the repo is processed from a local
+    mirror rather than with the GitHub API (see get_commits_git(...)).
+    """
+    return scheme.startswith(m_git_scheme_prefix)
+
+def get_git_mirror_path(clone_url):
+    """Returns the path of the local bare mirror of the repo with the given clone URL.
+    """
+    mirror_name = hashlib.sha1(clone_url.encode('utf-8')).hexdigest()
+    return get_filename_with_path(mirror_name, get_filename_with_path(m_git_mirrors_folder, m_cache_folder))
+
+def update_git_mirror(clone_url):
+    """Creates the local bare mirror of the repo with the given clone URL if it does not exist yet,
+    updates it otherwise. Returns the path of the mirror, or None if git failed.
+
+    git is run with the credentials configured for the current user, the API token of the source
+    file is not used.
+    """
+    mirror_path = get_git_mirror_path(clone_url)
+    with m_git_mirrors_locks_lock:
+        if not mirror_path in m_git_mirrors_locks:
+            m_git_mirrors_locks[mirror_path] = threading.Lock()
+        lock = m_git_mirrors_locks[mirror_path]
+    # Several branches of the same repo share the same mirror.
+    with lock:
+        if os.path.exists(mirror_path):
+            print ("    Updating mirror of %s" % clone_url)
+            command = ["git", "-C", mirror_path, "remote", "update", "--prune"]
+        else:
+            print ("    Creating mirror of %s" % clone_url)
+            os.makedirs(os.path.dirname(mirror_path), exist_ok=True)
+            command = ["git", "clone", "--mirror", "--quiet", clone_url, mirror_path]
+        try:
+            subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        except (OSError, subprocess.CalledProcessError) as e:
+            print ("    Erreur updating mirror of %s: %s" % (clone_url, e.stderr.decode('utf-8', 'replace').strip() if isinstance(e, subprocess.CalledProcessError) else e))
             return None
+    return mirror_path
 
-    # Only update cache if needed.
-    if (counter != nb_cache):
-        cache(cache_url, result)
-    print ("    Done processing commits (total nb commits processed: %d)" % counter)
+def get_git_log(mirror_path, branch, since):
+    """Returns the commits of a given branch of a local repo as a list of dicts (from the most recent
+    one), based on the output of 'git log --raw --numstat -z'.
+
+    Every item has the following keys:
+    - 'sha', 'author_email', 'author_name' and 'date' (the author date, in the format used by the REST API).
+    - 'stats': additions, deletions, total and difference, like with the REST API (merge commits are
+      compared to their first parent, binary files are not counted).
+    - 'added_files': the files added by the commit (see --ignore_files).
+
+    Runs in the pool of processes (see get_git_process_pool()): it must only depend on its arguments.
+    Raises subprocess.CalledProcessError if git fails (e.g. unknown branch).
+    """
+    # With -z, paths are never quoted (even with special characters like tabs or double quotes) and
+    # the output is a list of NUL terminated tokens. Every commit starts with a token made of a
+    # record separator followed by its fields (unit separated), then come the raw entries of its
+    # files (':<modes> <blobs> <status>' followed by one path, two for renames and copies) and their
+    # numstat entries ('<additions>\t<deletions>\t<path>', the path being empty and followed by two
+    # paths for renames). Paths are consumed at their position, hence whatever their content.
+    command = ["git", "-C", mirror_path, "-c", "core.quotePath=false", "log", "--raw", "--numstat", "-z", "--diff-merges=first-parent", "--format=%x1e%H%x1f%aI%x1f%ae%x1f%an"]
+    if since:
+        command.append("--since=%s" % since)
+    command.extend([branch, "--"])
+    tokens = subprocess.run(command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE).stdout.decode('utf-8', 'replace').split("\0")
+    commits = []
+    commit = None
+    i = 0
+    while i < len(tokens):
+        # Entries after the fields of a commit start on a new line.
+        token = tokens[i].lstrip("\n")
+        i = i + 1
+        if token.startswith("\x1e"):
+            (sha, date, email, name) = token[1:].split("\x1f")
+            commit = {}
+            commit["sha"] = sha
+            commit["author_email"] = email or None
+            commit["author_name"] = name or None
+            commit["date"] = git_timestamp_to_date(date)
+            commit["stats"] = {"additions": 0, "deletions": 0, "total": 0, "difference": 0}
+            commit["added_files"] = []
+            commits.append(commit)
+        elif token.startswith(":"):
+            # e.g. ':000000 100644 0000000 b478595 A'
+            status = token.split(" ")[-1]
+            if status.startswith("A"):
+                commit["added_files"].append(tokens[i])
+            i = i + (2 if status[:1] in ("R", "C") else 1)
+        elif token:
+            fields = token.split("\t", 2)
+            # Binary files are reported as '-'.
+            if fields[0] != "-":
+                stats = commit["stats"]
+                stats["additions"] = stats["additions"] + int(fields[0])
+                stats["deletions"] = stats["deletions"] + int(fields[1])
+                stats["total"] = stats["additions"] + stats["deletions"]
+                stats["difference"] = stats["additions"] - stats["deletions"]
+            if fields[2] == "":
+                i = i + 2
+    return commits
+
+def get_git_process_pool():
+    """Returns the pool of processes in which the output of 'git log' is parsed (created on first call).
+    """
+    global m_git_process_pool
+    with m_git_process_pool_lock:
+        if not m_git_process_pool:
+            m_git_process_pool = concurrent.futures.ProcessPoolExecutor(mp_context=multiprocessing.get_context("spawn"))
+        return m_git_process_pool
+
+def shutdown_git_process_pool():
+    """Shuts down the pool of processes in which the output of 'git log' is parsed, if it was created.
+    """
+    global m_git_process_pool
+    with m_git_process_pool_lock:
+        if m_git_process_pool:
+            m_git_process_pool.shutdown()
+            m_git_process_pool = None
+
+def get_git_clone_url(scheme, host, base_path, owner, repo):
+    """Returns the URL the local mirror of a given repo is cloned from (see get_commits_git(...)).
+    """
+    return "%s%s%s/%s/%s" % (scheme[len(m_git_scheme_prefix):], host, base_path, owner, repo)
+
+def submit_git_logs(to_process, previous_rep_stats):
+    """Updates the local mirrors of the rows of to_process processed with 'git log' and submits their
+    jobs to the pool of processes (see get_git_log(...)) without waiting for them, so that the repos
+    processed one after the other by the sync engine are parsed in parallel. get_commits_git(...)
+    then collects the result of its job instead of running it.
+
+    previous_rep_stats is the list of the results of the previous calls (None if there was none), see
+    refresh_state(state, args). The job of a repo is submitted with the same since date as the one
+    get_rep_stats(...) will fetch from (i.e. the date of the most recent commit found so far). If it
+    does not match, the job is not used and get_commits_git(...) runs its own.
+    """
+    with m_git_logs_lock:
+        # Jobs of a previous refresh that were not collected (e.g. it failed) are outdated.
+        for (mirror_path, future) in m_git_logs.values():
+            future.cancel()
+        m_git_logs.clear()
+    if m_cache_only:
+        return
+    for (row, previous) in zip(to_process, previous_rep_stats):
+        if not is_git_scheme(row[0]):
+            continue
+        since = row[7]
+        if previous != None:
+            since = get_highest_commit(previous)[0] or since
+        else:
+            manifest = get_cache_manifest(get_rep_stats_cache_url(*get_repo_key(row)))
+            if manifest and manifest["highest_date"]:
+                since = manifest["highest_date"]
+        clone_url = get_git_clone_url(row[0], row[1], row[2], row[3], row[4])
+        mirror_path = update_git_mirror(clone_url)
+        if mirror_path:
+            with m_git_logs_lock:
+                m_git_logs[(clone_url, row[5], since)] = (mirror_path, get_git_process_pool().submit(get_git_log, mirror_path, row[5], since))
+
+def get_commits_git(scheme, host, base_path, owner, repo, branch, since):
+    """Generator returning the commits of a given repo branch from its local bare mirror (see
+    update_git_mirror(clone_url)), as one single page like get_commits_rest(...).
+
+    The clone URL is the scheme without m_git_scheme_prefix, the host, the base path, the owner and
+    the repo, e.g. git+https://,github.com,,MyOrg,MyRepo,... is cloned from https://github.com/MyOrg/MyRepo.
+    Commits are not associated with GitHub logins (unknown authors, see resolve_unknown_author(x)).
+
+    The output of 'git log' is parsed in a pool of processes (see get_git_log(...)), so that several
+    repos processed concurrently (see --engine) are parsed in parallel. With the sync engine, the
+    jobs of all the repos are submitted upfront (see submit_git_logs(to_process, previous_rep_stats)).
+    None is returned instead of the page if git fails.
+    """
+    clone_url = get_git_clone_url(scheme, host, base_path, owner, repo)
+    with m_git_logs_lock:
+        submitted = m_git_logs.pop((clone_url, branch, since), None)
+    if submitted:
+        (mirror_path, future) = submitted
+    else:
+        mirror_path = update_git_mirror(clone_url)
+        if not mirror_path:
+            yield None
+            return
+        future = get_git_process_pool().submit(get_git_log, mirror_path, branch, since)
+    try:
+        commits = future.result()
+    except subprocess.CalledProcessError as e:
+        print ("    Erreur retrieving commits of %s (branch: %s): %s" % (clone_url, branch, e.stderr.decode('utf-8', 'replace').strip()))
+        yield None
+        return
+
+    page = []
+    for one_commit in commits:
+        details = {"stats": one_commit["stats"], "date": one_commit["date"]}
+        if m_ignore_files:
+            for filename in one_commit["added_files"]:
+                if filename in m_ignore_files:
+                    print ("    Ignoring commit %s because file '%s' was added" % (one_commit["sha"], filename))
+                    details = {}
+                    break
+        commit = {}
+        commit["sha"] = one_commit["sha"]
+        commit["author"] = None
+        commit["author_email"] = one_commit["author_email"]
+        commit["author_name"] = one_commit["author_name"]
+        commit["details"] = details
+        page.append(commit)
+    yield (page, None)
+
+def get_repo_key(row):
+    """Returns the tuple (scheme, host, base_path, owner, repo, branch, since) identifying the repo of
+    a given row of a source file, i.e. what identifies its cache (see get_rep_stats_cache_url(...)).
+    """
+    return tuple(row[0:6]) + (row[7],)
+
+def process_repo(row, index_repo, total_nb_repos, previous):
+    """Calls get_rep_stats(...) for a given row of the source file and records its wall time and its
+    number of commits in the metrics of the run.
+
+    The metrics of a repo are identified by the URL of its cache, like the repos themselves (see
+    get_repo_key(row)): rows for the same branch with different since dates are distinct repos.
+    """
+    start = time.time()
+    result = get_rep_stats(row[0], row[1], row[2], row[3], row[4], row[5], row[7], row[8], index_repo, total_nb_repos, previous)
+    repo = get_rep_stats_cache_url(*get_repo_key(row))
+    add_metric(("repos", repo, "seconds"), time.time() - start)
+    if result != None:
+        with m_metrics_lock:
+            m_metrics["repos"][repo]["commits"] = sum(len(x) for x in result.values())
     return result
 
+def get_all_rep_stats_threaded(to_process, previous_rep_stats):
+    """Returns a list with the result of get_rep_stats(...) for every row in to_process (same order),
+    see process_repo(row, index_repo, total_nb_repos, previous).
+
+    previous_rep_stats is the list of the results of the previous calls (None if there was none), see
+    refresh_state(state, args).
+
+    The repositories are processed concurrently in a pool of at most m_max_concurrency threads (a
+    thread blocks on a single request at a time) and the HTTP requests they perform are limited by
+    the global and per host semaphores (see http_request(...)).
+    """
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(m_max_concurrency, len(to_process)))) as executor:
+        futures = [executor.submit(process_repo, row, idx, len(to_process), previous_rep_stats[idx - 1]) for idx, row in enumerate(to_process, 1)]
+        # Errors are returned rather than raised, so that the other repos can still be refreshed
+        # (see refresh_state(state, args)).
+        return [f.exception() or f.result() for f in futures]
+
+def get_shas(r):
+    """Returns the set of the SHAs of all the commits in a given result dict (see get_rep_stats(...)).
+    """
+    shas = set(x.get("sha") for author_data in r.values() for x in author_data)
+    shas.discard(None)
+    return shas
+
+def remove_duplicate_commits(r, sha_index):
+    """Removes from a given dict of Commit records (see to_commits(r)) the commits already found in
+    another repo or branch and returns it.
+
+    sha_index is the run-wide index of the SHAs of the commits kept so far. SHAs of r that are
+    not in it are added to it, so that a commit listed by several repos or branches is only
+    taken into account once (for the first one in the source file).
+    """
+    nb_duplicates = 0
+    to_remove_authors = []
+    for k in r.keys():
+        author_data = []
+        for x in r[k]:
+            if x.sha and x.sha in sha_index:
+                nb_duplicates = nb_duplicates + 1
+            else:
+                if x.sha:
+                    sha_index.add(x.sha)
+                author_data.append(x)
+        r[k] = author_data
+        if len(author_data) == 0:
+            to_remove_authors.append(k)
+    for author in to_remove_authors:
+        r.pop(author)
+    if nb_duplicates > 0:
+        print("    Ignoring %d commit(s) already found in another repository or branch" % nb_duplicates)
+        add_metric(("commits_dropped", "duplicate"), nb_duplicates)
+    return r
+
 def sort_results(r):
-    """Sorts a list containg commit information by date, thanks to the 'date_unix' field.
-
-    Example list with one item below. The result will have items sorted by 'date_unix' ascending.
-
-    [
-        {
-            "sha": "6b9b8c59703560f197c71adfe0ac9770cfeffb33",
-            "date": "2011-04-14T16:00:49Z",
-            "date_unix": "1302796849000.0",
-            "author": "jdoe",
-            "author_name": "John Doe",
-            "author_email": "jdoe@testmail.com",
-            "owner": "MyOrg",
-            "repo": "MyRepo",
-            "branch": "master",
-            "stats" : {
-                "additions" : 23,
-                "deletions" : 12,
-                "total"     : 35,
-                "difference": 11
-            }
-        }
-    ]
+    """Sorts a list of Commit records (see to_commits(r)) by date, ascending.
+
+    The sort is stable: commits with the same date keep their relative order.
     """
-    return sorted(r, key=lambda k: k['date_unix'], reverse=False)
+    return sorted(r, key=lambda k: k.date, reverse=False)
 
 def merge_sort_results(dict):
-    """Merges all values of a dict (which are lists) into one single list, then sorts it and returns it.
+    """Merges all values of a dict (which are lists sorted by date) into one single list sorted by date
+    and returns it.
 
-    See sort_results(r) for details about sorting.
+    See merge_sorted_lists(lists) for details about merging.
     """
-    result = []
-    for x in dict.keys():
-        #print ("X: %s" % x)
-        #print (json.dumps(r[x], indent=4, sort_keys=True))
-        result.extend(dict[x])
-    return sort_results(result)
+    return merge_sorted_lists(list(dict.values()))
 
-# appends r2 values to r1 values.
-def combine_results(dict1, dict2):
-    """Adds dict2 values into dict1 and returns dict1.
+def merge_sorted_lists(lists):
+    """Merges lists of Commit records sorted by date into one single list sorted by date and returns it.
 
-    Both dictionaries have String as keys and List as values.
-    For all key/value in dict2:
-        - if the same key exists in dict1 then extend its value with the value in dict2.
-        - if dict1 does not contain that key, then add it with the value of the key in dict2.
-    Returns dict1 if dict2 is None.
+    The merge is stable: in case several items have the same date, the items of the first lists come
+    first, i.e. it is the same as sorting the concatenation of the lists (see sort_results(r)).
+    This is a k-way merge (k being the number of lists) in O(n log k): the sort of Python (Timsort)
+    finds the sorted lists in the concatenation and merges them. This is faster than heapq.merge(...),
+    which compares the items in Python code.
     """
-    if not dict1:
-        return dict2
-    else:
-        for x in dict2.keys():
-            if x in dict1:
-                dict1[x].extend(dict2[x])
-            else:
-                dict1[x] = dict2[x]
-        return dict1
+    if len(lists) == 1:
+        return lists[0]
+    return sorted(itertools.chain.from_iterable(lists), key=operator.attrgetter("date"))
+
+def init_runs():
+    """Returns the object collecting the Commit records of all repos as sorted runs (see
+    add_to_runs(...)), before they are merged (see merge_runs(runs)).
+    """
+    runs = {}
+    # Author -> runs of the commits of the author, one per repo (in the order of the source file).
+    runs["authors"] = {}
+    # Same for the commits whose author is resolved by resolve_unknown_author(x).
+    runs["resolved"] = {}
+    return runs
+
+def add_to_runs(runs, r, min_commit_difference, max_commit_difference, commits_to_ignore):
+    """Adds the Commit records of a repo (dict, see to_commits(r)) to the runs object (see
+    init_runs()) and returns it.
+
+    Commits are streamed through author resolution (see resolve_unknown_author(x)) and filtering
+    (see is_commit_to_ignore(...)). The commits of every author are then sorted by date, which is
+    cheap since the commits of a repo are almost sorted already.
+    """
+    filtering = min_commit_difference != None or max_commit_difference != None or commits_to_ignore
+    for k in r.keys():
+        if not k in runs["authors"]:
+            runs["authors"][k] = []
+        resolved_data = {}
+        if k == m_unknown_username:
+            author_data = []
+            for x in r[k]:
+                author = resolve_unknown_author(x)
+                if author:
+                    x.author = sys.intern(author)
+                    if not x.author in resolved_data:
+                        resolved_data[x.author] = []
+                    resolved_data[x.author].append(x)
+                else:
+                    author_data.append(x)
+        else:
+            author_data = r[k]
+        if filtering:
+            author_data = [x for x in author_data if not is_commit_to_ignore(x, min_commit_difference, max_commit_difference, commits_to_ignore)]
+            for author in resolved_data.keys():
+                resolved_data[author] = [x for x in resolved_data[author] if not is_commit_to_ignore(x, min_commit_difference, max_commit_difference, commits_to_ignore)]
+        if author_data:
+            runs["authors"][k].append(sort_results(author_data))
+        for author in resolved_data.keys():
+            if not author in runs["resolved"]:
+                runs["resolved"][author] = []
+            if resolved_data[author]:
+                runs["resolved"][author].append(sort_results(resolved_data[author]))
+    return runs
+
+def merge_runs(runs):
+    """Returns a dict with the authors as keys and the Commit records of the author, sorted by date,
+    as values, from the runs of all the repos (see add_to_runs(...)).
+
+    The runs of an author are merged with a k-way merge (see merge_sorted_lists(lists)). The commits
+    whose author is resolved by resolve_unknown_author(x) come after the other commits of the author
+    in case several have the same date. Authors without any commit left are not in the dict.
+    """
+    result = {}
+    for k in list(runs["authors"].keys()) + [k for k in runs["resolved"].keys() if not k in runs["authors"]]:
+        the_runs = runs["authors"].get(k, []) + runs["resolved"].get(k, [])
+        if the_runs:
+            result[k] = merge_sorted_lists(the_runs)
+    return result
 
-def process_unknown(r):
-    """Identifies and processes commits with author '<unknown>' and processes them
-    according to the relevant parameters.
+def resolve_unknown_author(x):
+    """Returns the author of a given Commit record whose author is '<unknown>', according to the
+    relevant parameters, or None if it cannot be found.
 
-    For every entry whose author is currently '<unknown>':
     - If email to author or name to author files have been specified, then we try to
-      set the author to the mapping specified in that file (email takes precendence).
+      find the author thanks to the mapping specified in that file (email takes precendence).
     - If no mapping could be found and name is available, then use name.
     - If no mapping could be found and name is not available, then use email.
     - If no mapping could be found and name is not available and email is not
-      available, then keep it as '<unknown>'.
-    """
-    # Tries to find the actual user thanks to email/name mapping files.
-    # Also reports an issue if unknown is not allowed and no mapping is found.
-    if m_unknown_username in r and r[m_unknown_username]:
-        print ("Processing '%s' user data" % m_unknown_username)
-        unknown_data = r[m_unknown_username]
-        new_unknown_data = []
-        for x in unknown_data:
-            author = None
-            author_email = None
-            author_name = None
-            if "author_email" in x and x["author_email"]:
-                author_email = x["author_email"]
-            if "author_name" in x and x["author_name"]:
-                author_name = x["author_name"]
-            if author_email and author_email.lower() in m_email_to_author and m_email_to_author[author_email.lower()]:
-                author = m_email_to_author[author_email.lower()]
-                #print("    Found author thanks to email to author file: %s --> %s (%s/%s: %s)" % (author_email, author, x["owner"], x["repo"], x["sha"]))
-            elif not author and author_name and author_name.lower() in m_name_to_author and m_name_to_author[author_name.lower()]:
-                author = m_name_to_author[author_name.lower()]
-                #print("    Found author thanks to name to author file: %s --> %s (%s/%s: %s)" % (author_name, author, x["owner"], x["repo"], x["sha"]))
-            elif not author and author_name:
-                author = author_name
-                #print("    No mapping found, using name: %s (%s/%s: %s)" % (author_name, x["owner"], x["repo"], x["sha"]))
-            elif not author and author_email:
-                author = author_email
-                #print("    No mapping found, using email: %s (%s/%s: %s)" % (author_email, x["owner"], x["repo"], x["sha"]))
-            else:
-                new_unknown_data.append(x)
-                print("    Author could not be found and no name or email available, keeping it as '%s' (%s/%s: %s)" % (m_unknown_username, x["owner"], x["repo"], x["sha"]))
-            if author:
-                x["author"] = author
-                if not author in r:
-                    r[author] = []
-                r[author].append(x)
-
-        if len(new_unknown_data) > 0:
-            r[m_unknown_username] = new_unknown_data
-        else:
-            r.pop(m_unknown_username)
-
-    return r
+      available, then it is kept as '<unknown>' (None is returned).
+    """
+    author = None
+    author_email = None
+    author_name = None
+    if x.author_email:
+        author_email = x.author_email
+    if x.author_name:
+        author_name = x.author_name
+    if author_email and author_email.lower() in m_email_to_author and m_email_to_author[author_email.lower()]:
+        author = m_email_to_author[author_email.lower()]
+        #print("    Found author thanks to email to author file: %s --> %s (%s/%s: %s)" % (author_email, author, x.owner, x.repo, x.sha))
+    elif not author and author_name and author_name.lower() in m_name_to_author and m_name_to_author[author_name.lower()]:
+        author = m_name_to_author[author_name.lower()]
+        #print("    Found author thanks to name to author file: %s --> %s (%s/%s: %s)" % (author_name, author, x.owner, x.repo, x.sha))
+    elif not author and author_name:
+        author = author_name
+        #print("    No mapping found, using name: %s (%s/%s: %s)" % (author_name, x.owner, x.repo, x.sha))
+    elif not author and author_email:
+        author = author_email
+        #print("    No mapping found, using email: %s (%s/%s: %s)" % (author_email, x.owner, x.repo, x.sha))
+    else:
+        print("    Author could not be found and no name or email available, keeping it as '%s' (%s/%s: %s)" % (m_unknown_username, x.owner, x.repo, x.sha))
+    return author
 
 def get_top_contributors(dict, nb):
     """Returns a list containing the names of the nb top contibutors.
 
-    A contributor is evaulated by the total difference at its latest commit.
+    A contributor is evaulated by the total difference at its latest commit (the Commit records of
+    every author are sorted by date).
     """
     if not dict or not len(dict.keys()) or not nb:
         return None
@@ -664,12 +2398,12 @@ def get_top_contributors(dict, nb):
         print("Calculating top contributors")
         max_contribs = []
         for k in dict.keys():
-            author_data = sort_results(dict[k])
+            author_data = dict[k]
             author_contrib = {}
             author_contrib["author"] = k
-            if len(author_data) > 0 and "total_stats_author" in author_data[len(author_data) - 1] and "difference" in author_data[len(author_data) - 1]["total_stats_author"]:
-                print("    Author % s contrib: %d" % (k, author_data[len(author_data) - 1]["total_stats_author"]["difference"]))
-                author_contrib["difference"] = author_data[len(author_data) - 1]["total_stats_author"]["difference"]
+            if len(author_data) > 0 and author_data[len(author_data) - 1].total_difference != None:
+                print("    Author % s contrib: %d" % (k, author_data[len(author_data) - 1].total_difference))
+                author_contrib["difference"] = author_data[len(author_data) - 1].total_difference
             else:
                 #author_contrib["difference"] = 0
                 raise ValueError('Total statistics not found for author %s' % k)
@@ -697,11 +2431,11 @@ def replace_hidden_with_others(dict, top_contributors, authors_to_show):
         return (dict, [])
     else:
         print("Replacing authors to hide with %s" % m_others_username)
-        others_data = []
+        others_data = {}
         to_remove_authors = []
         for k in dict.keys():
             if (top_contributors != None and k not in top_contributors) or (authors_to_show != None and k not in authors_to_show):
-                others_data.extend(dict[k])
+                others_data[k] = dict[k]
                 to_remove_authors.append(k)
         if len(to_remove_authors) > 0:
             print("    Replaced %d author(s)" % len(to_remove_authors))
@@ -709,188 +2443,578 @@ def replace_hidden_with_others(dict, top_contributors, authors_to_show):
                 if to_remove in dict:
                     dict.pop(to_remove)
             if len(others_data) > 0:
-                # Do not forget to sort and recalculate totals that have changed obviously.
-                dict[m_others_username] = populate_totals(sort_results(others_data))
+                # Do not forget to merge and recalculate totals that have changed obviously.
+                dict[m_others_username] = populate_totals(merge_sort_results(others_data))
         else:
             print("    Nothing to do")
 
         return (dict, to_remove_authors)
 
+def init_html_commits():
+    """Returns the object holding the information about the commits used for generating the HTML
+    output (see add_html_commit(...)).
+
+    Data points of the charts only reference commits by their index in that object, so that the
+    information about a commit is only stored once, whatever the number of charts and data points
+    it is displayed in (i.e. its author and TOTAL).
+    """
+    html_commits = {}
+    # One item per commit: the date (UNIX Epoch time in seconds), the SHA, the index of the repository,
+    # the index of the author and the index of the series (i.e. author or OTHERS) it belongs to.
+    html_commits["x"] = []
+    html_commits["sha"] = []
+    html_commits["repository"] = []
+    html_commits["author"] = []
+    html_commits["series"] = []
+    # Number of commits of the bucket, only with buckets (see bucket_results(r, bucket)).
+    html_commits["nb_commits"] = []
+    # Lookup tables: item -> index.
+    html_commits["repositories"] = {}
+    html_commits["authors"] = {}
+    # Repository -> commit URL pattern.
+    html_commits["commit_url_patterns"] = {}
+    return html_commits
+
+def add_html_commit(html_commits, one_result, series, commit_url_pattern):
+    """Adds a given Commit record to the html_commits object (see init_html_commits()) and returns
+    its index.
+
+    series is the index of the series (i.e. author or OTHERS) the commit belongs to, commit_url_pattern
+    the commit URL pattern of its repository, if any.
+    """
+    repository = (one_result.owner, one_result.repo)
+    if not repository in html_commits["repositories"]:
+        html_commits["repositories"][repository] = len(html_commits["repositories"])
+    if not one_result.author in html_commits["authors"]:
+        html_commits["authors"][one_result.author] = len(html_commits["authors"])
+    html_commits["x"].append(one_result.date)
+    html_commits["sha"].append(one_result.sha)
+    html_commits["repository"].append(html_commits["repositories"][repository])
+    html_commits["author"].append(html_commits["authors"][one_result.author])
+    html_commits["series"].append(series)
+    if m_bucket:
+        html_commits["nb_commits"].append(one_result.nb_commits)
+    if commit_url_pattern:
+        html_commits["commit_url_patterns"][repository] = commit_url_pattern
+    return len(html_commits["x"]) - 1
+
 def init_html_data(html_data, chart_type, title, author):
     """Init the html_data object used for generting the HTML output for a
     given chart_type and author. Returns the udpated html_data object.
+
+    Every author has one series per chart type, made of 3 lists with one item per data point: the
+    index of the commit (see add_html_commit(...)), 'y' and 'plus_minus'.
     """
     if not chart_type in html_data:
         html_data[chart_type] = {}
         html_data[chart_type]["authors"] = {}
         html_data[chart_type]["title"] = title
     html_data[chart_type]["authors"][author] = {}
-    html_data[chart_type]["authors"][author]["data"] = []
+    html_data[chart_type]["authors"][author]["commits"] = []
+    html_data[chart_type]["authors"][author]["y"] = []
+    html_data[chart_type]["authors"][author]["plus_minus"] = []
     html_data[chart_type]["authors"][author]["label"] = author
 
     return html_data
 
-def populate_html_data(html_data, html_object, chart_type, author, y, plus_minus):
+def populate_html_data(html_data, commit_index, chart_type, author, y, plus_minus):
     """Adds an entry (i.e. data point) to the html_data object used for generting
     the HTML output for a given chart_type and author. Returns the udpated html_data object.
 
-    Note that a deep copy of the given html_object is created and used instead of
-    using it directly.
-    TODO: this means that the current data structure contains a lot of duplicate
-    information and should be optimized/reworked.
+    commit_index is the index of the commit in the html_commits object (see add_html_commit(...)).
     """
-    h = copy.deepcopy(html_object)
-    h["y"] = y
+    series = html_data[chart_type]["authors"][author]
+    series["commits"].append(commit_index)
+    series["y"].append(y)
     # The 'plus_minus' values allow to display the impact of a single
     # commit in the tooltip (the 'y' value is the sum over time, which
     # is what the graph shows).
-    h["plus_minus"] = plus_minus
-    html_data[chart_type]["authors"][author]["data"].append(h)
+    series["plus_minus"].append(plus_minus)
     return html_data
 
-#######################################################################
-print("GREVOS")
-print("------\n")
+def get_points_budgets(html_data, max_points):
+    """Returns the maximum number of data points (author -> number of points) of every series of
+    the charts, so that a chart has about max_points data points.
 
-#######################################################################
-# argparse stuff to parse input parameters.
-
-parser = argparse.ArgumentParser(description='Generate combined activity graphs for any number of repositories.')
-parser.add_argument('-f', '--file', type=str, nargs=1, help='File containing the repos to process. Format: <scheme>,<host>,<base_path>,<org>,<repo>,<branch>,<commit_url_pattern>,<since>,<api_token>[,<commits_to_ignore>]. <commits_to_ignore> is a %s separated list of SHA commits.' % m_commits_to_ignore_separator)
-parser.add_argument('-i', '--ignore_files', type=str, nargs='*', help=argparse.SUPPRESS)
-parser.add_argument('-a', '--authors', type=str, nargs='*', help='Only outputs statistics for the specified authors (all authors by default).')
-parser.add_argument('-o', '--output_folder', type=str, nargs='?', help='Folder where the generated CSV files are stored, default: \'%s\'.' % m_output_folder)
-parser.add_argument('-c', '--cache_folder', type=str, nargs='?', help='Folder where cache files are stored, default: \'%s\'.' % m_cache_folder)
-parser.add_argument('-oc', '--output_commits', type=str2bool, nargs='?', default=True, help='Outputs nb commits in genereted files, default: yes.')
-parser.add_argument('-oa', '--output_additions', type=str2bool, nargs='?', default=True, help='Outputs additions in genereted files, default: yes.')
-parser.add_argument('-od', '--output_deletions', type=str2bool, nargs='?', default=True, help='Outputs deletions in genereted files, default: yes.')
-parser.add_argument('-odi', '--output_differences', type=str2bool, nargs='?', default=True, help='Outputs differences (i.e. additions - deletions) in genereted files, default: yes.')
-parser.add_argument('-ot', '--output_totals', type=str2bool, nargs='?', default=True, help='Outputs totals (i.e. additions + deletions) in genereted files, default: yes.')
-parser.add_argument('-d', '--csv_date_format', type=str, nargs='?', help='Date format in the generated CSV, default: \'%s\'.' % m_csv_date_format.replace('%', '%%'))
-parser.add_argument('-eaf', '--email_to_author_file', type=str, nargs='?', help='File providing the mapping between email and username, useful when the username is not available in the Git commit but the email is. File format: one entry per line, first item is the email, second item is the username, separated by a comma.')
-parser.add_argument('-naf', '--name_to_author_file', type=str, nargs='?', help='File providing the mapping between name and username, useful when the username is not available in the Git commit but the name is. File format: one entry per line, first item is the name, second item is the username, separated by a comma.')
-parser.add_argument('-macd', '--max_commit_difference', type=int, nargs='?', help='Max difference of a commit (i.e. additions - deletions) for it to be considered, default: no limit. This is useful to exclude commits that do not make sense to take into account because many files were copied into the repository (e.g. JavaScript files in node.js projects).')
-parser.add_argument('-micd', '--min_commit_difference', type=int, nargs='?', help='Min difference of a commit (i.e. additions - deletions) for it to be considered, default: no limit. This is useful to exclude commits that do not make sense to take into account because many files were removed from the repository (e.g. JavaScript files in node.js projects).')
-parser.add_argument('-tc', '--top_contributors', type=int, nargs='?', help='Only keep the n top contributors based on the number of (additions - deletions), default: keep all.')
-parser.add_argument('-mph', '--max_points_html', type=int, nargs='?', help='Maximum number of points in the HTML output. A graph with too many points will not offer a good user experience.')
-
-
-args = parser.parse_args()
-
-# Check/validate parameters.
-if not args.file:
-    print ('file not specified (use -h for details)')
-    exit(1)
-elif len(args.file) != 1:
-    print ('one single source file allowed (use -h for details)')
-    exit(1)
-elif not os.path.exists(args.file[0]):
-    print ('file does not exist: %s' % args.file[0])
-    exit(1)
-if args.output_folder:
-    m_output_folder = args.output_folder
-if args.cache_folder:
-    m_cache_folder = args.cache_folder
-if args.csv_date_format:
-    m_csv_date_format = args.csv_date_format
-if args.email_to_author_file:
-    if not os.path.exists(args.email_to_author_file):
-        print ('file does not exist: %s' % args.email_to_author_file)
-        exit(1)
-    m_email_to_author_file = args.email_to_author_file
-if args.name_to_author_file:
-    if not os.path.exists(args.name_to_author_file):
-        print ('file does not exist: %s' % args.name_to_author_file)
-        exit(1)
-    m_name_to_author_file = args.name_to_author_file
-if args.top_contributors != None:
-    if args.top_contributors < 1:
-        print ('number of top contributors must be a positive integer')
-        exit(1)
-if args.max_points_html != None:
-    if args.max_points_html < 1:
-        print ('max number of points in HTML must be a positive integer')
-        exit(1)
+    Series with less points than their share keep all their points, what they do not use is shared
+    between the other series. A series keeps at least m_min_points_per_series data points.
+    """
+    if not html_data:
+        return {}
+    nb_points = {}
+    for author, one_series in list(html_data.values())[0]["authors"].items():
+        nb_points[author] = len(one_series["commits"])
+    budgets = {}
+    remaining_points = max_points
+    remaining_series = len(nb_points)
+    for author in sorted(nb_points.keys(), key=lambda k: nb_points[k]):
+        budgets[author] = min(nb_points[author], max(remaining_points // remaining_series, m_min_points_per_series))
+        remaining_points = max(remaining_points - budgets[author], 0)
+        remaining_series = remaining_series - 1
+    return budgets
+
+def get_lttb_points(x, y, max_points):
+    """Returns the indexes of the data points (x and y are the lists of their coordinates) to keep
+    so that there are at most max_points data points, selected with the Largest-Triangle-Three-Buckets
+    algorithm (LTTB).
+
+    The first and the last data points are always kept. The other ones are split into max_points - 2
+    buckets and the data point of every bucket forming the largest triangle with the data point kept
+    in the previous bucket and the average of the next bucket is kept. Unlike keeping one data point
+    out of N, peaks and valleys are preserved.
+    """
+    nb_points = len(x)
+    if nb_points <= max_points:
+        return list(range(nb_points))
+    if max_points < 3:
+        return [0, nb_points - 1][:max_points]
+    bucket_size = (nb_points - 2) / (max_points - 2)
+    result = [0]
+    a = 0
+    for i in range(max_points - 2):
+        # Average of the next bucket (the last data point for the last bucket).
+        next_start = int((i + 1) * bucket_size) + 1
+        next_end = min(int((i + 2) * bucket_size) + 1, nb_points)
+        start = int(i * bucket_size) + 1
+        end = next_start
+        avg_x = sum(x[next_start:next_end]) / (next_end - next_start)
+        avg_y = sum(y[next_start:next_end]) / (next_end - next_start)
+        max_area = -1
+        for j in range(start, end):
+            area = abs((x[a] - avg_x) * (y[j] - y[a]) - (x[a] - x[j]) * (avg_y - y[a]))
+            if area > max_area:
+                max_area = area
+                max_area_point = j
+        a = max_area_point
+        result.append(a)
+    result.append(nb_points - 1)
+    return result
 
-print ("Source file: %s" % args.file[0])
-print ("Output folder: %s" % m_output_folder)
-print ("Cache folder: %s" % m_cache_folder)
+def get_html_chart_data(html_data, html_commits, max_points, chart_types):
+    """Returns the JSON (as a string) with the data of the given charts (e.g. ['additions']) of the
+    HTML output, used by the chart.html template.
 
-if m_email_to_author_file:
-    print ("Email to author file: %s" % m_email_to_author_file)
-    eof_reader = csv.reader(open(m_email_to_author_file, newline=''), delimiter=',', quotechar='|')
-    for row in eof_reader:
-        if (len(row) != 2):
-            print ('wrong file format: %s (line: %s)' % (m_email_to_author_file, ",".join(row)))
-            exit(1)
-        m_email_to_author[row[0].lower()] = row[1]
-if m_name_to_author_file:
-    print ("Name to author file: %s" % m_name_to_author_file)
-    eof_reader = csv.reader(open(m_name_to_author_file, newline=''), delimiter=',', quotechar='|')
-    for row in eof_reader:
-        if (len(row) != 2):
-            print ('wrong file format: %s (line: %s)' % (m_name_to_author_file, ",".join(row)))
-            exit(1)
-        m_name_to_author[row[0].lower()] = row[1]
+    If max_points is set, every series is downsampled to its share of max_points (see
+    get_points_budgets(...) and get_lttb_points(...)). Only the data points kept and the commits
+    they reference are in the JSON.
+    Example of what this JSON looks like is available in docs/html_object_example.json.
+    """
+    budgets = get_points_budgets(html_data, max_points) if max_points else {}
+    charts = {}
+    used_commits = set()
+    for chart_type in chart_types:
+        charts[chart_type] = {"title": html_data[chart_type]["title"], "series": []}
+        for author, one_series in html_data[chart_type]["authors"].items():
+            if author in budgets:
+                points = get_lttb_points([html_commits["x"][c] for c in one_series["commits"]], one_series["y"], budgets[author])
+            else:
+                points = range(len(one_series["commits"]))
+            series = {}
+            series["commits"] = [one_series["commits"][i] for i in points]
+            series["y"] = [one_series["y"][i] for i in points]
+            series["plus_minus"] = [one_series["plus_minus"][i] for i in points]
+            # The author is only shown in the tooltips of OTHERS (author of the commit) and TOTAL
+            # (series the commit belongs to, i.e. its author or OTHERS).
+            if author == m_others_username:
+                series["tooltip_author"] = "commit"
+            elif author == m_total_username:
+                series["tooltip_author"] = "series"
+            used_commits.update(series["commits"])
+            charts[chart_type]["series"].append(series)
+
+    # Index of the commits in the JSON, i.e. without the commits that are not used anymore.
+    commit_indexes = {}
+    for commit_index in sorted(used_commits):
+        commit_indexes[commit_index] = len(commit_indexes)
+    for chart_type in charts.keys():
+        for series in charts[chart_type]["series"]:
+            series["commits"] = [commit_indexes[c] for c in series["commits"]]
+    commits = {}
+    for k in ["x", "sha", "repository", "author", "series", "nb_commits"]:
+        if k != "nb_commits" or m_bucket:
+            commits[k] = [html_commits[k][c] for c in commit_indexes.keys()]
+
+    chart_data = {}
+    chart_data["commits"] = commits
+    chart_data["authors"] = list(html_commits["authors"].keys())
+    chart_data["repositories"] = []
+    for (owner, repo) in html_commits["repositories"].keys():
+        repository = {"name": "%s/%s" % (owner, repo)}
+        # '{{commit_sha}}' is replaced in the browser.
+        if (owner, repo) in html_commits["commit_url_patterns"]:
+            repository["commit_url"] = html_commits["commit_url_patterns"][(owner, repo)].replace("{{owner}}", owner).replace("{{repository}}", repo)
+        chart_data["repositories"].append(repository)
+    chart_data["labels"] = list(list(html_data.values())[0]["authors"].keys()) if html_data else []
+    chart_data["charts"] = charts
+    # '</' must not appear in the script element of the HTML output.
+    return json.dumps(chart_data, separators=(',', ':')).replace("</", "<\\/")
+
+def write_html_chart_data_files(html_data, html_commits, max_points, source_file_full_path):
+    """Writes the data of every chart of the HTML output to its own JSON file (see
+    get_html_chart_data(...)) next to the HTML file and returns a dict with the filename (with path)
+    of every chart.
+    """
+    chart_data_files = {}
+    for chart_type in html_data.keys():
+        chart_data = get_html_chart_data(html_data, html_commits, max_points, [chart_type])
+        filename = get_html_data_filename_with_path(source_file_full_path, chart_type, chart_data)
+        with open(filename, "w") as fh:
+            fh.write(chart_data)
+        chart_data_files[chart_type] = filename
+    return chart_data_files
 
 #######################################################################
-# Start of actual processing.
-result = None
-to_process = []
-repos_html = []
-
-# Read source files and do some validation.
-csv_reader = csv.reader(open(args.file[0], newline=''), delimiter=',', quotechar='|')
-for row in csv_reader:
-    if len(row) < 9 or len(row) > 10:
-        print ('wrong file format: %s (line: %s)' % (args.file[0], ",".join(row)))
-        exit(1)
-    repos_html.append("%s/%s (%s)" % (row[3], row[4], row[5]))
-    to_process.append(row)
-
-if len(to_process) == 0:
-    print("No repository to process")
-    exit(1)
-
-print("Nb repos to process: %d\n" % len(to_process))
-
-# Processes all entries in the source file.
-commits_to_ignore = []
-commits_url_patterns = {}
-for idx, row in enumerate(to_process, 1):
-    # Commits to ignore are optional.
-    if len(row) == 10:
-         commits_to_ignore.extend(row[9].split(m_commits_to_ignore_separator))
-    owner = row[3]
-    repo = row[4]
-    commit_url_pattern = row[6]
-    a = get_rep_stats(row[0], row[1], row[2], owner, repo, row[5], row[7], row[8], idx, len(to_process))
-    if commit_url_pattern:
-        commits_url_patterns["%s/%s" % (owner, repo)] = commit_url_pattern
-    # If None is returned, something went wrong.
-    if a == None:
-        exit(1)
-    result = combine_results(result, a)
-
-# Do the necessary post-processing.
-# Note that this is done *after* date from local cache is leveraged, i.e. we can
-# quickly generate graphs with different parameters while reusing the data in teh cache.
-result = process_unknown(result)
-result = remove_commits_to_ignore(result, args.min_commit_difference, args.max_commit_difference, commits_to_ignore)
+# Command line and processing of the source file.
 
-# Sort and populate totals once all repos have been processed.
-for x in result:
-    a = result[x]
-    #print (json.dumps(a, indent=4, sort_keys=True))
-    a = sort_results(a)
-    a = populate_totals(a)
-    result[x] = a
+def get_args_parser():
+    """Returns the parser of the command line arguments.
+    """
+    parser = argparse.ArgumentParser(description='Generate combined activity graphs for any number of repositories.')
+    parser.add_argument('-f', '--file', type=str, nargs='+', help='File(s) containing the repos to process, or folder(s) containing such files (all the .csv files of the folder). Repos listed in several files are only fetched once, one CSV and one HTML file are generated per file. Format: <scheme>,<host>,<base_path>,<org>,<repo>,<branch>,<commit_url_pattern>,<since>,<api_token>[,<commits_to_ignore>]. <commits_to_ignore> is a %s separated list of SHA commits.' % m_commits_to_ignore_separator)
+    parser.add_argument('-i', '--ignore_files', type=str, nargs='*', help=argparse.SUPPRESS)
+    parser.add_argument('-a', '--authors', type=str, nargs='*', help='Only outputs statistics for the specified authors (all authors by default).')
+    parser.add_argument('-o', '--output_folder', type=str, nargs='?', help='Folder where the generated CSV files are stored, default: \'%s\'.' % m_output_folder)
+    parser.add_argument('-c', '--cache_folder', type=str, nargs='?', help='Folder where cache files are stored, default: \'%s\'.' % m_cache_folder)
+    parser.add_argument('-cb', '--cache_backend', type=str, nargs='?', choices=m_cache_backends, help='Cache backend: \'json\' stores one JSON file per repository, \'sqlite\' stores all repositories in one SQLite database (%s) where new commits are saved page by page as they are fetched, \'columnar\' stores one compact binary file per repository (fastest to load), default: \'%s\'.' % (m_sqlite_filename, m_cache_backend))
+    parser.add_argument('-dc', '--dedupe_commits', type=str2bool, nargs='?', default=True, help='Only take into account once commits found in several repositories or branches, default: yes.')
+    parser.add_argument('-oc', '--output_commits', type=str2bool, nargs='?', default=True, help='Outputs nb commits in genereted files, default: yes.')
+    parser.add_argument('-oa', '--output_additions', type=str2bool, nargs='?', default=True, help='Outputs additions in genereted files, default: yes.')
+    parser.add_argument('-od', '--output_deletions', type=str2bool, nargs='?', default=True, help='Outputs deletions in genereted files, default: yes.')
+    parser.add_argument('-odi', '--output_differences', type=str2bool, nargs='?', default=True, help='Outputs differences (i.e. additions - deletions) in genereted files, default: yes.')
+    parser.add_argument('-ot', '--output_totals', type=str2bool, nargs='?', default=True, help='Outputs totals (i.e. additions + deletions) in genereted files, default: yes.')
+    parser.add_argument('-d', '--csv_date_format', type=str, nargs='?', help='Date format in the generated CSV, default: \'%s\'.' % m_csv_date_format.replace('%', '%%'))
+    parser.add_argument('-cl', '--csv_layout', type=str, nargs='?', choices=m_csv_layouts, help='Layout of the generated CSV: \'wide\' has one column per author and field (e.g. additions), \'long\' has one row per commit with its author, its stats and the totals of its author and of %s, default: \'%s\'.' % (m_total_username, m_csv_layout))
+    parser.add_argument('-b', '--bucket', type=str, nargs='?', choices=m_buckets, help='Aggregate the commits of every author per day, week (starting on Monday) or month (UTC) in the generated files, the repository, SHA and URL are then the ones of the last commit of the bucket, default: one entry per commit.')
+    parser.add_argument('-eaf', '--email_to_author_file', type=str, nargs='?', help='File providing the mapping between email and username, useful when the username is not available in the Git commit but the email is. File format: one entry per line, first item is the email, second item is the username, separated by a comma.')
+    parser.add_argument('-naf', '--name_to_author_file', type=str, nargs='?', help='File providing the mapping between name and username, useful when the username is not available in the Git commit but the name is. File format: one entry per line, first item is the name, second item is the username, separated by a comma.')
+    parser.add_argument('-macd', '--max_commit_difference', type=int, nargs='?', help='Max difference of a commit (i.e. additions - deletions) for it to be considered, default: no limit. This is useful to exclude commits that do not make sense to take into account because many files were copied into the repository (e.g. JavaScript files in node.js projects).')
+    parser.add_argument('-micd', '--min_commit_difference', type=int, nargs='?', help='Min difference of a commit (i.e. additions - deletions) for it to be considered, default: no limit. This is useful to exclude commits that do not make sense to take into account because many files were removed from the repository (e.g. JavaScript files in node.js projects).')
+    parser.add_argument('-tc', '--top_contributors', type=int, nargs='?', help='Only keep the n top contributors based on the number of (additions - deletions), default: keep all.')
+    parser.add_argument('-mph', '--max_points_html', type=int, nargs='?', help='Maximum number of points per chart in the HTML output, shared between the series (authors). A graph with too many points will not offer a good user experience. Series are downsampled with the Largest-Triangle-Three-Buckets algorithm, which preserves peaks and valleys.')
+    parser.add_argument('-hdf', '--html_data_files', type=str2bool, nargs='?', default=False, help='Write the data of every chart of the HTML output to its own JSON file next to it, only fetched by the browser when the chart is displayed for the first time. The HTML file must then be served by a web server, default: no.')
+    parser.add_argument('-fw', '--fetch_workers', type=int, nargs='?', help='Number of commit details fetched concurrently from GitHub, default: %d (or the max number of concurrent requests per host with the threaded engine).' % m_fetch_workers)
+    parser.add_argument('-api', '--api', type=str, nargs='?', choices=m_apis, help='GitHub API used to retrieve the commits: \'rest\' needs one request per commit, \'graphql\' retrieves the stats of %d commits per request, default: \'%s\'.' % (m_commits_per_page, m_api))
+    parser.add_argument('-pt', '--pool_tokens', type=str2bool, nargs='?', default=False, help='Spread the requests to a given host over all the API tokens specified for that host in the source file (the tokens must all have access to all the repositories of that host), default: no.')
+    parser.add_argument('-e', '--engine', type=str, nargs='?', choices=m_engines, help='Fetch engine: \'sync\' processes the repositories one after the other, \'threaded\' processes them concurrently (see --max_concurrency), default: \'%s\'.' % m_engine)
+    parser.add_argument('-mc', '--max_concurrency', type=int, nargs='?', help='Max number of repositories processed and of requests performed concurrently with the threaded engine, default: %d.' % m_max_concurrency)
+    parser.add_argument('-mhc', '--max_host_concurrency', type=int, nargs='?', help='Max number of concurrent requests to a given host with the threaded engine, default: %d.' % m_max_host_concurrency)
+    parser.add_argument('-w', '--watch', type=int, nargs='?', help='Keep running and refresh the repositories every n seconds: the commits found so far are kept in memory, only the new ones are processed and the generated files are overwritten whenever there are new commits, default: run once.')
+    parser.add_argument('-co', '--cache_only', type=str2bool, nargs='?', default=False, help='Do not query for new commits the repositories that are already in the cache (e.g. kept up to date by the webhook receiver, see --webhook_port) and not marked as stale by it, default: no.')
+    parser.add_argument('-wp', '--webhook_port', type=int, nargs='?', help='Do not generate any output but listen on the given port for GitHub push webhooks and add the pushed commits to the cache of the repositories of the source file(s) that are already in the cache. Pushes that cannot be added (e.g. not following the most recent commit in the cache) mark the cache as stale: the repository is then crawled next time.')
+    parser.add_argument('-ws', '--webhook_secret', type=str, nargs='?', help='Secret of the GitHub webhook: payloads not signed with that secret are rejected, default: none (all payloads are accepted, hence the receiver only listens on 127.0.0.1).')
+    parser.add_argument('-mf', '--metrics_file', type=str, nargs='?', help='JSON file where the metrics of the run are written (timings per phase and per repository, HTTP requests, cache hits,...), default: no.')
+    parser.add_argument('-pf', '--prometheus_file', type=str, nargs='?', help='Also write the metrics of the run to that file in the Prometheus text format, e.g. for the textfile collector of the node exporter (the file name must then end with .prom), default: no.')
+    parser.add_argument('-cp', '--checkpoint_pages', type=int, nargs='?', help='Save the progress of the crawl of a repository every n pages of commits, so that it is resumed from there if it does not complete (0 to disable, except with the sqlite cache backend which saves every page as it is fetched), default: %d.' % m_checkpoint_pages)
+    return parser
+
+def init_settings(args):
+    """Checks the command line arguments (see get_args_parser()) and sets the corresponding settings
+    (m_* variables). Exits if an argument is not valid.
+    """
+    global m_api, m_bucket, m_cache_backend, m_cache_folder, m_cache_only, m_checkpoint_pages, m_csv_date_format, m_csv_layout, m_email_to_author_file, m_engine, m_fetch_workers, m_html_data_files, m_ignore_files, m_max_concurrency, m_max_host_concurrency, m_metrics_file, m_name_to_author_file, m_output_folder, m_pool_tokens, m_prometheus_file, m_requests_semaphore, m_webhook_secret
 
+    if not args.file:
+        print ('file not specified (use -h for details)')
+        exit(1)
+    for f in args.file:
+        if not os.path.exists(f):
+            print ('file does not exist: %s' % f)
+            exit(1)
+    if args.output_folder:
+        m_output_folder = args.output_folder
+    if args.cache_folder:
+        m_cache_folder = args.cache_folder
+    if args.cache_backend:
+        m_cache_backend = args.cache_backend
+    if args.csv_date_format:
+        m_csv_date_format = args.csv_date_format
+    if args.csv_layout:
+        m_csv_layout = args.csv_layout
+    if args.bucket:
+        m_bucket = args.bucket
+    if args.email_to_author_file:
+        if not os.path.exists(args.email_to_author_file):
+            print ('file does not exist: %s' % args.email_to_author_file)
+            exit(1)
+        m_email_to_author_file = args.email_to_author_file
+    if args.name_to_author_file:
+        if not os.path.exists(args.name_to_author_file):
+            print ('file does not exist: %s' % args.name_to_author_file)
+            exit(1)
+        m_name_to_author_file = args.name_to_author_file
+    if args.top_contributors != None:
+        if args.top_contributors < 1:
+            print ('number of top contributors must be a positive integer')
+            exit(1)
+    if args.max_points_html != None:
+        if args.max_points_html < 1:
+            print ('max number of points in HTML must be a positive integer')
+            exit(1)
+    if args.fetch_workers != None:
+        if args.fetch_workers < 1:
+            print ('number of fetch workers must be a positive integer')
+            exit(1)
+        m_fetch_workers = args.fetch_workers
+    if args.api:
+        m_api = args.api
+        if m_api == "graphql" and args.ignore_files:
+            print ('ignore files not supported with the graphql API')
+            exit(1)
+    if args.pool_tokens:
+        m_pool_tokens = True
+    if args.engine:
+        m_engine = args.engine
+    if args.max_concurrency != None:
+        if args.max_concurrency < 1:
+            print ('max number of concurrent requests must be a positive integer')
+            exit(1)
+        m_max_concurrency = args.max_concurrency
+    if args.max_host_concurrency != None:
+        if args.max_host_concurrency < 1:
+            print ('max number of concurrent requests per host must be a positive integer')
+            exit(1)
+        m_max_host_concurrency = args.max_host_concurrency
+    if args.watch != None:
+        if args.watch < 1:
+            print ('number of seconds between refreshes must be a positive integer')
+            exit(1)
+    if args.ignore_files:
+        m_ignore_files = args.ignore_files
+    if args.cache_only:
+        if args.watch:
+            print ('cache only mode not supported with watch mode')
+            exit(1)
+        m_cache_only = True
+    if args.webhook_port != None:
+        if args.webhook_port < 1 or args.webhook_port > 65535:
+            print ('webhook port must be between 1 and 65535')
+            exit(1)
+        if args.watch:
+            print ('webhook receiver not supported with watch mode')
+            exit(1)
+    if args.webhook_secret:
+        m_webhook_secret = args.webhook_secret
+    if args.metrics_file:
+        m_metrics_file = args.metrics_file
+    if args.prometheus_file:
+        m_prometheus_file = args.prometheus_file
+    if args.checkpoint_pages != None:
+        if args.checkpoint_pages < 0:
+            print ('number of pages between checkpoints must be a positive integer or 0')
+            exit(1)
+        m_checkpoint_pages = args.checkpoint_pages
+    if args.html_data_files:
+        m_html_data_files = True
+    if m_engine == "threaded":
+        m_requests_semaphore = threading.BoundedSemaphore(m_max_concurrency)
+        if args.fetch_workers == None:
+            m_fetch_workers = m_max_host_concurrency
+
+def load_author_mappings():
+    """Loads the email to author and name to author files, if any (see resolve_unknown_author(x)).
+    Exits if a file is not valid.
+    """
+    if m_email_to_author_file:
+        print ("Email to author file: %s" % m_email_to_author_file)
+        eof_reader = csv.reader(open(m_email_to_author_file, newline=''), delimiter=',', quotechar='|')
+        for row in eof_reader:
+            if (len(row) != 2):
+                print ('wrong file format: %s (line: %s)' % (m_email_to_author_file, ",".join(row)))
+                exit(1)
+            m_email_to_author[row[0].lower()] = row[1]
+    if m_name_to_author_file:
+        print ("Name to author file: %s" % m_name_to_author_file)
+        eof_reader = csv.reader(open(m_name_to_author_file, newline=''), delimiter=',', quotechar='|')
+        for row in eof_reader:
+            if (len(row) != 2):
+                print ('wrong file format: %s (line: %s)' % (m_name_to_author_file, ",".join(row)))
+                exit(1)
+            m_name_to_author[row[0].lower()] = row[1]
+
+def get_source_files(paths):
+    """Returns the list of the source files to process given the paths specified on the command line
+    (see --file): files are taken as is, folders are replaced by the .csv files they contain (sorted by
+    name). A file specified several times (e.g. directly and through its folder) is only processed once.
+    Exits if two source files would lead to the same output filenames.
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(os.path.join(path, f) for f in os.listdir(path) if f.endswith(".csv") and os.path.isfile(os.path.join(path, f))))
+        else:
+            files.append(path)
+    source_files = []
+    real_paths = set()
+    for source_file in files:
+        real_path = os.path.realpath(source_file)
+        if not real_path in real_paths:
+            real_paths.add(real_path)
+            source_files.append(source_file)
+    output_filenames = {}
+    for source_file in source_files:
+        output_filename = get_csv_output_filename(source_file)
+        if output_filename in output_filenames:
+            print ('source files would generate the same output files: %s, %s' % (output_filenames[output_filename], source_file))
+            exit(1)
+        output_filenames[output_filename] = source_file
+    return source_files
 
-# Start generating the output files.
-if result and len(result) > 0:
+def read_source_file(source_file):
+    """Returns a tuple (to_process, repos_html) for a given source file (see --file), where to_process
+    is the list of its rows (one per repo) and repos_html the names of the repos displayed in the
+    HTML output. Exits if the file is not valid.
+    """
+    to_process = []
+    repos_html = []
+    csv_reader = csv.reader(open(source_file, newline=''), delimiter=',', quotechar='|')
+    for row in csv_reader:
+        if len(row) < 9 or len(row) > 10:
+            print ('wrong file format: %s (line: %s)' % (source_file, ",".join(row)))
+            exit(1)
+        repos_html.append("%s/%s (%s)" % (row[3], row[4], row[5]))
+        to_process.append(row)
+        if not row[1] in m_host_tokens:
+            m_host_tokens[row[1]] = []
+        if not row[8] in m_host_tokens[row[1]]:
+            m_host_tokens[row[1]].append(row[8])
+    return (to_process, repos_html)
+
+def init_state(source_files):
+    """Returns the object holding everything that is kept in memory between the refreshes of the
+    repos listed in the given source files (see refresh_state(state, args)).
+
+    A repo listed in several source files is fetched (and its cache loaded) only once, but the
+    post-processing is done per source file as the commits to ignore, the duplicates and so on
+    depend on the other repos of the file.
+    """
+    state = {}
+    # Distinct repos to process (first row found for each of them).
+    state["to_process"] = []
+    # Result of get_rep_stats(...) for every repo (same order as to_process), None until fetched.
+    state["rep_stats"] = []
+    # Index in to_process of a repo, given its key (see get_repo_key(row)).
+    repos_index = {}
+    state["sources"] = []
+    for source_file in source_files:
+        (to_process, repos_html) = read_source_file(source_file)
+        source = {}
+        source["source_file"] = source_file
+        source["repos_html"] = repos_html
+        # Index in state["to_process"] of every row of the file (same order as the file).
+        source["repos"] = []
+        # Commits to ignore are optional. They apply to all the repos of the file, so they are all
+        # read upfront.
+        source["commits_to_ignore"] = set()
+        # Owner/repo -> commit URL pattern.
+        source["commits_url_patterns"] = {}
+        for row in to_process:
+            key = get_repo_key(row)
+            if not key in repos_index:
+                repos_index[key] = len(state["to_process"])
+                state["to_process"].append(row)
+                state["rep_stats"].append(None)
+            source["repos"].append(repos_index[key])
+            if len(row) == 10:
+                source["commits_to_ignore"].update(row[9].split(m_commits_to_ignore_separator))
+            if row[6]:
+                source["commits_url_patterns"]["%s/%s" % (row[3], row[4])] = row[6]
+        # SHAs of all the commits taken into account so far, see remove_duplicate_commits(...).
+        source["sha_index"] = set()
+        source["runs"] = init_runs()
+        # Number of new commits found by the last refresh.
+        source["nb_new_commits"] = 0
+        state["sources"].append(source)
+    return state
+
+def refresh_state(state, args):
+    """Fetches the new commits of all the repos of a given state (see init_state(source_files)) and
+    streams them through the post-processing of every source file listing them (see add_to_runs(...)).
+    Returns the number of new commits, or None if a repo could not be fetched for the first time.
+
+    The commits found so far are kept in memory (see get_rep_stats(...)): the cache is only read
+    the first time and only the new commits are processed afterwards. If a repo cannot be
+    refreshed, its commits found so far are kept and it is refreshed again next time.
+    """
+    to_process = state["to_process"]
+    # get_rep_stats(...) only appends the new commits to the lists of the authors: what is beyond
+    # these lengths is new.
+    lengths = [{k: len(v) for k, v in r.items()} if r != None else {} for r in state["rep_stats"]]
+    start = time.time()
+
+    # With the threaded engine, all repos are fetched concurrently upfront. Results are then
+    # combined in the order of to_process, exactly as with the sync engine.
+    all_rep_stats = None
+    if m_engine == "threaded":
+        all_rep_stats = get_all_rep_stats_threaded(to_process, state["rep_stats"])
+    else:
+        submit_git_logs(to_process, state["rep_stats"])
+
+    # Note that the post-processing is done *after* date from local cache is leveraged, i.e. we can
+    # quickly generate graphs with different parameters while reusing the data in teh cache.
+    # New commits of every repo (same order as to_process).
+    all_new_commits = [None] * len(to_process)
+    nb_new_commits = 0
+    for idx, row in enumerate(to_process, 1):
+        previous = state["rep_stats"][idx - 1]
+        try:
+            if all_rep_stats != None:
+                a = all_rep_stats[idx - 1]
+                all_rep_stats[idx - 1] = None
+                if isinstance(a, BaseException):
+                    raise a
+            else:
+                a = process_repo(row, idx, len(to_process), previous)
+        except RequestException as e:
+            if previous == None:
+                raise
+            print("    Error while refreshing %s/%s: %s" % (row[3], row[4], e))
+            a = None
+        # If None is returned, something went wrong.
+        if a == None:
+            if previous == None:
+                return None
+            # Remove what might have been appended before the error.
+            for k in list(previous.keys()):
+                if k in lengths[idx - 1]:
+                    del previous[k][lengths[idx - 1][k]:]
+                else:
+                    previous.pop(k)
+            print("    Could not refresh %s/%s, will try again next time" % (row[3], row[4]))
+            continue
+        state["rep_stats"][idx - 1] = a
+        new_commits = {}
+        for k in a.keys():
+            if len(a[k]) > lengths[idx - 1].get(k, 0):
+                new_commits[k] = a[k][lengths[idx - 1].get(k, 0):]
+        all_new_commits[idx - 1] = new_commits
+        nb_new_commits = nb_new_commits + sum(len(x) for x in new_commits.values())
+    add_metric(("phases", "fetch"), time.time() - start)
+
+    start = time.time()
+    for source in state["sources"]:
+        source["nb_new_commits"] = 0
+        for i in source["repos"]:
+            if not all_new_commits[i]:
+                continue
+            source["nb_new_commits"] = source["nb_new_commits"] + sum(len(x) for x in all_new_commits[i].values())
+            # The result from get_rep_stats(...) is left untouched (it might be shared with the cache
+            # and with the other source files): every source file gets its own commits.
+            new_commits = to_commits(all_new_commits[i])
+            if args.dedupe_commits:
+                new_commits = remove_duplicate_commits(new_commits, source["sha_index"])
+            source["runs"] = add_to_runs(source["runs"], new_commits, args.min_commit_difference, args.max_commit_difference, source["commits_to_ignore"])
+    add_metric(("phases", "post_processing"), time.time() - start)
+    return nb_new_commits
+
+def write_outputs(result, args, source_file, repos_html, commits_url_patterns, generation_date):
+    """Generates the CSV and HTML output files for a given source file from its result dict (see
+    refresh_state(state, args) and populate_all_totals(r)).
+    """
+    if not result or len(result) == 0:
+        return
 
-    csv_output_filename = get_csv_output_filename_with_path(args.file[0])
+    start = time.time()
+    csv_output_filename = get_csv_output_filename_with_path(source_file)
     with open(csv_output_filename, 'w', newline='') as csvfile:
         writer = csv.writer(csvfile, delimiter=',', quotechar='|', quoting=csv.QUOTE_MINIMAL)
         row = []
@@ -901,15 +3025,15 @@ if result and len(result) > 0:
 
 
 
-        # This object will be used to generate the HTML output, which is generated
-        # with a jinja2 template.
-        # Example of what this object looks like is available in docs/html_data_example.json.
-        # TODO: the current data structure contains a lot of duplicate information and should
-        # be optimized/reworked.
+        # These objects will be used to generate the HTML output, which is generated
+        # with a jinja2 template (see get_html_chart_data(...)).
         html_data = {}
+        html_commits = init_html_commits()
 
         top_contributors = get_top_contributors(result, args.top_contributors)
         (result, authors_hidden) = replace_hidden_with_others(result, top_contributors, args.authors)
+        if m_bucket:
+            result = bucket_results(result, m_bucket)
 
         # Note that we add fictive 'TOTAL' user to see general trend.
         # This includes all commits, even those from the authors that are not displayed.
@@ -917,201 +3041,551 @@ if result and len(result) > 0:
         # or explicitely excluded).
         authors = sorted(result.keys(), key=str.lower)
 
+        # Totals for user TOTAL, in the same order as merge_sort_results(result).
+        all_results = merge_sort_results(result)
+        all_totals = zip(*get_running_totals([all_results])[0])
+
         authors.append(m_total_username)
         for author in authors:
             authors_pos[author] = len(authors_pos.keys()) + 1
-            # Headers depends on the author to include and on the
-            # on the data to be included (additions, deletions,...).
+            # One series per author and data to be included (additions, deletions,...).
             if args.output_commits:
-                row.append("%s (commits)" % author)
                 html_data = init_html_data(html_data, "nb_commits", "Number of commits", author)
             if args.output_additions:
-                row.append("%s (additions)" % author)
                 html_data = init_html_data(html_data, "additions", "Additions", author)
             if args.output_deletions:
-                row.append("%s (deletions)" % author)
                 html_data = init_html_data(html_data, "deletions", "Deletions", author)
             if args.output_differences:
-                row.append("%s (difference)" % author)
                 html_data = init_html_data(html_data, "difference", "Difference", author)
             if args.output_totals:
-                row.append("%s (total)" % author)
                 html_data = init_html_data(html_data, "total", "Total", author)
 
-        nb_fields_per_author = sum([args.output_commits, args.output_additions, args.output_deletions, args.output_differences, args.output_totals])
+        # Name of the fields to output (both for authors and TOTAL).
+        fields = []
+        if args.output_commits:
+            fields.append("commits")
+        if args.output_additions:
+            fields.append("additions")
+        if args.output_deletions:
+            fields.append("deletions")
+        if args.output_differences:
+            fields.append("difference")
+        if args.output_totals:
+            fields.append("total")
+        nb_fields_per_author = len(fields)
 
         #print("Nb fields per author: %d" % nb_fields_per_author)
 
-        row.append("Repository")
-        row.append("Commit SHA")
-        row.append("Commit URL")
+        # With buckets, the repository, SHA and URL are the ones of the last commit of the bucket.
+        commit_headers = ["Last commit repository", "Last commit SHA", "Last commit URL"] if m_bucket else ["Repository", "Commit SHA", "Commit URL"]
+        if m_csv_layout == "long":
+            # One row per commit: the stats of the commit, then the totals of its author and of TOTAL.
+            row.append("Author")
+            row.extend(commit_headers)
+            if m_bucket:
+                row.extend(["Bucket (%s)" % f for f in fields])
+            else:
+                row.extend(["Commit (%s)" % f for f in fields if f != "commits"])
+            row.extend(["Author (%s)" % f for f in fields])
+            row.extend(["%s (%s)" % (m_total_username, f) for f in fields])
+        else:
+            for author in authors:
+                row.extend(["%s (%s)" % (author, f) for f in fields])
+            row.extend(commit_headers)
 
         writer.writerow(row)
 
-        # Totals for user TOTAL are calculated as we generate the CSV file.
-        total_nb_commits = 0
-        total_additions = 0
-        total_deletions = 0
-        total_difference = 0
-        total_total = 0
-
         # Loop through all commits, ordered by date.
-        for one_result in merge_sort_results(result):
-            the_author = one_result["author"]
+        for one_result, one_total in zip(all_results, all_totals):
+            the_author = one_result.author
             is_others = the_author in authors_hidden
 
             if is_others:
                 the_author = m_others_username
 
 
-            row = []
-            the_date = datetime.datetime.strptime(one_result["date"], "%Y-%m-%dT%H:%M:%SZ")
-            row.append(the_date.strftime(m_csv_date_format))
-
-            # This object will be deep copied for each line to generate in the graph
-            # for this author (e.g. the additions line if additions must be rendered, the
-            # deletions line if deletions must be rendered,...).
-            # Each deep copy has its own 'y' value obviously.
-            html_object = {}
-            html_object["year"] = the_date.year
-            # -1 because months are 0-indexed in JavaScript.
-            html_object["month"] = the_date.month - 1
-            html_object["day"] = the_date.day
-            html_object["hours"] = the_date.hour
-            html_object["minutes"] = the_date.minute
-            html_object["seconds"] = the_date.second
-
-            html_object["owner"] = one_result["owner"]
-            html_object["repo"] = one_result["repo"]
-            html_object["branch"] = one_result["branch"]
-            html_object["sha"] = one_result["sha"]
-            # We only 'author' to OTHERS and TOTAL It would be redundent to show it for
-            # every user at it is already displayed in the tooltip.
-            if is_others:
-                html_object["author"] = one_result["author"]
+            the_date = datetime.datetime.utcfromtimestamp(one_result.date)
 
-            owner_repo = "%s/%s" % (one_result["owner"], one_result["repo"])
+            owner_repo = "%s/%s" % (one_result.owner, one_result.repo)
             commit_url = None
             if owner_repo in commits_url_patterns:
-                commit_url = commits_url_patterns[owner_repo].replace("{{owner}}", one_result["owner"]).replace("{{repository}}", one_result["repo"]).replace("{{commit_sha}}", one_result["sha"])
-                # This allows to have a HREF link pointing to the actual GitHub commit page when clicking
-                # on the data point in the generated graph.
-                html_object["commit_url"] = commit_url
+                commit_url = commits_url_patterns[owner_repo].replace("{{owner}}", one_result.owner).replace("{{repository}}", one_result.repo).replace("{{commit_sha}}", one_result.sha)
+            # The commit URL pattern allows to have a HREF link pointing to the actual GitHub commit page
+            # when clicking on the data point in the generated graph.
+            commit_index = add_html_commit(html_commits, one_result, authors_pos[the_author] - 1, commits_url_patterns.get(owner_repo))
             # Show branch in output.
-            owner_repo = "%s (%s)" % (owner_repo, one_result["branch"])
-
-
-            # Add empty cells to add in the right column.
-            for x in range(0, authors_pos[the_author] - 1):
-                for y in range(0, nb_fields_per_author):
-                    row.append("")
+            owner_repo = "%s (%s)" % (owner_repo, one_result.branch)
 
+            commit_values = []
+            author_values = []
             if args.output_commits:
-                row.append(one_result["total_stats_author"]["nb_commits"])
-                html_data = populate_html_data(html_data, html_object, "nb_commits", the_author, one_result["total_stats_author"]["nb_commits"], 1)
+                if m_bucket:
+                    commit_values.append(one_result.nb_commits)
+                author_values.append(one_result.total_nb_commits)
+                html_data = populate_html_data(html_data, commit_index, "nb_commits", the_author, one_result.total_nb_commits, one_result.nb_commits)
             if args.output_additions:
-                row.append(one_result["total_stats_author"]["additions"])
-                html_data = populate_html_data(html_data, html_object, "additions", the_author, one_result["total_stats_author"]["additions"], one_result["stats"]["additions"])
+                commit_values.append(one_result.additions)
+                author_values.append(one_result.total_additions)
+                html_data = populate_html_data(html_data, commit_index, "additions", the_author, one_result.total_additions, one_result.additions)
             if args.output_deletions:
-                row.append(one_result["total_stats_author"]["deletions"])
-                html_data = populate_html_data(html_data, html_object, "deletions", the_author, one_result["total_stats_author"]["deletions"], one_result["stats"]["deletions"])
+                commit_values.append(one_result.deletions)
+                author_values.append(one_result.total_deletions)
+                html_data = populate_html_data(html_data, commit_index, "deletions", the_author, one_result.total_deletions, one_result.deletions)
             if args.output_differences:
-                row.append(one_result["total_stats_author"]["difference"])
-                html_data = populate_html_data(html_data, html_object, "difference", the_author, one_result["total_stats_author"]["difference"], one_result["stats"]["difference"])
+                commit_values.append(one_result.difference)
+                author_values.append(one_result.total_difference)
+                html_data = populate_html_data(html_data, commit_index, "difference", the_author, one_result.total_difference, one_result.difference)
             if args.output_totals:
-                row.append(one_result["total_stats_author"]["total"])
-                html_data = populate_html_data(html_data, html_object, "total", the_author, one_result["total_stats_author"]["total"], one_result["stats"]["total"])
-
-            # len() -1 because oF TOTAL user that we must not take into account.
-            for x in range(authors_pos[the_author], len(authors_pos)-1):
-                for y in range(0, nb_fields_per_author):
-                    row.append("")
+                commit_values.append(one_result.total)
+                author_values.append(one_result.total_total)
+                html_data = populate_html_data(html_data, commit_index, "total", the_author, one_result.total_total, one_result.total)
 
             # Add fictive 'TOTAL' user to see general trend.
-            total_nb_commits = total_nb_commits + 1
-            total_additions = total_additions + one_result["stats"]["additions"]
-            total_deletions = total_deletions + one_result["stats"]["deletions"]
-            total_difference = total_difference + one_result["stats"]["difference"]
-            total_total = total_total + one_result["stats"]["total"]
-
-            # This will only add the 'author' to TOTAL since we create deep
-            # copies of html_object. It would be redundent to show it for
-            # every user at it is already displayed in the tooltip.
-            html_object["author"] = the_author;
-
+            (total_nb_commits, total_additions, total_deletions, total_difference, total_total) = one_total
+            total_values = []
             if args.output_commits:
-                row.append(total_nb_commits)
-                html_data = populate_html_data(html_data, html_object, "nb_commits", m_total_username, total_nb_commits, 1)
+                total_values.append(total_nb_commits)
+                html_data = populate_html_data(html_data, commit_index, "nb_commits", m_total_username, total_nb_commits, one_result.nb_commits)
             if args.output_additions:
-                row.append(total_additions)
-                html_data = populate_html_data(html_data, html_object, "additions", m_total_username, total_additions, one_result["stats"]["additions"])
+                total_values.append(total_additions)
+                html_data = populate_html_data(html_data, commit_index, "additions", m_total_username, total_additions, one_result.additions)
             if args.output_deletions:
-                row.append(total_deletions)
-                html_data = populate_html_data(html_data, html_object, "deletions", m_total_username, total_deletions, one_result["stats"]["deletions"])
+                total_values.append(total_deletions)
+                html_data = populate_html_data(html_data, commit_index, "deletions", m_total_username, total_deletions, one_result.deletions)
             if args.output_differences:
-                row.append(total_difference)
-                html_data = populate_html_data(html_data, html_object, "difference", m_total_username, total_difference, one_result["stats"]["difference"])
+                total_values.append(total_difference)
+                html_data = populate_html_data(html_data, commit_index, "difference", m_total_username, total_difference, one_result.difference)
             if args.output_totals:
-                row.append(total_total)
-                html_data = populate_html_data(html_data, html_object, "total", m_total_username, total_total, one_result["stats"]["total"])
-
-            # Show the repo this commit is comming from.
-            row.append(owner_repo)
-            row.append("%s" % one_result["sha"])
-            if commit_url:
-                row.append("%s" % commit_url)
-                html_object["commit_url"] = commit_url
+                total_values.append(total_total)
+                html_data = populate_html_data(html_data, commit_index, "total", m_total_username, total_total, one_result.total)
+
+            row = []
+            row.append(the_date.strftime(m_csv_date_format))
+            if m_csv_layout == "long":
+                row.append(the_author)
+                row.append(owner_repo)
+                row.append("%s" % one_result.sha)
+                row.append("%s" % commit_url if commit_url else "")
+                row.extend(commit_values)
+                row.extend(author_values)
+                row.extend(total_values)
             else:
-                row.append("")
+                # Add empty cells to add in the right column.
+                row.extend([""] * ((authors_pos[the_author] - 1) * nb_fields_per_author))
+                row.extend(author_values)
+                # len() -1 because oF TOTAL user that we must not take into account.
+                row.extend([""] * ((len(authors_pos) - 1 - authors_pos[the_author]) * nb_fields_per_author))
+                row.extend(total_values)
+                # Show the repo this commit is comming from.
+                row.append(owner_repo)
+                row.append("%s" % one_result.sha)
+                if commit_url:
+                    row.append("%s" % commit_url)
+                else:
+                    row.append("")
 
             writer.writerow(row)
 
         print("Output file generated: %s" % csv_output_filename)
+        add_metric(("phases", "csv_output"), time.time() - start)
 
-        # Create the jinja2 environment.
-        env = Environment(loader=FileSystemLoader('templates'))
-        template = env.get_template('chart.html')
-        html_data_values = {}
-        for chart_type in html_data.keys():
-            html_data_values
-            list(html_data.values())
-
-        # This max_points_divide_factor allows to get close to the max number
-        # of points requested by the user, but we might have more or less, which
-        # is not big deal.
-        # Also, the technic we use to limit the number of points in the graph is to
-        # simply render one out of max_points_divide_factor, which is basic and might
-        # not properly show peaks and valleys. But that should be fine in most cases.
-        max_points_divide_factor = 1
-        if args.max_points_html and html_data.keys():
-            total_nb_points = 0
-            temp_list = list(html_data.values())[0]["authors"]
-            for hdv in temp_list.values():
-                if "data" in hdv:
-                    total_nb_points = total_nb_points + len(hdv["data"])
-            if total_nb_points > args.max_points_html:
-                max_points_divide_factor = int(total_nb_points / args.max_points_html)
-
-        #print (json.dumps(html_data, indent=4, sort_keys=True))
-
-        output_from_parsed_template = template.render(labels_and_data=html_data,
-                                                      generation_date=m_now.strftime(m_csv_date_format),
-                                                      repositories=sorted(repos_html, key=str.lower),
-                                                      authors_hidden=sorted(authors_hidden, key=str.lower),
-                                                      max_points_divide_factor=max_points_divide_factor,
-                                                      title=get_html_title(args.file[0]))
-
-        # to save the results
-        html_output_filename = get_html_output_filename_with_path(args.file[0])
-        with open(html_output_filename, "w") as fh:
-            fh.write(output_from_parsed_template)
-
-        print("Output file generated: %s" % html_output_filename)
+        write_html_output(html_data, html_commits, args, source_file, repos_html, authors_hidden, generation_date)
 
         print("    Total nb authors: %d" % (len(authors_hidden) + len(authors_pos.keys())))
         if len(authors_hidden) > 0:
             print("    OTHERS include the following authors:\n        %s" % "\n        ".join(sorted(authors_hidden, key=str.lower)))
 
-print ('\nDone.')
-# Everything went fine.
-exit(0)
+def write_html_output(html_data, html_commits, args, source_file, repos_html, authors_hidden, generation_date):
+    """Generates the HTML output file for a given source file from the chart series and commits
+    built while generating the CSV output (see write_outputs(...)).
+    """
+    start = time.time()
+    # Create the jinja2 environment.
+    env = Environment(loader=FileSystemLoader('templates'))
+    template = env.get_template('chart.html')
+    html_output_filename = get_html_output_filename_with_path(source_file)
+    if m_html_data_files:
+        chart_data = None
+        chart_data_filenames = write_html_chart_data_files(html_data, html_commits, args.max_points_html, source_file)
+        chart_data_files = json.dumps({k: os.path.basename(v) for k, v in chart_data_filenames.items()}).replace("</", "<\\/")
+    else:
+        chart_data = get_html_chart_data(html_data, html_commits, args.max_points_html, html_data.keys())
+        chart_data_files = None
+    output_from_parsed_template = template.render(charts=html_data,
+                                                  chart_data=chart_data,
+                                                  chart_data_files=chart_data_files,
+                                                  generation_date=generation_date.strftime(m_csv_date_format),
+                                                  repositories=sorted(repos_html, key=str.lower),
+                                                  authors_hidden=sorted(authors_hidden, key=str.lower),
+                                                  title=get_html_title(source_file))
+
+    # to save the results
+    with open(html_output_filename, "w") as fh:
+        fh.write(output_from_parsed_template)
+
+    if m_html_data_files:
+        # The HTML file generated previously for this source file by this process (e.g. watch mode) has
+        # just been overwritten: the data files only it was using can be deleted.
+        filenames = set(chart_data_filenames.values())
+        for filename in m_html_data_files_written.get(source_file, set()) - filenames:
+            if os.path.exists(filename):
+                os.remove(filename)
+        m_html_data_files_written[source_file] = filenames
+
+    print("Output file generated: %s" % html_output_filename)
+    add_metric(("phases", "html_output"), time.time() - start)
+
+def get_prometheus_metrics():
+    """Returns the metrics of the run (see add_metric(keys, value)) in the Prometheus text format,
+    e.g. for the textfile collector of the node exporter.
+    """
+    def escape(label):
+        return label.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+    # Name -> (description, list of (labels, value)).
+    metrics = {}
+    def add(name, description, labels, value):
+        if not name in metrics:
+            metrics[name] = (description, [])
+        metrics[name][1].append((",".join('%s="%s"' % (k, escape(v)) for k, v in labels), value))
+
+    add("grevos_run_timestamp_seconds", "Time of the end of the run.", [], m_metrics["end_timestamp"])
+    for phase, seconds in m_metrics.get("phases", {}).items():
+        add("grevos_phase_seconds", "Wall time of the phases of the run.", [("phase", phase)], seconds)
+    for repo, repo_metrics in m_metrics.get("repos", {}).items():
+        add("grevos_repo_seconds", "Wall time spent on a repository.", [("repository", repo)], repo_metrics["seconds"])
+        if "commits" in repo_metrics:
+            add("grevos_repo_commits", "Number of commits of a repository.", [("repository", repo)], repo_metrics["commits"])
+    http = m_metrics.get("http", {})
+    for endpoint, statuses in http.get("requests", {}).items():
+        for status, count in statuses.items():
+            add("grevos_http_requests", "Number of HTTP requests per endpoint and status code.", [("endpoint", endpoint), ("status", status)], count)
+    for direction in ("sent", "received"):
+        add("grevos_http_bytes", "Number of bytes transferred (bodies only).", [("direction", direction)], http.get("bytes_%s" % direction, 0))
+    for host, rate_limit in m_metrics.get("rate_limits", {}).items():
+        add("grevos_rate_limit_remaining_min", "Lowest number of remaining requests reported by a host.", [("host", host)], rate_limit["remaining_min"])
+    for cache_type, counts in m_metrics.get("cache", {}).items():
+        add("grevos_cache_hits", "Number of cache hits.", [("cache", cache_type)], counts.get("hits", 0))
+        add("grevos_cache_misses", "Number of cache misses.", [("cache", cache_type)], counts.get("misses", 0))
+    for reason, count in m_metrics.get("commits_dropped", {}).items():
+        add("grevos_commits_dropped", "Number of commits not taken into account.", [("reason", reason)], count)
+
+    lines = []
+    for name, (description, values) in metrics.items():
+        lines.append("# HELP %s %s" % (name, description))
+        lines.append("# TYPE %s gauge" % name)
+        for labels, value in values:
+            lines.append("%s%s %s" % (name, "{%s}" % labels if labels else "", value))
+    return "\n".join(lines) + "\n"
+
+def write_metrics():
+    """Writes the metrics of the run (see add_metric(keys, value)) as JSON and/or in the Prometheus
+    text format, if requested (see --metrics_file and --prometheus_file).
+
+    In watch mode, the metrics are written after every generation and cover the whole run so far.
+    """
+    with m_metrics_lock:
+        m_metrics["end_timestamp"] = time.time()
+        m_metrics.setdefault("phases", {})["total"] = m_metrics["end_timestamp"] - m_metrics["start_timestamp"]
+        if m_metrics_file:
+            with open(m_metrics_file, "w") as f:
+                json.dump(m_metrics, f, indent=4, sort_keys=True)
+            print("Metrics file generated: %s" % m_metrics_file)
+        if m_prometheus_file:
+            # The node exporter may read the file at any time: it is replaced at once.
+            with open("%s.tmp" % m_prometheus_file, "w") as f:
+                f.write(get_prometheus_metrics())
+            os.replace("%s.tmp" % m_prometheus_file, m_prometheus_file)
+            print("Metrics file generated: %s" % m_prometheus_file)
+
+def watch(state, args):
+    """Refreshes the repos of a given state (see refresh_state(state, args)) every args.watch
+    seconds and generates the output files again whenever new commits are found, until interrupted.
+
+    The output files are overwritten (same filenames), only their generation date changes. Only
+    the output files of the source files listing repos with new commits are generated again.
+    """
+    print("\nWatching the repositories, refreshed every %d seconds (Ctrl+C to stop)" % args.watch)
+    try:
+        while True:
+            time.sleep(args.watch)
+            print("\nRefreshing the repositories (%s)" % datetime.datetime.now().strftime(m_csv_date_format))
+            nb_new_commits = refresh_state(state, args)
+            if not nb_new_commits:
+                print("No new commit, output files are not generated again")
+                continue
+            print("%d new commit(s) found" % nb_new_commits)
+            for source in state["sources"]:
+                if source["nb_new_commits"] == 0:
+                    continue
+                # Merge and populate totals once all repos have been processed.
+                start = time.time()
+                result = populate_all_totals(merge_runs(source["runs"]))
+                add_metric(("phases", "post_processing"), time.time() - start)
+                write_outputs(result, args, source["source_file"], source["repos_html"], source["commits_url_patterns"], datetime.datetime.now())
+            write_metrics()
+    except KeyboardInterrupt:
+        print("\nStopped.")
+
+def get_pushed_branch(payload):
+    """Returns a tuple (owner, repo, branch) with the branch a GitHub push webhook payload is about, or
+    None if it is not about a branch (e.g. a tag) or if the branch was deleted.
+    """
+    ref = payload.get("ref") or ""
+    repository = payload.get("repository") or {}
+    owner = (repository.get("owner") or {}).get("login") or (repository.get("owner") or {}).get("name")
+    repo = repository.get("name")
+    if not ref.startswith("refs/heads/") or payload.get("deleted") or not owner or not repo:
+        return None
+    return (owner, repo, ref[len("refs/heads/"):])
+
+def get_pushed_rows(payload, to_process):
+    """Returns the rows of to_process (same owner, repo and branch) a GitHub push webhook payload is
+    about, see get_pushed_branch(payload).
+    """
+    pushed_branch = get_pushed_branch(payload)
+    if not pushed_branch:
+        return []
+    (owner, repo, branch) = pushed_branch
+    return [row for row in to_process if not is_git_scheme(row[0]) and row[3].lower() == owner.lower() and row[4].lower() == repo.lower() and row[5] == branch]
+
+def mark_pushed_rows_stale(payload, to_process):
+    """Marks as stale the cache of the rows of to_process a GitHub push webhook payload is about (see
+    mark_cache_stale(url)), e.g. when the payload could not be processed.
+    """
+    for row in get_pushed_rows(payload, to_process):
+        mark_cache_stale(get_rep_stats_cache_url(row[0], row[1], row[2], row[3], row[4], row[5], row[7]))
+
+def add_pushed_commits(payload, to_process):
+    """Adds the commits of a GitHub push webhook payload to the cache of the matching repos (see
+    get_pushed_rows(payload, to_process)). Returns the number of commits added.
+
+    Only repos that are already in the cache are updated: otherwise the next crawl would only look for
+    commits more recent than the pushed ones. For the same reason, no commit must be missing between
+    the most recent commit in the cache and the pushed ones: the commits are only added if the push
+    starts right after it ('before' SHA), is not forced and lists all its commits. Otherwise (e.g. a
+    missed delivery), or if the details of a commit (retrieved like when crawling, see
+    get_commit_details(...)) cannot be retrieved, nothing is added and the cache is marked as stale (see
+    mark_cache_stale(url)): the next crawl finds the new commits, even with --cache_only.
+    """
+    pushed_branch = get_pushed_branch(payload)
+    if not pushed_branch:
+        print("    Ignoring push to %s" % payload.get("ref"))
+        return 0
+    (owner, repo, branch) = pushed_branch
+    commits = payload.get("commits") or []
+    print("Push to %s/%s (%s): %d commit(s)" % (owner, repo, branch, len(commits)))
+
+    nb_added = 0
+    for row in get_pushed_rows(payload, to_process):
+        cache_url = get_rep_stats_cache_url(row[0], row[1], row[2], row[3], row[4], row[5], row[7])
+        from_cache = get_cache(cache_url)
+        if not from_cache or not from_cache[1]:
+            print("    %s/%s (%s) is not in the cache yet, it must be crawled first" % (row[3], row[4], row[5]))
+            continue
+        result = from_cache[0]
+        shas = get_shas(result)
+        if payload.get("after") in shas:
+            # e.g. a delivery received twice.
+            print("    Pushed commits are already in the cache of %s/%s (%s)" % (row[3], row[4], row[5]))
+            continue
+        if is_cache_stale(cache_url):
+            print("    Cache of %s/%s (%s) is stale, the pushed commits will be found by the next crawl" % (row[3], row[4], row[5]))
+            continue
+        if payload.get("before") != from_cache[2] or payload.get("forced") or len(commits) == 0 or len(commits) >= m_max_push_commits or commits[-1].get("id") != payload.get("after"):
+            print("    Push does not directly follow the cache of %s/%s (%s) or does not list all its commits, the next crawl will find them" % (row[3], row[4], row[5]))
+            mark_cache_stale(cache_url)
+            continue
+        since_date = datetime.datetime.strptime(row[7], "%Y-%m-%dT%H:%M:%SZ") if row[7] else None
+        new_results = []
+        for commit in commits:
+            commit_sha = commit.get("id")
+            if not commit_sha or commit_sha in shas:
+                continue
+            commit_details = get_commit_details(row[0], row[1], row[2], row[3], row[4], commit_sha, row[8])
+            if commit_details == None:
+                new_results = None
+                break
+            # Commit to ignore (see --ignore_files).
+            if len(commit_details.keys()) == 0:
+                continue
+            d = datetime.datetime.strptime(commit_details["date"], "%Y-%m-%dT%H:%M:%SZ")
+            if since_date and d < since_date:
+                continue
+            author = commit.get("author") or {}
+            one_result = {}
+            one_result["author"] = author.get("username") or m_unknown_username
+            if author.get("email"):
+                one_result["author_email"] = author["email"]
+            if author.get("name"):
+                one_result["author_name"] = author["name"]
+            one_result["sha"] = commit_sha
+            one_result["date"] = commit_details["date"]
+            one_result["stats"] = commit_details["stats"]
+            one_result["date_unix"] = unix_time_millis(d)
+            one_result["owner"] = row[3]
+            one_result["repo"] = row[4]
+            one_result["branch"] = row[5]
+            result.setdefault(one_result["author"], []).append(one_result)
+            new_results.append(one_result)
+            shas.add(commit_sha)
+        if new_results == None:
+            print("    Could not retrieve the pushed commits of %s/%s (%s), the next crawl will find them" % (row[3], row[4], row[5]))
+            mark_cache_stale(cache_url)
+            continue
+        if len(new_results) > 0:
+            cache(cache_url, result, new_results)
+        print("    %d commit(s) added to the cache of %s/%s (%s)" % (len(new_results), row[3], row[4], row[5]))
+        nb_added = nb_added + len(new_results)
+    return nb_added
+
+class WebhookHandler(http.server.BaseHTTPRequestHandler):
+    """Handles the requests received by the webhook receiver (see serve_webhooks(to_process, port)).
+
+    Push payloads are only checked and queued: they are processed one at a time by another thread,
+    so that GitHub gets its reply right away.
+    """
+
+    def do_POST(self):
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            length = -1
+        if length < 0:
+            self.reply(400, "Invalid Content-Length")
+            return
+        body = self.rfile.read(length)
+        if m_webhook_secret:
+            signature = "sha256=%s" % hmac.new(m_webhook_secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+            if not hmac.compare_digest(signature, self.headers.get("X-Hub-Signature-256", "")):
+                self.reply(401, "Invalid signature")
+                return
+        event = self.headers.get("X-GitHub-Event")
+        if event != "push":
+            self.reply(200, "Ignoring event: %s" % event)
+            return
+        try:
+            payload = json.loads(body.decode('utf-8'))
+        except ValueError:
+            self.reply(400, "Invalid payload")
+            return
+        self.server.payloads.put(payload)
+        self.reply(202, "Accepted")
+
+    def reply(self, status_code, message):
+        data = message.encode('utf-8')
+        self.send_response(status_code)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+def process_webhooks(payloads, to_process):
+    """Processes the push payloads queued by the webhook receiver, one at a time, so that the cache of
+    a given repo is never updated concurrently (see add_pushed_commits(payload, to_process)), until
+    None is queued.
+    """
+    while True:
+        payload = payloads.get()
+        if payload == None:
+            return
+        try:
+            add_pushed_commits(payload, to_process)
+        except Exception as e:
+            print("    Error while processing push: %s" % e)
+            mark_pushed_rows_stale(payload, to_process)
+
+def serve_webhooks(to_process, port):
+    """Listens on the given port for GitHub push webhooks and adds the pushed commits to the cache of
+    the repos in to_process (see add_pushed_commits(payload, to_process)), until interrupted.
+
+    Running grevos with --cache_only then generates the outputs without querying these repos.
+
+    Payloads can only be checked with a secret (see --webhook_secret): without one, the receiver only
+    listens on the loopback interface (e.g. behind a reverse proxy), not on all the interfaces.
+    """
+    address = "" if m_webhook_secret else "127.0.0.1"
+    server = http.server.ThreadingHTTPServer((address, port), WebhookHandler)
+    # Requests being handled are waited for when closing the server, so that no payload is lost.
+    server.daemon_threads = False
+    server.payloads = queue.Queue()
+    worker = threading.Thread(target=process_webhooks, args=(server.payloads, to_process))
+    worker.start()
+    print("Listening for GitHub push webhooks on %s port %d (Ctrl+C to stop)" % ("all interfaces," if address == "" else address, port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopped.")
+    server.server_close()
+    # The payloads not processed yet are not lost: the repos they are about will be crawled next time.
+    while True:
+        try:
+            payload = server.payloads.get_nowait()
+        except queue.Empty:
+            break
+        if payload != None:
+            mark_pushed_rows_stale(payload, to_process)
+    # Wait for the payload being processed, if any.
+    server.payloads.put(None)
+    worker.join()
+
+def main():
+    """Entry point: processes the source files given on the command line.
+    """
+    print("GREVOS")
+    print("------\n")
+
+    m_metrics["start_timestamp"] = time.time()
+    args = get_args_parser().parse_args()
+    init_settings(args)
+    source_files = get_source_files(args.file)
+
+    for source_file in source_files:
+        print ("Source file: %s" % source_file)
+    print ("Output folder: %s" % m_output_folder)
+    print ("Cache folder: %s" % m_cache_folder)
+    print ("Cache backend: %s" % m_cache_backend)
+    print ("API: %s" % m_api)
+    print ("Engine: %s" % m_engine)
+
+    load_author_mappings()
+
+    state = init_state(source_files)
+    if len(state["to_process"]) == 0:
+        print("No repository to process")
+        exit(1)
+
+    print("Nb repos to process: %d\n" % len(state["to_process"]))
+
+    if args.webhook_port:
+        serve_webhooks(state["to_process"], args.webhook_port)
+        write_metrics()
+        print ('\nDone.')
+        exit(0)
+
+    try:
+        if refresh_state(state, args) == None:
+            exit(1)
+
+        for source in state["sources"]:
+            # Merge and populate totals once all repos have been processed.
+            start = time.time()
+            result = populate_all_totals(merge_runs(source["runs"]))
+            add_metric(("phases", "post_processing"), time.time() - start)
+            write_outputs(result, args, source["source_file"], source["repos_html"], source["commits_url_patterns"], m_now)
+
+        write_metrics()
+
+        if args.watch:
+            watch(state, args)
+    finally:
+        shutdown_git_process_pool()
+
+    print ('\nDone.')
+    # Everything went fine.
+    exit(0)
+
+#######################################################################
+# Entry point.
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+import http.server
+import importlib
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import benchmark
+import grevos as grevos_module
+
+@pytest.fixture
+def grevos():
+    """grevos with all its settings (m_* variables) back to their default values.
+    """
+    return importlib.reload(grevos_module)
+
+@pytest.fixture
+def mock_github():
+    """Runs the mock GitHub API of the benchmark (see benchmark.MockGitHubHandler) and returns its port.
+    """
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), benchmark.MockGitHubHandler)
+    server.daemon_threads = True
+    server.nb_authors = 7
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server.server_address[1]
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def mock_row(mock_github):
+    """Returns a function returning the source file row (list of fields) of a synthetic repo of the mock
+    GitHub API given its name and since date.
+    """
+    def row(repo, since=""):
+        return ["http://", "127.0.0.1:%d" % mock_github, "", benchmark.m_owner, repo, benchmark.m_branch, "", since, "token"]
+    return row
+
+@pytest.fixture
+def run_settings(grevos, tmp_path):
+    """Returns a function setting grevos up for a run and returning its parsed arguments.
+
+    The rows (lists of fields) are written to the source file of the run, then init_settings(args)
+    is called with the source file, a new cache folder, the output folder and the extra command line
+    arguments. Every run gets its own folder (tmp_path/name).
+    """
+    def settings(rows, *extra_args, name="run"):
+        folder = tmp_path / name
+        (folder / "cache").mkdir(parents=True)
+        (folder / "output").mkdir()
+        source_file = folder / "repos.csv"
+        source_file.write_text("".join("%s\n" % ",".join(row) for row in rows))
+        args = grevos.get_args_parser().parse_args(["-f", str(source_file), "-c", str(folder / "cache"), "-o", str(folder / "output")] + list(extra_args))
+        grevos.init_settings(args)
+        return args
+    return settings
@@ -0,0 +1,29 @@
+SHARED = "repo0-50"
+
+def write_source_file(path, rows):
+    path.write_text("".join("%s\n" % ",".join(row) for row in rows))
+    return str(path)
+
+def test_shared_repo_fetched_once(grevos, run_settings, mock_row, tmp_path, monkeypatch):
+    args = run_settings([])
+    folder = tmp_path / "sources"
+    folder.mkdir()
+    a = write_source_file(folder / "a.csv", [mock_row(SHARED), mock_row("repo1-20")])
+    write_source_file(folder / "b.csv", [mock_row("repo2-30"), mock_row(SHARED)])
+    (folder / "notes.txt").write_text("not a source file\n")
+    # Given both directly and through its folder: processed once.
+    args.file = grevos.get_source_files([a, str(folder)])
+    assert args.file == [a, str(folder / "b.csv")]
+    fetched = []
+    get_rep_stats = grevos.get_rep_stats
+    def get_rep_stats_counted(*args, **kwargs):
+        fetched.append(args[4])
+        return get_rep_stats(*args, **kwargs)
+    monkeypatch.setattr(grevos, "get_rep_stats", get_rep_stats_counted)
+    state = grevos.init_state(args.file)
+    assert grevos.refresh_state(state, args) == 100
+    assert sorted(fetched) == sorted([SHARED, "repo1-20", "repo2-30"])
+    # Every source file gets the commits of its own repos.
+    for (source, nb_commits) in zip(state["sources"], [70, 80]):
+        r = grevos.populate_all_totals(grevos.merge_runs(source["runs"]))
+        assert sum(len(x) for x in r.values()) == nb_commits
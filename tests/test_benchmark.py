@@ -0,0 +1,72 @@
+import socket
+
+import pytest
+import requests
+
+import benchmark
+
+REPO = "repo0-250"
+
+def get_url(port, path):
+    return "http://127.0.0.1:%d%s" % (port, path)
+
+def list_commits_rest(port, since=None):
+    """Returns the SHAs listed by the REST API of the mock server, following the Link headers.
+    """
+    url = get_url(port, "/repos/%s/%s/commits?sha=%s&per_page=100" % (benchmark.m_owner, REPO, benchmark.m_branch))
+    if since:
+        url = "%s&since=%s" % (url, since)
+    shas = []
+    while url:
+        reply = requests.get(url)
+        assert reply.status_code == 200
+        shas.extend(commit["sha"] for commit in reply.json())
+        url = reply.links.get("next", {}).get("url")
+    return shas
+
+def list_commits_graphql(port, since=None):
+    """Returns the SHAs listed by the GraphQL API of the mock server, following the cursors.
+    """
+    shas = []
+    cursor = None
+    while True:
+        variables = {"owner": benchmark.m_owner, "repo": REPO, "branch": benchmark.m_branch, "since": since, "cursor": cursor, "pageSize": 100}
+        history = requests.post(get_url(port, "/graphql"), json={"query": "", "variables": variables}).json()["data"]["repository"]["object"]["history"]
+        shas.extend(node["oid"] for node in history["nodes"])
+        if not history["pageInfo"]["hasNextPage"]:
+            return shas
+        cursor = history["pageInfo"]["endCursor"]
+
+@pytest.mark.parametrize("since", [None, "2017-06-01T00:00:00Z"])
+def test_rest_and_graphql_list_the_same_commits(mock_github, since):
+    first_index = benchmark.get_first_index_since(since, 250) if since else 0
+    expected = [benchmark.get_synthetic_commit(REPO, i, 7)["sha"] for i in range(249, first_index - 1, -1)]
+    assert list_commits_rest(mock_github, since) == expected
+    assert list_commits_graphql(mock_github, since) == expected
+
+def test_commit_details_do_not_need_the_listing(mock_github):
+    # The index of the commit is in its SHA: details are served without listing the commits first.
+    commit = benchmark.get_synthetic_commit(REPO, 42, 7)
+    assert benchmark.get_index_commit(commit["sha"]) == 42
+    reply = requests.get(get_url(mock_github, "/repos/%s/%s/commits/%s" % (benchmark.m_owner, REPO, commit["sha"])))
+    assert reply.status_code == 200
+    assert reply.json()["stats"] == {"additions": commit["additions"], "deletions": commit["deletions"], "total": commit["additions"] + commit["deletions"]}
+    # Same index, but not a commit of the repo.
+    other = benchmark.get_synthetic_commit("repo1-250", 42, 7)
+    assert requests.get(get_url(mock_github, "/repos/%s/%s/commits/%s" % (benchmark.m_owner, REPO, other["sha"]))).status_code == 404
+
+class Process:
+    def __init__(self, alive):
+        self.alive = alive
+
+    def is_alive(self):
+        return self.alive
+
+def test_wait_for_mock_github(mock_github):
+    benchmark.wait_for_mock_github(Process(True), mock_github)
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    # Server process died: no need to wait until the timeout.
+    with pytest.raises(SystemExit):
+        benchmark.wait_for_mock_github(Process(False), port)
@@ -0,0 +1,205 @@
+import json
+import os
+
+import pytest
+
+import benchmark
+
+REPO = "repo0-50"
+URL = "http://127.0.0.1/repos/bench/repo0-50/commits?sha=main"
+
+@pytest.fixture
+def columnar(grevos, run_settings):
+    """Sets up the columnar backend and caches a synthetic repo. Returns the cached result dict.
+    """
+    run_settings([], "-cb", "columnar")
+    r = benchmark.get_synthetic_rep_stats(REPO, 7)
+    grevos.cache(URL, r, [x for v in r.values() for x in v])
+    return r
+
+def to_json(r):
+    return {k: [dict(x) for x in v] for k, v in r.items()}
+
+def test_columnar_cache_loads_commit_records(grevos, columnar):
+    (d, highest_date, sha, nb_commits) = grevos.get_cache(URL)
+    assert all(isinstance(x, grevos.Commit) for v in d.values() for x in v)
+    assert to_json(d) == columnar
+    assert (highest_date, sha, nb_commits) == grevos.get_highest_commit(columnar)
+    assert grevos.get_shas(d) == grevos.get_shas(columnar)
+    # Same records as the ones of the JSON objects, but copies: the post-processing updates them.
+    commits = grevos.to_commits(d)
+    expected = grevos.to_commits(columnar)
+    for k in expected.keys():
+        assert [(x.sha, x.date, x.author, x.author_name, x.author_email, x.owner, x.repo, x.branch, x.additions, x.deletions, x.total, x.difference) for x in commits[k]] == \
+               [(x.sha, x.date, x.author, x.author_name, x.author_email, x.owner, x.repo, x.branch, x.additions, x.deletions, x.total, x.difference) for x in expected[k]]
+        assert not any(x is y for (x, y) in zip(commits[k], d[k]))
+
+def test_columnar_manifest_is_the_header(grevos, columnar):
+    manifest = grevos.get_cache_manifest(URL)
+    assert (manifest["highest_date"], manifest["sha"], manifest["nb_commits"]) == grevos.get_highest_commit(columnar)
+    assert to_json(grevos.get_cache_body(URL, manifest)) == columnar
+    # Cache file replaced since the manifest was read.
+    r = {k: v[1:] for k, v in columnar.items()}
+    grevos.cache(URL, r, [])
+    cache_file = "%s.%s" % (grevos.get_cache_filename_with_path(URL), grevos.m_columnar_extension)
+    os.utime(cache_file, ns=(manifest["mtime_ns"] + 1, manifest["mtime_ns"] + 1))
+    assert grevos.get_cache_body(URL, manifest) == None
+    assert os.path.exists(cache_file)
+    assert to_json(grevos.get_cache_body(URL, grevos.get_cache_manifest(URL))) == r
+    # Corrupted cache file: ignored.
+    with open(cache_file, "r+b") as f:
+        f.truncate(os.path.getsize(cache_file) // 2)
+    manifest = grevos.get_cache_manifest(URL)
+    assert grevos.get_cache_body(URL, manifest) == None
+    assert not os.path.exists(cache_file)
+
+CRAWLED_REPO = "repo0-350"
+
+@pytest.fixture
+def sqlite(grevos, run_settings, mock_row):
+    """Sets up the SQLite backend with the 50 oldest commits of a synthetic repo of the mock GitHub API
+    in the cache. Returns the URL of the cache and a function crawling the repo.
+    """
+    return set_up_crawl(grevos, run_settings, mock_row, "sqlite")
+
+def set_up_crawl(grevos, run_settings, mock_row, cache_backend):
+    row = mock_row(CRAWLED_REPO)
+    run_settings([row], "-cb", cache_backend, "-cp", "1")
+    cache_url = grevos.get_rep_stats_cache_url(row[0], row[1], row[2], row[3], row[4], row[5], None)
+    shas = set(benchmark.get_synthetic_commit(CRAWLED_REPO, i, 7)["sha"] for i in range(50))
+    r = benchmark.get_synthetic_rep_stats(CRAWLED_REPO, 7)
+    r = {k: [x for x in v if x["sha"] in shas] for k, v in r.items()}
+    grevos.cache(cache_url, {k: v for k, v in r.items() if v}, [x for v in r.values() for x in v])
+    def crawl():
+        return grevos.get_rep_stats(row[0], row[1], row[2], row[3], row[4], row[5], None, row[8], 1, 1)
+    return (cache_url, crawl)
+
+def get_commits(r):
+    return sorted((dict(x) for author_data in r.values() for x in author_data), key=lambda x: x["sha"])
+
+def interrupt_after(grevos, monkeypatch, nb_pages):
+    """Makes the crawls with the REST API fail after nb_pages pages.
+    """
+    get_commits_rest = grevos.get_commits_rest
+    def get_commits_rest_interrupted(*args, **kwargs):
+        for (index_page, page) in enumerate(get_commits_rest(*args, **kwargs)):
+            if index_page == nb_pages:
+                raise RuntimeError("interrupted")
+            yield page
+    monkeypatch.setattr(grevos, "get_commits_rest", get_commits_rest_interrupted)
+
+def get_head(grevos, cache_url):
+    manifest = grevos.get_cache_manifest(cache_url)
+    return (manifest["highest_date"], manifest["sha"], manifest["nb_commits"])
+
+def resume(grevos, monkeypatch):
+    """Returns the list where the index of the first page of the next crawls with the REST API is added.
+    """
+    pages = []
+    get_commits_rest = grevos.get_commits_rest
+    monkeypatch.setattr(grevos, "get_commits_rest", lambda *args: pages.append(args[-1]) or get_commits_rest(*args))
+    return pages
+
+def test_json_checkpoint(grevos, run_settings, mock_row, monkeypatch):
+    (cache_url, crawl) = set_up_crawl(grevos, run_settings, mock_row, "json")
+    interrupt_after(grevos, monkeypatch, 2)
+    with pytest.raises(RuntimeError):
+        crawl()
+    assert len(get_commits(grevos.get_cache(cache_url)[0])) == 50
+    monkeypatch.undo()
+    pages = resume(grevos, monkeypatch)
+    assert get_commits(crawl()) == get_commits(benchmark.get_synthetic_rep_stats(CRAWLED_REPO, 7))
+    assert pages == [2]
+    assert not os.path.exists(grevos.get_checkpoint_filename_with_path(cache_url))
+
+def test_sqlite_saves_every_page(grevos, sqlite, monkeypatch):
+    (cache_url, crawl) = sqlite
+    before = get_head(grevos, cache_url)
+    interrupt_after(grevos, monkeypatch, 2)
+    with pytest.raises(RuntimeError):
+        crawl()
+    # The 2 pages are saved, but the cache is as before the crawl until it completes.
+    with grevos.m_sqlite_lock:
+        assert grevos.get_sqlite_connection().execute("SELECT COUNT(*) FROM commits").fetchone()[0] == 250
+    assert get_head(grevos, cache_url) == before
+    assert len(get_commits(grevos.get_cache(cache_url)[0])) == 50
+    # Resumed from the third page, with the 200 commits found so far.
+    monkeypatch.undo()
+    pages = resume(grevos, monkeypatch)
+    expected = get_commits(benchmark.get_synthetic_rep_stats(CRAWLED_REPO, 7))
+    assert get_commits(crawl()) == expected
+    assert pages == [2]
+    assert get_commits(grevos.get_cache(cache_url)[0]) == expected
+    assert get_head(grevos, cache_url) == grevos.get_highest_commit(benchmark.get_synthetic_rep_stats(CRAWLED_REPO, 7))
+    with grevos.m_sqlite_lock:
+        assert grevos.get_sqlite_connection().execute("SELECT COUNT(*) FROM crawls").fetchone()[0] == 0
+
+def test_sqlite_interrupted_crawl_not_matching_is_discarded(grevos, sqlite, monkeypatch):
+    (cache_url, crawl) = sqlite
+    interrupt_after(grevos, monkeypatch, 1)
+    with pytest.raises(RuntimeError):
+        crawl()
+    monkeypatch.undo()
+    grevos.m_api = "graphql"
+    assert grevos.get_checkpoint(cache_url, grevos.get_cache_manifest(cache_url)["highest_date"]) == None
+    assert len(get_commits(grevos.get_cache(cache_url)[0])) == 50
+    with grevos.m_sqlite_lock:
+        assert grevos.get_sqlite_connection().execute("SELECT COUNT(*) FROM commits").fetchone()[0] == 50
+        assert grevos.get_sqlite_connection().execute("SELECT COUNT(*) FROM stats").fetchone()[0] == 50
+    assert get_commits(crawl()) == get_commits(benchmark.get_synthetic_rep_stats(CRAWLED_REPO, 7))
+
+def test_sqlite_manifest_does_not_load_the_commits(grevos, sqlite, monkeypatch):
+    (cache_url, crawl) = sqlite
+    def get_sqlite_commits(*args):
+        raise AssertionError("commits loaded")
+    monkeypatch.setattr(grevos, "get_sqlite_commits", get_sqlite_commits)
+    manifest = grevos.get_cache_manifest(cache_url)
+    assert manifest["nb_commits"] == 50
+    assert manifest["sha"] == benchmark.get_synthetic_commit(CRAWLED_REPO, 49, 7)["sha"]
+
+def test_commit_details_shared_across_branches(grevos, run_settings, mock_row):
+    # The mock GitHub API ignores the branch: both branches have the same commits.
+    rows = [mock_row(REPO), mock_row(REPO)[:5] + ["dev"] + mock_row(REPO)[6:]]
+    run_settings(rows)
+    r = grevos.get_rep_stats(*rows[0][:6], None, rows[0][8], 1, 2)
+    assert grevos.m_metrics["http"]["requests"]["commit"]["200"] == 50
+    assert all(grevos.get_cached_commit_details(sha) != None for sha in grevos.get_shas(r))
+    r = grevos.get_rep_stats(*rows[1][:6], None, rows[1][8], 2, 2)
+    assert len(get_commits(r)) == 50
+    assert set(x["branch"] for x in get_commits(r)) == set(["dev"])
+    # Details found in the commits cache: only the list of commits is requested.
+    assert grevos.m_metrics["http"]["requests"]["commit"]["200"] == 50
+    assert grevos.m_metrics["http"]["requests"]["commits"]["200"] == 2
+
+def test_stale_json_manifest_rejected(grevos, run_settings):
+    run_settings([])
+    r = benchmark.get_synthetic_rep_stats(REPO, 7)
+    grevos.cache(URL, r, [])
+    cache_file = grevos.get_cache_filename_with_path(URL)
+    manifest_file = grevos.get_cache_manifest_filename_with_path(URL)
+    manifest = grevos.get_cache_manifest(URL)
+    assert (manifest["highest_date"], manifest["sha"], manifest["nb_commits"]) == grevos.get_highest_commit(r)
+    assert grevos.get_cache_body(URL, manifest) == r
+    # Cache file written by an older version (no manifest update): the cache file must be loaded.
+    other = {k: v[1:] for k, v in r.items()}
+    with open(cache_file, "w") as f:
+        json.dump(other, f)
+    assert grevos.get_cache_manifest(URL) == None
+    assert grevos.get_cache(URL)[0] == other
+    # Same size and modification time, but not the same content: rejected by the checksum.
+    grevos.cache(URL, r, [])
+    manifest = grevos.get_cache_manifest(URL)
+    with open(cache_file, "r+b") as f:
+        data = f.read()
+        f.seek(0)
+        f.write(data.replace(r[list(r.keys())[0]][0]["sha"].encode('utf-8'), b"0" * 40))
+    os.utime(cache_file, ns=(manifest["mtime_ns"], manifest["mtime_ns"]))
+    assert grevos.get_cache_manifest(URL) == manifest
+    assert grevos.get_cache_body(URL, manifest) == None
+    assert not os.path.exists(manifest_file)
+    # Manifest of another schema version.
+    grevos.cache(URL, r, [])
+    manifest = grevos.get_cache_manifest(URL)
+    with open(manifest_file, "w") as f:
+        json.dump(dict(manifest, schema_version=manifest["schema_version"] - 1), f)
+    assert grevos.get_cache_manifest(URL) == None
@@ -0,0 +1,33 @@
+import threading
+import time
+
+import benchmark
+
+REPOS = ["repo0-150", "repo1-150", "repo2-150", "repo3-150", "repo4-150"]
+
+def get_commits(r):
+    return sorted((dict(x) for author_data in r.values() for x in author_data), key=lambda x: x["sha"])
+
+def test_threaded_engine(grevos, run_settings, mock_row, monkeypatch):
+    args = run_settings([mock_row(repo) for repo in REPOS], "-e", "threaded", "-mc", "2")
+    # Number of repos processed at the same time.
+    running = [0, 0]
+    lock = threading.Lock()
+    process_repo = grevos.process_repo
+    def process_repo_counted(*args):
+        with lock:
+            running[0] = running[0] + 1
+            running[1] = max(running[1], running[0])
+        try:
+            time.sleep(0.05)
+            return process_repo(*args)
+        finally:
+            with lock:
+                running[0] = running[0] - 1
+    monkeypatch.setattr(grevos, "process_repo", process_repo_counted)
+    state = grevos.init_state(args.file)
+    assert grevos.refresh_state(state, args) != None
+    assert running[1] == 2
+    # Same order as the source file.
+    for (repo, r) in zip(REPOS, state["rep_stats"]):
+        assert get_commits(r) == get_commits(benchmark.get_synthetic_rep_stats(repo, 7))
@@ -0,0 +1,120 @@
+import concurrent.futures
+import os
+import subprocess
+
+import pytest
+
+WEIRD_FILENAME = 'we"ird\ttab.txt'
+RENAMED_FILENAME = 'ren é.txt'
+
+def git(repo, *args, date=None):
+    env = dict(os.environ, GIT_CONFIG_GLOBAL=os.devnull, GIT_CONFIG_NOSYSTEM="1",
+               GIT_AUTHOR_NAME="Jane Doe", GIT_AUTHOR_EMAIL="jane@example.com",
+               GIT_COMMITTER_NAME="Jane Doe", GIT_COMMITTER_EMAIL="jane@example.com")
+    if date:
+        env["GIT_AUTHOR_DATE"] = date
+        env["GIT_COMMITTER_DATE"] = date
+    return subprocess.run(["git", "-C", str(repo)] + list(args), check=True, stdout=subprocess.PIPE, env=env).stdout.decode('utf-8').strip()
+
+def commit(repo, message, date):
+    git(repo, "add", "-A")
+    git(repo, "commit", "-q", "-m", message, date=date)
+    return git(repo, "rev-parse", "HEAD")
+
+@pytest.fixture
+def repo(tmp_path):
+    """Builds a git repo (tmp_path/org/repo) and returns its path and the SHAs of its commits by name.
+    """
+    path = tmp_path / "org" / "repo"
+    path.mkdir(parents=True)
+    git(path, "init", "-q", "-b", "main")
+    shas = {}
+    (path / "a.txt").write_text("1\n2\n3\n")
+    (path / "bin.dat").write_bytes(b"\x00\x01\x02")
+    shas["initial"] = commit(path, "initial", "2020-01-01T00:00:00Z")
+    (path / "a.txt").write_text("1\ntwo\n3\n4\n")
+    shas["modify"] = commit(path, "modify", "2020-02-01T00:00:00Z")
+    git(path, "checkout", "-q", "-b", "side")
+    (path / "s.txt").write_text("s\ns\ns\ns\n")
+    shas["side"] = commit(path, "side", "2020-03-01T00:00:00Z")
+    git(path, "checkout", "-q", "main")
+    (path / "m.txt").write_text("m\n")
+    shas["main"] = commit(path, "main", "2020-04-01T00:00:00Z")
+    git(path, "merge", "-q", "--no-ff", "-m", "merge", "side", date="2020-05-01T00:00:00Z")
+    shas["merge"] = git(path, "rev-parse", "HEAD")
+    (path / WEIRD_FILENAME).write_text("w\nw\nw\nw\nw\n")
+    git(path, "mv", "m.txt", RENAMED_FILENAME)
+    shas["weird"] = commit(path, "weird", "2020-06-01T00:00:00Z")
+    return (path, shas)
+
+def test_git_log(grevos, repo):
+    (path, shas) = repo
+    commits = {x["sha"]: x for x in grevos.get_git_log(str(path), "main", None)}
+    assert [x["sha"] for x in grevos.get_git_log(str(path), "main", None)] == [shas[k] for k in ("weird", "merge", "main", "side", "modify", "initial")]
+    # Binary files are not counted.
+    assert commits[shas["initial"]]["stats"] == {"additions": 3, "deletions": 0, "total": 3, "difference": 3}
+    assert commits[shas["initial"]]["added_files"] == ["a.txt", "bin.dat"]
+    assert commits[shas["modify"]]["stats"] == {"additions": 2, "deletions": 1, "total": 3, "difference": 1}
+    assert commits[shas["modify"]]["added_files"] == []
+    # Merge commits are compared to their first parent.
+    assert commits[shas["merge"]]["stats"] == {"additions": 4, "deletions": 0, "total": 4, "difference": 4}
+    assert commits[shas["merge"]]["added_files"] == ["s.txt"]
+    # Paths git quotes even with core.quotePath=false, renames are not added files.
+    assert commits[shas["weird"]]["stats"] == {"additions": 5, "deletions": 0, "total": 5, "difference": 5}
+    assert commits[shas["weird"]]["added_files"] == [WEIRD_FILENAME]
+    assert commits[shas["weird"]]["date"] == "2020-06-01T00:00:00Z"
+    assert commits[shas["weird"]]["author_name"] == "Jane Doe"
+    assert commits[shas["weird"]]["author_email"] == "jane@example.com"
+
+def test_git_log_since(grevos, repo):
+    (path, shas) = repo
+    assert [x["sha"] for x in grevos.get_git_log(str(path), "main", "2020-03-15T00:00:00Z")] == [shas[k] for k in ("weird", "merge", "main")]
+
+def test_git_source_file(grevos, repo, tmp_path, run_settings):
+    (path, shas) = repo
+    args = run_settings([["git+file://", "", str(tmp_path), "org", "repo", "main", "", "2020-01-15T00:00:00Z", "", shas["modify"]]], "-i", WEIRD_FILENAME)
+    state = grevos.init_state(args.file)
+    try:
+        assert grevos.refresh_state(state, args) != None
+    finally:
+        grevos.shutdown_git_process_pool()
+    result = grevos.populate_all_totals(grevos.merge_runs(state["sources"][0]["runs"]))
+    commits = [x for author_data in result.values() for x in author_data]
+    # Before since: initial, in commits_to_ignore: modify, adds an ignored file: weird.
+    assert sorted(x.sha for x in commits) == sorted(shas[k] for k in ("side", "main", "merge"))
+    assert sum(x.additions for x in commits) == 9
+    assert sum(x.deletions for x in commits) == 0
+
+class Pool:
+    """Runs the jobs in the current process, recording when they are submitted and collected.
+    """
+    def __init__(self, events):
+        self.events = events
+
+    def submit(self, fn, mirror_path, branch, since):
+        self.events.append(("submit", branch))
+        future = concurrent.futures.Future()
+        future.set_result(fn(mirror_path, branch, since))
+        result = future.result
+        def collect(*args):
+            self.events.append(("collect", branch))
+            return result(*args)
+        future.result = collect
+        return future
+
+def test_git_logs_submitted_upfront(grevos, repo, tmp_path, run_settings, monkeypatch):
+    (path, shas) = repo
+    args = run_settings([["git+file://", "", str(tmp_path), "org", "repo", branch, "", "", ""] for branch in ("main", "side")])
+    events = []
+    monkeypatch.setattr(grevos, "get_git_process_pool", lambda: Pool(events))
+    state = grevos.init_state(args.file)
+    assert grevos.refresh_state(state, args) != None
+    assert events == [("submit", "main"), ("submit", "side"), ("collect", "main"), ("collect", "side")]
+    assert sorted(x["sha"] for v in state["rep_stats"][1].values() for x in v) == sorted(shas[k] for k in ("initial", "modify", "side"))
+    # Next refresh: the jobs look for commits more recent than the ones found so far.
+    del events[:]
+    (path / "n.txt").write_text("n\n")
+    new_sha = commit(path, "new", "2020-07-01T00:00:00Z")
+    assert grevos.refresh_state(state, args) == 1
+    assert events == [("submit", "main"), ("submit", "side"), ("collect", "main"), ("collect", "side")]
+    assert new_sha in [x["sha"] for v in state["rep_stats"][0].values() for x in v]
@@ -0,0 +1,41 @@
+import importlib
+import json
+
+import pytest
+
+import benchmark
+
+def fetch(grevos, run_settings, mock_row, api, since):
+    """Crawls a synthetic repo of the mock GitHub API with the given API and returns its cache.
+    """
+    importlib.reload(grevos)
+    row = mock_row("repo0-250", since or "")
+    run_settings([row], "-api", api, name=api)
+    assert grevos.get_rep_stats(row[0], row[1], row[2], row[3], row[4], row[5], since, row[8], 1, 1) != None
+    return grevos.get_cache(grevos.get_rep_stats_cache_url(row[0], row[1], row[2], row[3], row[4], row[5], since))[0]
+
+@pytest.mark.parametrize("since", [None, "2017-06-01T00:00:00Z"])
+def test_rest_and_graphql_caches_are_identical(grevos, run_settings, mock_row, since):
+    rest = fetch(grevos, run_settings, mock_row, "rest", since)
+    graphql = fetch(grevos, run_settings, mock_row, "graphql", since)
+    assert sum(len(x) for x in rest.values()) == (250 if not since else 250 - benchmark.get_first_index_since(since, 250))
+    assert graphql == rest
+
+class Reply:
+    def __init__(self, the_json):
+        self.status_code = 200
+        self.content = json.dumps(the_json).encode('utf-8')
+
+def test_graphql_skips_commits_without_date(grevos, monkeypatch):
+    nodes = [{"oid": "a" * 40, "additions": 3, "deletions": 1, "author": {"name": "A", "email": "a@example.com", "date": "2020-01-02T03:04:05+02:00", "user": {"login": "a"}}},
+             {"oid": "b" * 40, "additions": 5, "deletions": 2, "author": {"name": "B", "email": "b@example.com", "date": None, "user": None}},
+             {"oid": "c" * 40, "additions": 1, "deletions": 0, "author": None}]
+    history = {"totalCount": 3, "pageInfo": {"hasNextPage": False, "endCursor": None}, "nodes": nodes}
+    monkeypatch.setattr(grevos, "http_post", lambda url, git_token, the_json: Reply({"data": {"repository": {"object": {"history": history}}}}))
+    pages = list(grevos.get_commits_graphql("https://", "api.github.com", "", "org", "repo", "main", None, "token"))
+    assert len(pages) == 1
+    (page, cursor) = pages[0]
+    assert cursor == None
+    assert [commit["sha"] for commit in page] == ["a" * 40]
+    assert page[0]["details"] == {"stats": {"additions": 3, "deletions": 1, "total": 4, "difference": 2}, "date": "2020-01-02T01:04:05Z"}
+    assert grevos.m_metrics["commits_dropped"]["no_date"] == 2
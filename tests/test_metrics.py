@@ -0,0 +1,41 @@
+import json
+
+import pytest
+
+ROW = ["https://", "api.github.com", "", "org", "repo", "main", "", "", "token"]
+
+def get_page_commit(sha, details):
+    return {"sha": sha, "author": "jdoe", "author_email": "jdoe@example.com", "author_name": "John Doe", "details": details}
+
+def test_progress_before_any_commit_kept(grevos, run_settings, monkeypatch, capsys):
+    run_settings([ROW])
+    monkeypatch.setattr(grevos, "m_progress_interval", 0)
+    # First commit ignored (see --ignore_files), second one kept.
+    page = [get_page_commit("a" * 40, {}),
+            get_page_commit("b" * 40, {"date": "2020-01-02T03:04:05Z", "stats": {"additions": 2, "deletions": 1, "total": 3, "difference": 1}})]
+    monkeypatch.setattr(grevos, "get_commits_rest", lambda *args: iter([(page, None)]))
+    r = grevos.get_rep_stats(*ROW[:6], None, ROW[8], 1, 1)
+    assert [x["sha"] for x in r["jdoe"]] == ["b" * 40]
+    out = capsys.readouterr().out
+    assert "Nb commits processed so far: 1\n" in out
+    assert "Nb commits processed so far: 2 (latest date: 01/02/2020 03:04:05)" in out
+
+def test_repo_metrics_per_since(grevos, run_settings, monkeypatch, tmp_path):
+    since = "2020-01-01T00:00:00Z"
+    args = run_settings([ROW, ROW[:7] + [since] + ROW[8:]], "-mf", str(tmp_path / "metrics.json"), "-pf", str(tmp_path / "metrics.prom"))
+    page = [get_page_commit("b" * 40, {"date": "2020-01-02T03:04:05Z", "stats": {"additions": 2, "deletions": 1, "total": 3, "difference": 1}})]
+    monkeypatch.setattr(grevos, "get_commits_rest", lambda *args: iter([(page, None)]))
+    grevos.m_metrics["start_timestamp"] = 0
+    rows = grevos.init_state(args.file)["to_process"]
+    for (index_repo, row) in enumerate(rows):
+        grevos.process_repo(row, index_repo + 1, len(rows), None)
+    grevos.write_metrics()
+    # Same branch, but not the same since date: not the same repo.
+    repos = [grevos.get_rep_stats_cache_url(*ROW[:6], ""), grevos.get_rep_stats_cache_url(*ROW[:6], since)]
+    metrics = json.loads((tmp_path / "metrics.json").read_text())
+    assert sorted(metrics["repos"].keys()) == sorted(repos)
+    assert all(metrics["repos"][repo]["commits"] == 1 for repo in repos)
+    prometheus = (tmp_path / "metrics.prom").read_text()
+    for repo in repos:
+        assert 'grevos_repo_commits{repository="%s"} 1\n' % repo in prometheus
+    assert "# TYPE grevos_repo_seconds gauge\n" in prometheus
@@ -0,0 +1,71 @@
+import csv
+
+import pytest
+
+REPO = "repo0-50"
+FIELDS = ["commits", "additions", "deletions", "difference", "total"]
+
+def write_csv(grevos, args):
+    """Fetches the repos of the source file of args, generates the outputs and returns the rows of the CSV.
+    """
+    state = grevos.init_state(args.file)
+    assert grevos.refresh_state(state, args) != None
+    source = state["sources"][0]
+    grevos.write_outputs(grevos.populate_all_totals(grevos.merge_runs(source["runs"])), args, source["source_file"], source["repos_html"], source["commits_url_patterns"], grevos.m_now)
+    with open(grevos.get_csv_output_filename_with_path(source["source_file"]), newline='') as f:
+        return list(csv.reader(f, delimiter=',', quotechar='|'))
+
+def test_long_csv(grevos, run_settings, mock_row):
+    row = mock_row(REPO)
+    row[6] = "https://example.com/{{owner}}/{{repository}}/commit/{{commit_sha}}"
+    wide = write_csv(grevos, run_settings([row], name="wide"))
+    rows = write_csv(grevos, run_settings([row], "-cl", "long", name="long"))
+    assert rows[0] == ["Date", "Author", "Repository", "Commit SHA", "Commit URL"] + \
+                     ["Commit (%s)" % f for f in FIELDS[1:]] + ["Author (%s)" % f for f in FIELDS] + ["TOTAL (%s)" % f for f in FIELDS]
+    rows = rows[1:]
+    assert len(rows) == 50
+    # Same commits, dates and running totals of TOTAL as the wide layout, in the same order.
+    assert [(x[0], x[3], x[-5:]) for x in rows] == [(x[0], x[-2], x[-8:-3]) for x in wide[1:]]
+    assert [x[4] for x in rows] == ["https://example.com/bench/%s/commit/%s" % (REPO, x[3]) for x in rows]
+    assert set(x[2] for x in rows) == set(["bench/%s (main)" % REPO])
+    # The totals of an author are the running sums of the stats of its commits.
+    totals = {}
+    for x in rows:
+        (additions, deletions, difference, total) = [int(v) for v in x[5:9]]
+        t = totals.setdefault(x[1], [0, 0, 0, 0, 0])
+        for (i, v) in enumerate([1, additions, deletions, difference, total]):
+            t[i] = t[i] + v
+        assert [int(v) for v in x[9:14]] == t
+    assert sum(t[0] for t in totals.values()) == int(rows[-1][-5])
+
+@pytest.mark.parametrize("nb_points, max_points", [(1000, 20), (1000, 3), (101, 100), (7, 5)])
+def test_lttb_keeps_the_ends_within_the_budget(grevos, nb_points, max_points):
+    x = list(range(nb_points))
+    y = [(i * 7919) % 101 for i in x]
+    points = grevos.get_lttb_points(x, y, max_points)
+    assert len(points) == max_points
+    assert points[0] == 0 and points[-1] == nb_points - 1
+    assert points == sorted(set(points))
+
+def test_lttb_keeps_peaks(grevos):
+    x = list(range(1000))
+    y = [0] * 1000
+    y[37] = 1000
+    y[700] = -1000
+    points = grevos.get_lttb_points(x, y, 20)
+    assert 37 in points and 700 in points
+    # Nothing to downsample.
+    assert grevos.get_lttb_points(x[:20], y[:20], 20) == list(range(20))
+    assert grevos.get_lttb_points(x, y, 2) == [0, 999]
+
+def test_points_budgets(grevos):
+    html_data = {}
+    for (author, nb_points) in [("a", 2), ("b", 10), ("c", 1000), ("d", 5000)]:
+        html_data = grevos.init_html_data(html_data, "additions", "Additions", author)
+        for i in range(nb_points):
+            html_data = grevos.populate_html_data(html_data, i, "additions", author, i, 1)
+    budgets = grevos.get_points_budgets(html_data, 100)
+    # What the small series do not use is shared between the big ones.
+    assert budgets == {"a": 2, "b": 10, "c": 44, "d": 44}
+    # Not enough points for all the series: every series still gets a few.
+    assert grevos.get_points_budgets(html_data, 4) == {"a": 2, "b": grevos.m_min_points_per_series, "c": grevos.m_min_points_per_series, "d": grevos.m_min_points_per_series}
@@ -0,0 +1,88 @@
+import calendar
+import time
+
+import pytest
+
+import benchmark
+
+REPO = "repo0-50"
+
+def run(grevos, args):
+    """Fetches the repos of the source file of args and returns the merged result (see merge_runs(runs)).
+    """
+    state = grevos.init_state(args.file)
+    assert grevos.refresh_state(state, args) != None
+    return grevos.populate_all_totals(grevos.merge_runs(state["sources"][0]["runs"]))
+
+def get_shas(r):
+    return [x.sha for author_data in r.values() for x in author_data]
+
+def test_duplicate_commits_dropped(grevos, run_settings, mock_row):
+    # The mock GitHub API ignores the branch: both branches have the same commits.
+    rows = [mock_row(REPO), mock_row(REPO)[:5] + ["dev"] + mock_row(REPO)[6:]]
+    r = run(grevos, run_settings(rows))
+    shas = get_shas(r)
+    assert sorted(shas) == sorted(benchmark.get_synthetic_commit(REPO, i, 7)["sha"] for i in range(50))
+    # Taken into account for the first branch of the source file.
+    assert set(x.branch for author_data in r.values() for x in author_data) == set(["main"])
+    assert grevos.m_metrics["commits_dropped"]["duplicate"] == 50
+    # Counted twice if not deduplicated.
+    r = run(grevos, run_settings(rows, "-dc", "no", name="no_dedupe"))
+    assert sorted(get_shas(r)) == sorted(shas + shas)
+
+def get_page_commit(commit):
+    return {"sha": commit["sha"], "author": commit["login"], "author_email": commit["email"], "author_name": commit["name"],
+            "details": {"date": commit["date"], "stats": {"additions": 1, "deletions": 0, "total": 1, "difference": 1}}}
+
+def test_commits_older_than_the_cache_checked_against_its_shas(grevos, run_settings, mock_row, monkeypatch):
+    row = mock_row(REPO)
+    run_settings([row])
+    cache_url = grevos.get_rep_stats_cache_url(*row[:6], None)
+    r = benchmark.get_synthetic_rep_stats(REPO, 7)
+    grevos.cache(cache_url, r, [x for v in r.values() for x in v])
+    # Listed again although older than the most recent commit of the cache (non-chronological history).
+    cached = benchmark.get_synthetic_commit(REPO, 10, 7)
+    not_cached = dict(benchmark.get_synthetic_commit("repo1-50", 10, 7), login=cached["login"])
+    page = [get_page_commit(cached), get_page_commit(not_cached)]
+    monkeypatch.setattr(grevos, "get_commits_rest", lambda *args: iter([(page, None)]))
+    r = grevos.get_rep_stats(*row[:6], None, row[8], 1, 1)
+    shas = [x["sha"] for author_data in r.values() for x in author_data]
+    assert len(shas) == 51
+    assert shas.count(cached["sha"]) == 1
+    assert not_cached["sha"] in shas
+
+def epoch(s):
+    return int(calendar.timegm(time.strptime(s, "%Y-%m-%dT%H:%M:%SZ")))
+
+@pytest.mark.parametrize("bucket, date, expected", [
+    ("day", "2024-02-29T23:59:59Z", "2024-02-29T00:00:00Z"),
+    ("day", "2024-03-01T00:00:00Z", "2024-03-01T00:00:00Z"),
+    # 01/01/2023 is a Sunday, the week starts on Monday.
+    ("week", "2023-01-01T23:59:59Z", "2022-12-26T00:00:00Z"),
+    ("week", "2023-01-02T00:00:00Z", "2023-01-02T00:00:00Z"),
+    ("week", "1970-01-01T00:00:00Z", "1969-12-29T00:00:00Z"),
+    ("month", "2024-02-29T23:59:59Z", "2024-02-01T00:00:00Z"),
+    ("month", "2024-03-01T00:00:00Z", "2024-03-01T00:00:00Z"),
+    ("month", "2023-12-31T23:59:59Z", "2023-12-01T00:00:00Z"),
+])
+def test_bucket_start(grevos, bucket, date, expected):
+    assert grevos.get_bucket_start(epoch(date), bucket) == epoch(expected)
+
+def get_commit(grevos, sha, date, additions, deletions):
+    return grevos.Commit({"sha": sha, "date_unix": epoch(date) * 1000, "author": "jdoe", "owner": "org", "repo": "repo", "branch": "main",
+                          "stats": {"additions": additions, "deletions": deletions, "total": additions + deletions, "difference": additions - deletions}})
+
+def test_week_buckets(grevos):
+    commits = [get_commit(grevos, "a", "2023-01-01T10:00:00Z", 1, 0),
+               get_commit(grevos, "b", "2023-01-02T00:00:00Z", 2, 1),
+               get_commit(grevos, "c", "2023-01-08T23:59:59Z", 3, 0),
+               get_commit(grevos, "d", "2023-01-09T00:00:00Z", 4, 4)]
+    r = grevos.bucket_results({"OTHERS": commits}, "week")
+    assert [(x.date, x.author, x.sha, x.nb_commits, x.additions, x.deletions, x.difference, x.total) for x in r["OTHERS"]] == [
+        (epoch("2022-12-26T00:00:00Z"), "OTHERS", "a", 1, 1, 0, 1, 1),
+        (epoch("2023-01-02T00:00:00Z"), "OTHERS", "c", 2, 5, 1, 4, 6),
+        (epoch("2023-01-09T00:00:00Z"), "OTHERS", "d", 1, 4, 4, 0, 8)]
+    assert [(x.total_nb_commits, x.total_additions) for x in r["OTHERS"]] == [(1, 1), (3, 6), (4, 10)]
+    # The records of the result dict are left untouched.
+    assert [(x.date, x.sha, x.nb_commits) for x in commits] == [(epoch("2023-01-01T10:00:00Z"), "a", 1), (epoch("2023-01-02T00:00:00Z"), "b", 1),
+                                                                 (epoch("2023-01-08T23:59:59Z"), "c", 1), (epoch("2023-01-09T00:00:00Z"), "d", 1)]
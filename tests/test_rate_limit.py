@@ -0,0 +1,77 @@
+import http.server
+import json
+import threading
+
+import pytest
+
+NOW = 1700000000
+
+class ScriptedHandler(http.server.BaseHTTPRequestHandler):
+    """Replies with the next (status code, headers) of the script of the server and records the token
+    of every request.
+    """
+    def do_GET(self):
+        self.server.tokens.append(self.headers["Authorization"][len("token "):])
+        (status_code, headers) = self.server.script.pop(0)
+        data = json.dumps({"message": "API rate limit exceeded"} if status_code != 200 else {}).encode('utf-8')
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in headers.items():
+            self.send_header(k, str(v))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def github(grevos, monkeypatch):
+    """Runs a server replying as scripted (see ScriptedHandler) and makes the clock only move when
+    grevos waits. Returns the server, the URL to request and the list of the waits.
+    """
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), ScriptedHandler)
+    server.daemon_threads = True
+    server.script = []
+    server.tokens = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    waits = []
+    monkeypatch.setattr(grevos.time, "time", lambda: NOW + sum(waits))
+    monkeypatch.setattr(grevos.time, "sleep", waits.append)
+    yield (server, "http://127.0.0.1:%d/repos/org/repo/commits" % server.server_address[1], waits)
+    monkeypatch.undo()
+    server.shutdown()
+    server.server_close()
+
+def rate_limit(remaining, reset_in):
+    return {"X-RateLimit-Limit": 5000, "X-RateLimit-Remaining": remaining, "X-RateLimit-Reset": NOW + reset_in}
+
+def test_waits_until_the_reset(grevos, github):
+    (server, url, waits) = github
+    server.script = [(403, rate_limit(0, 100)), (200, rate_limit(4999, 3700))]
+    assert grevos.http_get(url, "t1").status_code == 200
+    assert server.tokens == ["t1", "t1"]
+    assert waits == [101]
+
+def test_retry_after(grevos, github):
+    (server, url, waits) = github
+    # Primary rate limit, then secondary rate limit once reset.
+    server.script = [(403, rate_limit(0, 100)), (429, {"Retry-After": 5}), (200, rate_limit(4999, 3700))]
+    assert grevos.http_get(url, "t1").status_code == 200
+    assert server.tokens == ["t1", "t1", "t1"]
+    assert waits == [101, 6]
+
+def test_token_pool_rotation(grevos, github):
+    (server, url, waits) = github
+    grevos.m_pool_tokens = True
+    grevos.m_host_tokens[url.split("/")[2]] = ["t1", "t2"]
+    server.script = [(403, rate_limit(0, 100)), (200, rate_limit(1, 3600)), (200, rate_limit(0, 3600)), (200, rate_limit(4999, 3700))]
+    # Exhausted token: the other one is used right away.
+    assert grevos.http_get(url, "t1").status_code == 200
+    assert grevos.http_get(url, "t1").status_code == 200
+    assert waits == []
+    # Both exhausted: waits for the first reset.
+    assert grevos.http_get(url, "t1").status_code == 200
+    assert server.tokens == ["t1", "t2", "t2", "t1"]
+    assert waits == [101]
@@ -0,0 +1,39 @@
+ROW = ["https://", "api.github.com", "", "org", "repo", "main", "", "", "token"]
+
+def get_page_commit(sha, author, date, additions):
+    return {"sha": sha, "author": author, "author_email": "%s@example.com" % author, "author_name": author,
+            "details": {"date": date, "stats": {"additions": additions, "deletions": 0, "total": additions, "difference": additions}}}
+
+def test_refresh_applies_only_new_commits(grevos, run_settings, monkeypatch):
+    args = run_settings([ROW, ROW[:4] + ["other"] + ROW[5:]])
+    pages = {"repo": [get_page_commit("b" * 40, "jdoe", "2020-01-02T00:00:00Z", 2), get_page_commit("a" * 40, "jane", "2020-01-01T00:00:00Z", 1)],
+             "other": [get_page_commit("c" * 40, "jdoe", "2020-01-01T12:00:00Z", 4)]}
+    fetches = []
+    def get_commits_rest(scheme, host, base_path, owner, repo, branch, since, *args):
+        fetches.append((repo, since))
+        return iter([(pages[repo], None)])
+    monkeypatch.setattr(grevos, "get_commits_rest", get_commits_rest)
+    state = grevos.init_state(args.file)
+    assert grevos.refresh_state(state, args) == 3
+    # Next refreshes: the commits found so far are in memory, the cache is not read again.
+    def get_cache(*args):
+        raise AssertionError("cache read")
+    monkeypatch.setattr(grevos, "get_cache", get_cache)
+    monkeypatch.setattr(grevos, "get_cache_manifest", get_cache)
+    add_to_runs = grevos.add_to_runs
+    added = []
+    monkeypatch.setattr(grevos, "add_to_runs", lambda runs, r, *args: added.extend(x.sha for v in r.values() for x in v) or add_to_runs(runs, r, *args))
+    del fetches[:]
+    pages = {"repo": [get_page_commit("d" * 40, "jane", "2020-01-03T00:00:00Z", 8)], "other": []}
+    assert grevos.refresh_state(state, args) == 1
+    # Only for commits more recent than the ones found so far.
+    assert fetches == [("repo", "2020-01-02T00:00:00Z"), ("other", "2020-01-01T12:00:00Z")]
+    assert added == ["d" * 40]
+    assert state["sources"][0]["nb_new_commits"] == 1
+    r = grevos.populate_all_totals(grevos.merge_runs(state["sources"][0]["runs"]))
+    assert [(x.sha, x.total_nb_commits, x.total_additions) for x in r["jane"]] == [("a" * 40, 1, 1), ("d" * 40, 2, 9)]
+    assert [(x.sha, x.total_nb_commits, x.total_additions) for x in r["jdoe"]] == [("c" * 40, 1, 4), ("b" * 40, 2, 6)]
+    # Nothing new.
+    pages = {"repo": [], "other": []}
+    assert grevos.refresh_state(state, args) == 0
+    assert state["sources"][0]["nb_new_commits"] == 0
@@ -0,0 +1,163 @@
+import http.server
+import json
+import os
+import queue
+import socket
+import threading
+
+import pytest
+
+import benchmark
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "push.json")
+REPO = "repo0-10"
+
+def load_payload():
+    with open(FIXTURE) as f:
+        return json.load(f)
+
+def get_commits(r):
+    return sorted((x for author_data in r.values() for x in author_data), key=lambda x: x["sha"])
+
+@pytest.fixture
+def settings(grevos, run_settings, mock_row):
+    """Crawls the synthetic repo of the push fixture, then removes its last commits from the cache as if
+    the cache was built before the push. Returns the rows to process, the URL of the cache and the
+    commits of the complete crawl.
+    """
+    row = mock_row(REPO)
+    args = run_settings([row], "-co", "yes")
+    to_process = grevos.init_state(args.file)["to_process"]
+    cache_url = grevos.get_rep_stats_cache_url(row[0], row[1], row[2], row[3], row[4], row[5], None)
+    crawled = get_commits(grevos.get_rep_stats(row[0], row[1], row[2], row[3], row[4], row[5], None, row[8], 1, 1))
+    set_cache(grevos, cache_url, 8)
+    return (to_process, cache_url, crawled)
+
+def set_cache(grevos, cache_url, nb_commits):
+    """Sets the cache to the nb_commits oldest commits of the synthetic repo.
+    """
+    r = benchmark.get_synthetic_rep_stats(REPO, 7)
+    shas = set(benchmark.get_synthetic_commit(REPO, i, 7)["sha"] for i in range(nb_commits))
+    r = {k: [x for x in v if x["sha"] in shas] for k, v in r.items()}
+    r = {k: v for k, v in r.items() if v}
+    grevos.cache(cache_url, r, [x for v in r.values() for x in v])
+
+def crawl(grevos, to_process):
+    row = to_process[0]
+    return get_commits(grevos.get_rep_stats(row[0], row[1], row[2], row[3], row[4], row[5], None, row[8], 1, 1))
+
+def test_push_is_added_to_the_cache(grevos, settings):
+    (to_process, cache_url, crawled) = settings
+    assert grevos.add_pushed_commits(load_payload(), to_process) == 2
+    assert get_commits(grevos.get_cache(cache_url)[0]) == crawled
+    assert not grevos.is_cache_stale(cache_url)
+    # Same delivery received again.
+    assert grevos.add_pushed_commits(load_payload(), to_process) == 0
+    assert get_commits(grevos.get_cache(cache_url)[0]) == crawled
+    assert not grevos.is_cache_stale(cache_url)
+
+def missed_delivery(grevos, cache_url, payload):
+    # The cache does not have the commit pushed before.
+    set_cache(grevos, cache_url, 7)
+
+def forced(grevos, cache_url, payload):
+    payload["forced"] = True
+
+def truncated(grevos, cache_url, payload):
+    payload["commits"] = payload["commits"][:1]
+
+def new_branch(grevos, cache_url, payload):
+    payload["created"] = True
+    payload["before"] = "0" * 40
+
+@pytest.mark.parametrize("change", [missed_delivery, forced, truncated, new_branch])
+def test_push_not_following_the_cache_marks_it_stale(grevos, settings, change):
+    (to_process, cache_url, crawled) = settings
+    payload = load_payload()
+    change(grevos, cache_url, payload)
+    before = get_commits(grevos.get_cache(cache_url)[0])
+    assert grevos.add_pushed_commits(payload, to_process) == 0
+    assert get_commits(grevos.get_cache(cache_url)[0]) == before
+    assert grevos.is_cache_stale(cache_url)
+    # Further pushes are not added either: the gap would remain.
+    assert grevos.add_pushed_commits(load_payload(), to_process) == 0
+    # Crawled despite --cache_only, the gap is filled.
+    assert crawl(grevos, to_process) == crawled
+    assert not grevos.is_cache_stale(cache_url)
+
+def test_cache_only_skips_fresh_cache(grevos, settings):
+    (to_process, cache_url, crawled) = settings
+    assert len(crawl(grevos, to_process)) == 8
+
+def test_payloads_failing_mark_the_cache_stale(grevos, settings, monkeypatch):
+    (to_process, cache_url, crawled) = settings
+    def get_commit_details(*args):
+        raise RuntimeError("boom")
+    monkeypatch.setattr(grevos, "get_commit_details", get_commit_details)
+    payloads = queue.Queue()
+    payloads.put(load_payload())
+    payloads.put(None)
+    grevos.process_webhooks(payloads, to_process)
+    assert payloads.empty()
+    assert grevos.is_cache_stale(cache_url)
+
+def post(port, headers, body):
+    """Sends a webhook request with the given headers (not checked) and returns the status code of the reply.
+    """
+    with socket.create_connection(("127.0.0.1", port)) as s:
+        s.sendall(("POST / HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n%s\r\n" % "".join("%s: %s\r\n" % x for x in headers.items())).encode('utf-8') + body)
+        return int(s.makefile("rb").readline().split()[1])
+
+@pytest.fixture
+def receiver(grevos):
+    """Runs the handler of the webhook receiver and returns its port and the queue of the payloads.
+    """
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), grevos.WebhookHandler)
+    server.daemon_threads = True
+    server.payloads = queue.Queue()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield (server.server_address[1], server.payloads)
+    server.shutdown()
+    server.server_close()
+
+def test_invalid_content_length(receiver):
+    (port, payloads) = receiver
+    body = json.dumps(load_payload()).encode('utf-8')
+    for length in ("abc", "-1"):
+        assert post(port, {"X-GitHub-Event": "push", "Content-Length": length}, body) == 400
+    assert payloads.empty()
+    assert post(port, {"X-GitHub-Event": "push", "Content-Length": str(len(body))}, body) == 202
+    assert payloads.get_nowait() == load_payload()
+
+@pytest.mark.parametrize("secret, address", [(None, "127.0.0.1"), ("s3cr3t", "")])
+def test_listens_on_all_interfaces_only_with_a_secret(grevos, monkeypatch, secret, address):
+    addresses = []
+    class Server:
+        def __init__(self, server_address, handler):
+            addresses.append(server_address)
+        def serve_forever(self):
+            raise KeyboardInterrupt()
+        def server_close(self):
+            pass
+    monkeypatch.setattr(grevos.http.server, "ThreadingHTTPServer", Server)
+    grevos.m_webhook_secret = secret
+    grevos.serve_webhooks([], 8080)
+    assert addresses == [(address, 8080)]
+
+def test_json_cache_written_atomically(grevos, settings, monkeypatch):
+    (to_process, cache_url, crawled) = settings
+    before = get_commits(grevos.get_cache(cache_url)[0])
+    # Interrupted before the new cache file replaces the previous one.
+    replace = os.replace
+    def replace_interrupted(src, dst):
+        if dst == grevos.get_cache_filename_with_path(cache_url):
+            raise KeyboardInterrupt()
+        replace(src, dst)
+    monkeypatch.setattr(grevos.os, "replace", replace_interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        grevos.add_pushed_commits(load_payload(), to_process)
+    monkeypatch.undo()
+    manifest = grevos.get_cache_manifest(cache_url)
+    assert manifest["nb_commits"] == 8
+    assert get_commits(grevos.get_cache_body(cache_url, manifest)) == before